@@ -16,6 +16,41 @@ export const api = {
         return res.data;
     },
 
+    uploadFile: async (file) => {
+        const formData = new FormData();
+        formData.append('file', file);
+        const res = await axios.post(`${getBaseUrl()}/api/upload`, formData);
+        return res.data;
+    },
+
+    getUploadJob: async (jobId) => {
+        const res = await axios.get(`${getBaseUrl()}/api/upload/jobs/${jobId}`);
+        return res.data;
+    },
+
+    printLabel: async (fileId, pageNum, printerName = null, labelSettings = {}, username = 'Unknown') => {
+        const res = await axios.post(`${getBaseUrl()}/api/print`, {
+            file_id: fileId,
+            page_num: pageNum,
+            printer_name: printerName,
+            label_settings: labelSettings,
+            username
+        });
+        return res.data;
+    },
+
+    getPrintJob: async (jobId) => {
+        const res = await axios.get(`${getBaseUrl()}/api/print/jobs/${jobId}`);
+        return res.data;
+    },
+
+    saveLabelSettings: async (labelSettings) => {
+        const res = await axios.put(`${getBaseUrl()}/api/settings/label`, {
+            label_settings: labelSettings
+        });
+        return res.data;
+    },
+
     printQrLabel: async ({ data, label, printerName = null, labelSettings = {}, username = 'template-user' }) => {
         const res = await axios.post(`${getBaseUrl()}/api/qr/print`, {
             data,
@@ -4,6 +4,10 @@ import LabelPreview from '../components/LabelPreview';
 import { api } from '../api';
 import { AlertTriangle, Copy, Clock, Printer } from 'lucide-react';
 
+const PRINT_POLL_MS = 1000;
+// Queued prints shown under the scanner, newest first
+const MAX_TRACKED_PRINTS = 5;
+
 function ScanPage() {
     const [barcode, setBarcode] = useState('');
     const [scanResult, setScanResult] = useState(null);
@@ -13,6 +17,7 @@ function ScanPage() {
     const [countdown, setCountdown] = useState(null);
     const [showDuplicateModal, setShowDuplicateModal] = useState(false);
     const [duplicateInfo, setDuplicateInfo] = useState(null);
+    const [printJobs, setPrintJobs] = useState([]);
     const autoPrintTimerRef = useRef(null);
 
     // Get auto-print delay from settings (default 3 seconds)
@@ -93,6 +98,30 @@ function ScanPage() {
         }
     };
 
+    const updatePrintJob = (jobId, fields) => {
+        setPrintJobs(jobs => jobs.map(job => (job.jobId === jobId ? { ...job, ...fields } : job)));
+    };
+
+    // The server answers as soon as the label is queued; follow the job until the printer is done
+    const watchPrintJob = async (jobId, label) => {
+        setPrintJobs(jobs => [{ jobId, label, status: 'queued', error: null }, ...jobs].slice(0, MAX_TRACKED_PRINTS));
+        for (;;) {
+            await new Promise((resolve) => setTimeout(resolve, PRINT_POLL_MS));
+            let job;
+            try {
+                ({ job } = await api.getPrintJob(jobId));
+            } catch (err) {
+                updatePrintJob(jobId, {
+                    status: 'failed',
+                    error: 'Could not get the print status: ' + (err.response?.data?.error || err.message)
+                });
+                return;
+            }
+            updatePrintJob(jobId, { status: job.status, error: job.error });
+            if (job.status === 'success' || job.status === 'failed') return;
+        }
+    };
+
     const handlePrint = async () => {
         if (!scanResult || isPrinting) return;
 
@@ -124,9 +153,11 @@ function ScanPage() {
             if (printResponse?.mode === 'preview' && printResponse?.preview_url) {
                 const baseUrl = localStorage.getItem('api_url') || 'http://localhost:5001';
                 window.open(`${baseUrl}${printResponse.preview_url}`, '_blank');
+            } else if (printResponse?.job_id) {
+                watchPrintJob(printResponse.job_id, `${scanResult.doc_name} - Page ${scanResult.page_num}`);
             }
 
-            // Silent success: just reset for next scan after brief display
+            // Queued: reset for the next scan after a brief display; the outcome shows up in printJobs
             setTimeout(() => {
                 setBarcode('');
                 setScanResult(null);
@@ -196,6 +227,31 @@ function ScanPage() {
                 </div>
             )}
 
+            {printJobs.map((job) => (
+                <div
+                    key={job.jobId}
+                    className={job.status === 'failed' ? 'card status-error' : 'card'}
+                    style={{
+                        marginTop: '12px',
+                        padding: '12px 16px',
+                        borderRadius: '8px',
+                        fontSize: '13px',
+                        display: 'flex',
+                        alignItems: 'center',
+                        gap: '8px',
+                        border: job.status === 'failed' ? '1px solid var(--error)' : '1px solid var(--border)'
+                    }}
+                >
+                    <Printer size={14} />
+                    <span style={{ flex: 1, textAlign: 'left' }}>{job.label}</span>
+                    {job.status === 'success' && <span style={{ color: 'var(--success)' }}>Printed</span>}
+                    {job.status === 'failed' && <span style={{ fontWeight: 500 }}>Not printed: {job.error || 'Unknown error'}</span>}
+                    {(job.status === 'queued' || job.status === 'printing') && (
+                        <span className="text-muted">{job.status === 'queued' ? 'Waiting for printer...' : 'Printing...'}</span>
+                    )}
+                </div>
+            ))}
+
             {/* Duplicate Confirmation Modal */}
             {showDuplicateModal && duplicateInfo && (
                 <div style={{
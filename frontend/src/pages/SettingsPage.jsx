@@ -26,7 +26,9 @@ function SettingsPage() {
         sharpening: true,         // Apply sharpening filter
         resampling: 'lanczos',    // lanczos (best), bicubic, bilinear, nearest
         contrast: 1.0,            // 0.5 to 2.0
-        threshold: 128            // For monochrome mode (0-255)
+        threshold: 128,           // For monochrome mode (0-255)
+        output_format: 'pdf',     // pdf, zpl (Zebra), epl (Eltron/older Zebra)
+        printer_dpi: 203          // Native resolution of the thermal printer for ZPL/EPL
     });
 
     // Auto-print settings
@@ -129,6 +131,10 @@ function SettingsPage() {
     const handleSaveLabelSettings = () => {
         localStorage.setItem('label_settings', JSON.stringify(labelSettings));
         localStorage.setItem('auto_print_delay', autoPrintDelay.toString());
+        // Station default on the server, used to pre-render labels after upload
+        api.saveLabelSettings(labelSettings).catch((error) => {
+            console.error('Failed to save label settings on server:', error);
+        });
         // Refresh preview
         setPreviewKey(prev => prev + 1);
     };
@@ -138,7 +144,7 @@ function SettingsPage() {
         let processedValue = value;
 
         // String fields that shouldn't be parsed as numbers
-        const stringFields = ['color_mode', 'resampling'];
+        const stringFields = ['color_mode', 'resampling', 'output_format'];
         // Boolean fields
         const booleanFields = ['sharpening'];
 
@@ -405,8 +411,43 @@ function SettingsPage() {
                             </p>
                         </div>
 
-                        {/* Threshold for Monochrome */}
-                        {labelSettings.color_mode === 'monochrome' && (
+                        {/* Output Format */}
+                        <div style={{ marginBottom: '16px' }}>
+                            <label style={{ fontSize: '12px', fontWeight: 500 }}>Output Format</label>
+                            <select
+                                className="input"
+                                value={labelSettings.output_format || 'pdf'}
+                                onChange={(e) => updateLabelSetting('output_format', e.target.value)}
+                                style={{ width: '100%', marginTop: '4px' }}
+                            >
+                                <option value="pdf">PDF (Any Printer)</option>
+                                <option value="zpl">ZPL (Zebra Thermal)</option>
+                                <option value="epl">EPL (Eltron / Older Zebra)</option>
+                            </select>
+                            <p className="text-muted" style={{ fontSize: '11px', marginTop: '4px' }}>
+                                ZPL and EPL render the label in black and white on this computer and send it to the printer as is, skipping the driver.
+                            </p>
+                        </div>
+
+                        {/* Printer resolution for ZPL/EPL */}
+                        {labelSettings.output_format && labelSettings.output_format !== 'pdf' && (
+                            <div style={{ marginBottom: '16px' }}>
+                                <label style={{ fontSize: '12px', fontWeight: 500 }}>Printer Resolution</label>
+                                <select
+                                    className="input"
+                                    value={labelSettings.printer_dpi || 203}
+                                    onChange={(e) => updateLabelSetting('printer_dpi', e.target.value)}
+                                    style={{ width: '100%', marginTop: '4px' }}
+                                >
+                                    <option value="203">203 DPI (8 dots/mm)</option>
+                                    <option value="300">300 DPI (12 dots/mm)</option>
+                                    <option value="600">600 DPI (24 dots/mm)</option>
+                                </select>
+                            </div>
+                        )}
+
+                        {/* Threshold for Monochrome and ZPL/EPL */}
+                        {(labelSettings.color_mode === 'monochrome' || (labelSettings.output_format && labelSettings.output_format !== 'pdf')) && (
                             <div style={{ marginBottom: '16px' }}>
                                 <label style={{ fontSize: '12px', fontWeight: 500 }}>
                                     B/W Threshold: {labelSettings.threshold}
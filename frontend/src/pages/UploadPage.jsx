@@ -3,6 +3,28 @@ import { Upload, FileText, CheckCircle, AlertCircle } from 'lucide-react';
 import { useNavigate } from 'react-router-dom';
 import { api } from '../api';
 
+const UPLOAD_POLL_MS = 500;
+
+// The server extracts pages in the background; wait for the job and shape it like a synchronous upload result
+const waitForUpload = async (jobId, onProgress) => {
+    for (;;) {
+        await new Promise((resolve) => setTimeout(resolve, UPLOAD_POLL_MS));
+        const { job } = await api.getUploadJob(jobId);
+        if (job.status === 'completed') {
+            return {
+                success: true,
+                is_duplicate: job.is_duplicate,
+                message: job.is_duplicate ? 'File already exists' : 'File uploaded and processed',
+                stats: { pages: job.pages_total, barcodes: job.barcodes_found }
+            };
+        }
+        if (job.status === 'failed') {
+            return { success: false, error: job.error };
+        }
+        onProgress(job);
+    }
+};
+
 function UploadPage() {
     const navigate = useNavigate();
     const [files, setFiles] = useState([]);
@@ -10,6 +32,7 @@ function UploadPage() {
     const [message, setMessage] = useState('');
     const [stats, setStats] = useState(null);
     const [results, setResults] = useState([]);
+    const [progress, setProgress] = useState('');
 
     const handleFilesSelected = (fileList) => {
         const selectedFiles = Array.from(fileList || []).filter(
@@ -47,7 +70,15 @@ function UploadPage() {
         try {
             for (const file of files) {
                 try {
-                    const result = await api.uploadFile(file);
+                    setProgress(`${file.name}: uploading`);
+                    let result = await api.uploadFile(file);
+                    if (result.success && result.job_id) {
+                        result = await waitForUpload(result.job_id, (job) => setProgress(
+                            job.pages_total
+                                ? `${file.name}: page ${job.pages_processed} of ${job.pages_total}`
+                                : `${file.name}: waiting`
+                        ));
+                    }
 
                     if (result.success) {
                         uploadedCount += 1;
@@ -122,6 +153,8 @@ function UploadPage() {
         } catch {
             setStatus('error');
             setMessage('Upload failed');
+        } finally {
+            setProgress('');
         }
     };
 
@@ -221,7 +254,7 @@ function UploadPage() {
                             disabled={status === 'uploading'}
                         >
                             {status === 'uploading' ? (
-                                <span className="flex items-center">Processing...</span>
+                                <span className="flex items-center">Processing{progress ? ` ${progress}` : ''}...</span>
                             ) : `Start Processing (${files.length})`}
                         </button>
                     </div>
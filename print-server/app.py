@@ -8,14 +8,16 @@ import platform
 import datetime
 import uuid
 import subprocess
-from reportlab.lib.units import inch
-from reportlab.pdfgen import canvas
-from reportlab.graphics.barcode import qr as qrbarcode
-from reportlab.graphics.shapes import Drawing
-from reportlab.graphics import renderPDF
+import multiprocessing
+import queue
+import json
+import threading
 
 # Import services (we'll create this next)
-from services import PDFProcessingService, PrintService
+from services import (
+    PDFProcessingService, PrintService, IngestionService, PrerenderService, PrintQueueService, QRLabelService,
+    PrinterRegistry
+)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -30,61 +32,110 @@ UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB limit
+# 'json' (db.json snapshot + journal) or 'sqlite' (uploads/db.sqlite3)
+app.config['STORAGE_BACKEND'] = os.environ.get('STORAGE_BACKEND', 'json').lower()
+# Number of journaled changes before uploads/db.journal is folded into db.json
+app.config['DB_JOURNAL_COMPACT_EVERY'] = int(os.environ.get('DB_JOURNAL_COMPACT_EVERY', 1000))
+# Worker processes for PDF text extraction on upload (0 = extract on the request thread)
+app.config['PDF_EXTRACTION_WORKERS'] = int(os.environ.get('PDF_EXTRACTION_WORKERS', 0))
+# 'full' (default + layout pass on every page) or 'adaptive' (layout pass only where needed)
+app.config['PDF_EXTRACTION_STRATEGY'] = os.environ.get('PDF_EXTRACTION_STRATEGY', 'full').lower()
+# Parsed PDFs kept in memory for preview/print (least recently used are dropped)
+app.config['PDF_READER_CACHE_SIZE'] = int(os.environ.get('PDF_READER_CACHE_SIZE', 16))
+# Memory budget for cropped label pages served by preview and print
+app.config['PREVIEW_CACHE_BYTES'] = int(os.environ.get('PREVIEW_CACHE_BYTES', 32 * 1024 * 1024))
+# Print-ready bitmaps for the Windows native print path: memory budget, then PNG spill on disk
+app.config['RASTER_CACHE_MEMORY_BYTES'] = int(os.environ.get('RASTER_CACHE_MEMORY_BYTES', 64 * 1024 * 1024))
+app.config['RASTER_CACHE_DISK_BYTES'] = int(os.environ.get('RASTER_CACHE_DISK_BYTES', 256 * 1024 * 1024))
+app.config['RASTER_CACHE_DIR'] = os.environ.get('RASTER_CACHE_DIR', os.path.join(UPLOAD_FOLDER, 'raster-cache'))
+# What renders labels to bitmaps: auto (pdfium when pypdfium2 is installed, else pdftoppm), pdfium or poppler
+app.config['PDF_RASTERIZER'] = os.environ.get('PDF_RASTERIZER', 'auto').lower()
+# Worker processes for pdfium rendering; 0 renders on the print queue's own thread
+app.config['RASTER_WORKERS'] = int(os.environ.get('RASTER_WORKERS', 0))
+# Seconds between background printer discovery runs; /api/printers answers from memory
+app.config['PRINTER_CACHE_TTL'] = float(os.environ.get('PRINTER_CACHE_TTL', 30))
+# Where print jobs go: auto (windows/powershell on Windows, lpr elsewhere), lpr, ipp, windows, powershell,
+# or the file/null sinks for load tests without a printer
+app.config['PRINT_BACKEND'] = os.environ.get('PRINT_BACKEND', 'auto').lower()
+# CUPS server as host:port, or the path of its Unix socket (e.g. /run/cups/cups.sock)
+app.config['IPP_SERVER'] = os.environ.get('IPP_SERVER', 'localhost:631')
+# Directory the file backend writes each job to
+app.config['PRINT_SPOOL_DIR'] = os.environ.get('PRINT_SPOOL_DIR', os.path.join(UPLOAD_FOLDER, 'spool'))
+# Jobs waiting per printer before /api/print answers 429
+app.config['PRINT_QUEUE_MAX_PENDING'] = int(os.environ.get('PRINT_QUEUE_MAX_PENDING', 20))
+# Upper bound on labels in one /api/qr/bulk request
+app.config['QR_BULK_MAX_LABELS'] = int(os.environ.get('QR_BULK_MAX_LABELS', 5000))
+# Encoded QR codes kept for repeat previews (least recently used are dropped)
+app.config['QR_CACHE_SIZE'] = int(os.environ.get('QR_CACHE_SIZE', 256))
+# Warm the crop cache (and on Windows the raster cache) for every barcode page after an upload
+app.config['PRERENDER_LABELS'] = os.environ.get('PRERENDER_LABELS', '0').lower() in ('1', 'true', 'yes')
+app.config['PRERENDER_RASTERS'] = os.environ.get('PRERENDER_RASTERS', '1').lower() in ('1', 'true', 'yes')
+
+# Services, built by init_services(). Worker processes of the extraction and raster pools
+# re-import this module under spawn (Windows, the PyInstaller EXE), so nothing may start on import.
+# `python app.py` builds them before serving; under a WSGI server or `flask run` the first request does.
+pdf_service = None
+printer_registry = None
+print_service = None
+print_queue = None
+qr_service = None
+prerender_service = None
+ingestion_service = None
+_services_ready = False
+_services_lock = threading.Lock()
+
+
+def init_services():
+    """Load the DB and start the background services the routes use (once)."""
+    global _services_ready
+    with _services_lock:
+        if _services_ready:
+            return
+        _build_services()
+        _services_ready = True
+
+
+def _build_services():
+    global pdf_service, printer_registry, print_service, print_queue, qr_service, prerender_service, \
+        ingestion_service
+    pdf_service = PDFProcessingService(
+        upload_folder=UPLOAD_FOLDER,
+        storage_backend=app.config['STORAGE_BACKEND'],
+        journal_compact_every=app.config['DB_JOURNAL_COMPACT_EVERY'],
+        extraction_workers=app.config['PDF_EXTRACTION_WORKERS'],
+        extraction_strategy=app.config['PDF_EXTRACTION_STRATEGY'],
+        reader_cache_size=app.config['PDF_READER_CACHE_SIZE'],
+        crop_cache_bytes=app.config['PREVIEW_CACHE_BYTES']
+    )
+    printer_registry = PrinterRegistry(ttl=app.config['PRINTER_CACHE_TTL'])
+    print_service = PrintService(
+        pdf_service,
+        raster_cache_dir=app.config['RASTER_CACHE_DIR'] if platform.system() == 'Windows' else None,
+        raster_memory_bytes=app.config['RASTER_CACHE_MEMORY_BYTES'],
+        raster_disk_bytes=app.config['RASTER_CACHE_DISK_BYTES'],
+        printer_registry=printer_registry,
+        print_backend=app.config['PRINT_BACKEND'],
+        backend_options={'ipp_server': app.config['IPP_SERVER'], 'spool_dir': app.config['PRINT_SPOOL_DIR']},
+        pdf_rasterizer=app.config['PDF_RASTERIZER'],
+        raster_workers=app.config['RASTER_WORKERS']
+    )
+    print_queue = PrintQueueService(print_service, max_pending=app.config['PRINT_QUEUE_MAX_PENDING'])
+    qr_service = QRLabelService(cache_size=app.config['QR_CACHE_SIZE'])
+    prerender_service = None
+    if app.config['PRERENDER_LABELS']:
+        # print_service renders only what its backend and output format will use (native Windows, ZPL/EPL)
+        prerender_service = PrerenderService(pdf_service, print_service if app.config['PRERENDER_RASTERS'] else None)
+    ingestion_service = IngestionService(
+        pdf_service,
+        on_complete=prerender_service.on_document_added if prerender_service else None
+    )
+
+
+@app.before_request
+def ensure_services():
+    if not _services_ready:
+        init_services()
 
-# Initialize services
-pdf_service = PDFProcessingService(upload_folder=UPLOAD_FOLDER)
-print_service = PrintService(pdf_service)
-
-
-def _clamp(value, minimum, maximum):
-    return max(minimum, min(maximum, value))
-
-
-def generate_qr_label_pdf(data, label, label_settings=None):
-    if label_settings is None:
-        label_settings = {}
-
-    width = _clamp(float(label_settings.get('width', 3.94)), 1.0, 8.5)
-    height = _clamp(float(label_settings.get('height', 2.0)), 1.0, 11.0)
-
-    data = (data or '').strip()
-    label = (label or '').strip()
-    if not data:
-        raise ValueError('QR data is required')
-
-    packet = io.BytesIO()
-    c = canvas.Canvas(packet, pagesize=(width * inch, height * inch))
-
-    margin = 0.12 * inch
-    label_height = 0.26 * inch if label else 0
-    available_width = (width * inch) - (2 * margin)
-    available_height = (height * inch) - (2 * margin) - label_height
-
-    qr_size = min(available_width, available_height)
-    qr_x = ((width * inch) - qr_size) / 2
-    qr_y = margin + (available_height - qr_size) / 2
-
-    qr_widget = qrbarcode.QrCodeWidget(data)
-    bounds = qr_widget.getBounds()
-    qr_drawing = Drawing(qr_size, qr_size, transform=[
-        qr_size / (bounds[2] - bounds[0]),
-        0,
-        0,
-        qr_size / (bounds[3] - bounds[1]),
-        -bounds[0] * qr_size / (bounds[2] - bounds[0]),
-        -bounds[1] * qr_size / (bounds[3] - bounds[1])
-    ])
-    qr_drawing.add(qr_widget)
-    renderPDF.draw(qr_drawing, c, qr_x, qr_y)
-
-    if label:
-        c.setFont('Helvetica', 9)
-        c.drawCentredString((width * inch) / 2, margin * 0.6, label[:80])
-
-    c.showPage()
-    c.save()
-    packet.seek(0)
-    return packet.read()
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -92,58 +143,23 @@ def health_check():
 
 @app.route('/api/printers', methods=['GET'])
 def list_printers():
-    """List available system printers"""
+    """List available system printers with their state (idle, busy, offline)"""
     try:
-        import subprocess
-        import platform
-        
-        printers = []
-        default_printer = None
-        system = platform.system()
-        
-        if system == 'Darwin':  # macOS
-            # Get list of printers
-            result = subprocess.run(['lpstat', '-p'], capture_output=True, text=True)
-            if result.returncode == 0:
-                for line in result.stdout.strip().split('\n'):
-                    if line.startswith('printer'):
-                        parts = line.split()
-                        if len(parts) >= 2:
-                            printers.append(parts[1])
-            
-            # Get default printer
-            result = subprocess.run(['lpstat', '-d'], capture_output=True, text=True)
-            if result.returncode == 0 and 'system default destination:' in result.stdout:
-                default_printer = result.stdout.split(':')[-1].strip()
-                
-        elif system == 'Windows':
-            try:
-                import win32print
-                for p in win32print.EnumPrinters(win32print.PRINTER_ENUM_LOCAL | win32print.PRINTER_ENUM_CONNECTIONS):
-                    printers.append(p[2])
-                default_printer = win32print.GetDefaultPrinter()
-            except ImportError:
-                # Fallback to PowerShell
-                result = subprocess.run(
-                    ['powershell', '-Command', 'Get-Printer | Select-Object -ExpandProperty Name'],
-                    capture_output=True, text=True
-                )
-                if result.returncode == 0:
-                    printers = [p.strip() for p in result.stdout.strip().split('\n') if p.strip()]
-        else:  # Linux
-            result = subprocess.run(['lpstat', '-p'], capture_output=True, text=True)
-            if result.returncode == 0:
-                for line in result.stdout.strip().split('\n'):
-                    if line.startswith('printer'):
-                        parts = line.split()
-                        if len(parts) >= 2:
-                            printers.append(parts[1])
-        
-        return jsonify({
-            'success': True,
-            'printers': printers,
-            'default_printer': default_printer
-        })
+        # refresh=1 rediscovers now instead of answering from the cached list
+        if request.args.get('refresh', '').lower() in ('1', 'true', 'yes'):
+            snapshot = printer_registry.refresh()
+        else:
+            snapshot = printer_registry.snapshot()
+        response = {
+            'success': snapshot['error'] is None,
+            'printers': snapshot['printers'],
+            'default_printer': snapshot['default_printer'],
+            'printer_states': snapshot['states'],
+            'updated_at': snapshot['updated_at']
+        }
+        if snapshot['error']:
+            response['error'] = snapshot['error']
+        return jsonify(response)
     except Exception as e:
         logger.error(f"Failed to list printers: {e}")
         return jsonify({'success': False, 'error': str(e), 'printers': []})
@@ -159,12 +175,28 @@ def upload_file():
     
     if file and file.filename.lower().endswith('.pdf'):
         filename = secure_filename(file.filename)
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        try:
+            # Single pass: hashed while written; duplicates never overwrite the stored file
+            filepath, file_hash, _existing_id = pdf_service.save_upload(file.stream, filename)
+        except Exception as e:
+            logger.error(f"Upload save error: {e}")
+            return jsonify({'error': str(e)}), 500
+
+        # Return immediately and let the ingestion worker process pages; async=0 processes before responding
+        if (request.form.get('async') or request.args.get('async', '1')).lower() not in ('0', 'false', 'no'):
+            job = ingestion_service.submit(filepath, filename, file_hash=file_hash)
+            return jsonify({
+                'success': True,
+                'message': 'File accepted for processing',
+                'job_id': job['id'],
+                'job': job
+            }), 202
         
         # Process PDF
         try:
-            result = pdf_service.process_pdf(filepath, filename)
+            result = pdf_service.process_pdf(filepath, filename, file_hash=file_hash)
+            if prerender_service:
+                prerender_service.on_document_added(result)
             
             if result.get('is_duplicate'):
                 pass # You can decide to treat as error or success with warning
@@ -183,6 +215,13 @@ def upload_file():
             
     return jsonify({'error': 'Invalid file type'}), 400
 
+@app.route('/api/upload/jobs/<job_id>', methods=['GET'])
+def get_upload_job(job_id):
+    job = ingestion_service.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Upload job not found'}), 404
+    return jsonify({'success': True, 'job': job})
+
 @app.route('/api/documents', methods=['GET'])
 def get_documents():
     docs = pdf_service.get_all_documents()
@@ -311,6 +350,48 @@ def get_stats():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/stats/extraction', methods=['GET'])
+def get_extraction_stats():
+    """Get text-extraction cost per strategy"""
+    try:
+        stats = pdf_service.get_extraction_stats()
+        return jsonify({'success': True, 'stats': stats})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/settings/label', methods=['GET', 'PUT'])
+def label_settings_operations():
+    """Station default label settings (used to pre-render labels after upload)"""
+    if request.method == 'GET':
+        return jsonify({'success': True, 'label_settings': pdf_service.get_label_settings()})
+
+    data = request.json or {}
+    try:
+        print_service.validate_label_settings(data.get('label_settings'))
+        pdf_service.set_label_settings(data.get('label_settings'))
+        return jsonify({'success': True, 'label_settings': pdf_service.get_label_settings()})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/stats/cache', methods=['GET'])
+def get_cache_stats():
+    """Get hit/miss counters for the preview and print caches"""
+    try:
+        stats = {
+            'readers': pdf_service.reader_cache.stats(),
+            'crops': pdf_service.crop_cache.stats(),
+            'rasters': print_service.raster_cache.stats(),
+            'rasterizer': print_service.rasterizer.stats(),
+            'qr_codes': qr_service.stats(),
+            'prerender': prerender_service.stats() if prerender_service else None,
+            'print_queues': print_queue.stats(),
+            'printers': printer_registry.stats(),
+            'print_backend': print_service.backend.stats()
+        }
+        return jsonify({'success': True, 'stats': stats})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/documents/<file_id>/print-stats', methods=['GET'])
 def get_document_print_stats(file_id):
     """Get print statistics for a specific document"""
@@ -335,12 +416,14 @@ def preview_page(file_id, page_num):
         }
         
         # Get processed and/or cropped page image/pdf
-        image_bytes = pdf_service.get_page_image(file_id, page_num, label_settings)
+        image_bytes, etag = pdf_service.get_cropped_page(file_id, page_num, label_settings)
+        # Strong ETag: send_file answers a matching If-None-Match with 304
         return send_file(
             io.BytesIO(image_bytes),
             mimetype='application/pdf',
             as_attachment=False,
-            download_name=f'preview_{page_num}.pdf'
+            download_name=f'preview_{page_num}.pdf',
+            etag=etag
         )
     except Exception as e:
         return jsonify({'error': str(e)}), 404
@@ -356,6 +439,10 @@ def print_label():
     
     if not file_id or not page_num:
         return jsonify({'error': 'Missing file_id or page_num'}), 400
+    try:
+        print_service.validate_label_settings(label_settings)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
         
     try:
         # macOS development mode: do not print physically, only provide preview link
@@ -387,15 +474,124 @@ def print_label():
                 'preview_url': f'/api/preview/{file_id}/{page_num}'
             })
 
-        # Pass username to print service
-        success, message = print_service.print_page(file_id, page_num, printer_name, label_settings, username)
-        if success:
-            return jsonify({'success': True, 'message': message})
-        else:
-            return jsonify({'success': False, 'error': message}), 500
+        if file_id not in pdf_service.documents:
+            return jsonify({'error': 'Document not found'}), 404
+
+        # Queue on the printer's worker and answer right away; poll /api/print/jobs/<job_id>
+        try:
+            job = print_queue.submit(file_id, page_num, printer_name, label_settings, username)
+        except queue.Full as e:
+            response = jsonify({'success': False, 'error': str(e)})
+            response.headers['Retry-After'] = '2'
+            return response, 429
+        return jsonify({
+            'success': True,
+            'message': 'Queued for printing',
+            'job_id': job['id'],
+            'job': job
+        }), 202
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/print/batch', methods=['POST'])
+def print_batch():
+    """Print many pages of one document as a single spool job"""
+    data = request.json or {}
+    file_id = data.get('file_id')
+    pages = data.get('pages', 'pending')
+    printer_name = data.get('printer_name')
+    label_settings = data.get('label_settings', {})
+    username = data.get('username', 'Unknown')
+
+    if not file_id:
+        return jsonify({'error': 'Missing file_id'}), 400
+    try:
+        print_service.validate_label_settings(label_settings)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    doc = pdf_service.documents.get(file_id)
+    if not doc:
+        return jsonify({'error': 'Document not found'}), 404
+
+    pending = pages == 'pending'
+    if pending:
+        # Barcode pages without a successful print yet, and none queued or printing
+        pages = sorted(pdf_service.get_document_print_stats(file_id)['pending_pages'])
+    elif not isinstance(pages, list) or not all(
+            isinstance(page, int) and not isinstance(page, bool) and 1 <= page <= doc['pages'] for page in pages):
+        return jsonify({'error': f"pages must be 'pending' or a list of page numbers from 1 to {doc['pages']}"}), 400
+    elif len(set(pages)) != len(pages):
+        return jsonify({'error': 'pages must not repeat a page number'}), 400
+    if not pages:
+        return jsonify({'success': True, 'message': 'Nothing to print', 'pages': []})
+
+    try:
+        # macOS development mode: do not print physically, only validate and log (as /api/print does)
+        if platform.system() == 'Darwin':
+            pdf_service.get_cropped_pages(file_id, pages, label_settings)
+            batch_id = str(uuid.uuid4())
+            timestamp = datetime.datetime.now().isoformat()
+            for page_num in pages:
+                pdf_service.log_print_job({
+                    'id': str(uuid.uuid4()),
+                    'file_id': file_id,
+                    'doc_name': doc.get('name', 'Unknown Document'),
+                    'page_num': page_num,
+                    'printer': 'Preview (macOS)',
+                    'status': 'success',
+                    'timestamp': timestamp,
+                    'error': None,
+                    'username': username,
+                    'batch_id': batch_id
+                })
+            return jsonify({
+                'success': True,
+                'mode': 'preview',
+                'message': f'macOS dev mode: {len(pages)} labels generated (no physical print).',
+                'pages': pages
+            })
+
+        try:
+            if pending:
+                # Worked out again under the DB lock, so a second click cannot queue the same pages
+                pages, job = print_queue.submit_pending(file_id, printer_name, label_settings, username)
+            else:
+                job = print_queue.submit_batch(file_id, pages, printer_name, label_settings, username)
+        except queue.Full as e:
+            response = jsonify({'success': False, 'error': str(e)})
+            response.headers['Retry-After'] = '2'
+            return response, 429
+        if job is None:
+            return jsonify({'success': True, 'message': 'Nothing to print', 'pages': []})
+        return jsonify({
+            'success': True,
+            'message': f'Queued {len(pages)} labels for printing',
+            'job_id': job['id'],
+            'pages': pages,
+            'job': job
+        }), 202
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/print/jobs/<job_id>', methods=['GET'])
+def get_print_job(job_id):
+    job = print_queue.get_job(job_id)
+    if job:
+        return jsonify({'success': True, 'job': job})
+    # Finished long ago or before a restart: answer from print history
+    record = pdf_service.get_print_job(job_id)
+    if not record:
+        return jsonify({'error': 'Print job not found'}), 404
+    return jsonify({'success': True, 'job': {
+        'id': record['id'],
+        'file_id': record['file_id'],
+        'page_num': record['page_num'],
+        'printer': record.get('printer'),
+        'status': record['status'],
+        'error': record.get('error'),
+        'created_at': record['timestamp']
+    }})
+
 @app.route('/api/reports/download', methods=['GET'])
 def download_report():
     """Generate and download CSV report of print history"""
@@ -459,7 +655,7 @@ def qr_preview():
             'width': request.args.get('width', 3.94),
             'height': request.args.get('height', 2.0)
         }
-        pdf_bytes = generate_qr_label_pdf(data, label, label_settings)
+        pdf_bytes = qr_service.generate_label_pdf(data, label, label_settings)
         return send_file(
             io.BytesIO(pdf_bytes),
             mimetype='application/pdf',
@@ -481,13 +677,16 @@ def print_qr_label():
 
     if not qr_data:
         return jsonify({'success': False, 'error': 'QR data is required'}), 400
+    try:
+        print_service.validate_label_settings(label_settings)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
 
     job_id = str(uuid.uuid4())
-    temp_filename = f"qr_print_{job_id}.pdf"
     timestamp = datetime.datetime.now().isoformat()
 
     try:
-        pdf_bytes = generate_qr_label_pdf(qr_data, label, label_settings)
+        pdf_bytes = qr_service.generate_label_pdf(qr_data, label, label_settings)
 
         if platform.system() == 'Darwin':
             pdf_service.log_print_job({
@@ -510,32 +709,8 @@ def print_qr_label():
                 'preview_url': '/api/qr/preview'
             })
 
-        with open(temp_filename, 'wb') as temp_file:
-            temp_file.write(pdf_bytes)
-
-        quality_settings = {
-            'dpi': label_settings.get('dpi', 600),
-            'color_mode': label_settings.get('color_mode', 'grayscale'),
-            'sharpening': label_settings.get('sharpening', True),
-            'resampling': label_settings.get('resampling', 'lanczos'),
-            'contrast': label_settings.get('contrast', 1.0),
-            'threshold': label_settings.get('threshold', 128)
-        }
-
-        system = platform.system()
-        if system == 'Windows':
-            if getattr(print_service, '_print_windows_native', None):
-                success, message = print_service._print_windows_native(temp_filename, printer_name, quality_settings)
-            else:
-                success, message = print_service._print_windows_powershell(temp_filename, printer_name)
-        else:
-            cmd = ['lpr']
-            if printer_name:
-                cmd.extend(['-P', printer_name])
-            cmd.append(temp_filename)
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            success = result.returncode == 0
-            message = 'Printed successfully' if success else f"LPR failed: {result.stderr}"
+        # Straight from memory: lpr reads stdin, the native Windows path and ZPL/EPL output rasterize the bytes
+        success, message = print_service.send_label_pdf(pdf_bytes, printer_name, label_settings)
 
         pdf_service.log_print_job({
             'id': job_id,
@@ -558,12 +733,106 @@ def print_qr_label():
     except Exception as e:
         logger.error(f"QR print error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
-    finally:
-        if os.path.exists(temp_filename):
-            try:
-                os.remove(temp_filename)
-            except Exception:
-                pass
+
+def _read_qr_bulk_request():
+    """(rows, options) from a CSV upload, a text/csv body, or JSON (array of rows or object)"""
+    if 'file' in request.files:
+        options = request.form.to_dict()
+        options['label_settings'] = json.loads(options.get('label_settings') or '{}')
+        text = request.files['file'].stream.read().decode('utf-8-sig')
+        rows = qr_service.parse_csv(text)
+    elif request.mimetype == 'text/csv':
+        options = request.args.to_dict()
+        options['label_settings'] = json.loads(options.get('label_settings') or '{}')
+        rows = qr_service.parse_csv(request.get_data(as_text=True))
+    else:
+        data = request.get_json(silent=True)
+        if isinstance(data, list):
+            rows, options = data, dict(request.args.to_dict(), label_settings={})
+        elif isinstance(data, dict):
+            rows = qr_service.parse_csv(data['csv']) if 'csv' in data else data.get('rows')
+            if not isinstance(rows, list):
+                raise ValueError('Provide rows as a JSON array of {data, label} or as CSV')
+            options = dict(data, label_settings=data.get('label_settings') or {})
+        else:
+            raise ValueError('Send a CSV file, a text/csv body or JSON rows')
+    if not isinstance(options['label_settings'], dict):
+        raise ValueError('label_settings must be a JSON object')
+    return rows, options
+
+@app.route('/api/qr/bulk', methods=['POST'])
+def qr_bulk():
+    """Many QR labels as one multi-page PDF: mode=preview (default), download or print"""
+    try:
+        rows, options = _read_qr_bulk_request()
+        rows = qr_service.normalize_rows(rows)
+        if not rows:
+            raise ValueError('No labels to generate')
+        if len(rows) > app.config['QR_BULK_MAX_LABELS']:
+            raise ValueError(f"At most {app.config['QR_BULK_MAX_LABELS']} labels per request")
+        mode = (options.get('mode') or 'preview').lower()
+        if mode not in ('preview', 'download', 'print'):
+            raise ValueError('mode must be preview, download or print')
+        label_settings = options['label_settings']
+        if mode == 'print':
+            print_service.validate_label_settings(label_settings)
+        pdf_bytes = qr_service.generate_labels_pdf(rows, label_settings)
+    except (ValueError, KeyError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    if mode != 'print':
+        return send_file(
+            io.BytesIO(pdf_bytes),
+            mimetype='application/pdf',
+            as_attachment=(mode == 'download'),
+            download_name='qr_labels.pdf'
+        )
+
+    printer_name = options.get('printer_name')
+    username = options.get('username', 'Unknown')
+    labels = [{'doc_name': row['label'] or 'QR Label', 'barcode': row['data']} for row in rows]
+    try:
+        if platform.system() == 'Darwin':
+            # macOS development mode: no physical print, as in /api/qr/print
+            batch_id = str(uuid.uuid4())
+            timestamp = datetime.datetime.now().isoformat()
+            for page_num, label in enumerate(labels, start=1):
+                pdf_service.log_print_job(dict(
+                    label,
+                    id=str(uuid.uuid4()),
+                    file_id='qr-template',
+                    page_num=page_num,
+                    printer='Preview (macOS)',
+                    status='success',
+                    timestamp=timestamp,
+                    error=None,
+                    username=username,
+                    message='Preview generated',
+                    batch_id=batch_id
+                ))
+            return jsonify({'success': True, 'message': 'Preview generated', 'labels': len(rows), 'batch_id': batch_id})
+
+        try:
+            # One spool job for the whole run, on the printer's queue like /api/print/batch
+            job = print_queue.submit_pdf(pdf_bytes, 'qr-template', labels, printer_name, label_settings, username)
+        except queue.Full as e:
+            response = jsonify({'success': False, 'error': str(e)})
+            response.headers['Retry-After'] = '2'
+            return response, 429
+        return jsonify({
+            'success': True,
+            'message': f'Queued {len(rows)} labels for printing',
+            'job_id': job['id'],
+            'batch_id': job['id'],
+            'labels': len(rows),
+            'job': job
+        }), 202
+    except Exception as e:
+        logger.error(f"QR bulk print error: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
 
 if __name__ == '__main__':
+    # Required for the extraction and raster process pools in the PyInstaller EXE; must run first
+    multiprocessing.freeze_support()
+    init_services()
     app.run(host='0.0.0.0', port=5001, debug=True)
@@ -0,0 +1,451 @@
+"""Micro-benchmarks for the print server hot paths.
+
+Usage:
+    python benchmark.py text [--pages 300]
+    python benchmark.py qr [--labels 2000] [--cache-size 256]
+    python benchmark.py ipp [--jobs 500] [--server host:port --printer NAME]
+    python benchmark.py pipeline [--pages 40 --jobs 400 --backend null|file]
+    python benchmark.py raw [--labels 50 --printer-dpi 203]
+    python benchmark.py raster [--labels 100 --dpi 203 --workers 2]
+"""
+import argparse
+import http.server
+import io
+import os
+import random
+import re
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+
+from reportlab.lib.units import inch
+from reportlab.pdfgen import canvas
+
+from concurrent.futures import ThreadPoolExecutor
+
+from services import (
+    PDFIUM_AVAILABLE, IppClient, PDFProcessingService, PdfiumRasterizer, PopplerRasterizer, PrintQueueService,
+    PrintService, QRLabelService, TextExtractionService
+)
+
+
+def _report(name, seconds, count, unit):
+    per_item = seconds / count * 1e6 if count else 0
+    print(f"{name:<28} {seconds * 1000:9.1f} ms total  {per_item:9.1f} us/{unit}")
+
+
+# ---------------------------------------------------------------------------
+# text: TextExtractionService.extract_serial_numbers
+# ---------------------------------------------------------------------------
+
+def legacy_extract_serial_numbers(text):
+    """The scanner as it was before patterns were precompiled, kept as the reference."""
+    if not text:
+        return []
+    serial_numbers = []
+    seen_values = set()
+    base_text = ''.join(ch if (ch == '\n' or ord(ch) >= 32) else ' ' for ch in str(text))
+    condensed_text = re.sub(r'(?<=\w)\s+(?=\w)', '', base_text)
+    candidate_texts = [base_text]
+    if condensed_text != base_text:
+        candidate_texts.append(condensed_text)
+    patterns = [
+        (r'\[\)>.*?S([A-Z][0-9]{10})[0-9]*[A-Z]', 'BARCODE_K'),
+        (r'\[\)>.*?S([0-9][A-Z][0-9]{9,12})[0-9]*[A-Z]', 'BARCODE_NUM'),
+        (r'S/?N[:\s;\.\-]+([A-Z0-9]{8,15})', 'GENERIC_SN'),
+        (r'SN[:\s;\.\-]+([A-Z0-9]{8,15})', 'GENERIC_SN'),
+        (r'\b([A-Z]{1,2}[0-9]{8,12})\b', 'ALPHANUMERIC_ID')
+    ]
+    for candidate in candidate_texts:
+        for pattern, label_type in patterns:
+            for match in re.finditer(pattern, candidate, re.IGNORECASE):
+                val = re.sub(r'\s+', '', match.group(1).upper())
+                if len(val) < 6:
+                    continue
+                dedupe_key = (val, label_type)
+                if dedupe_key in seen_values:
+                    continue
+                seen_values.add(dedupe_key)
+                serial_numbers.append({'text': val, 'type': label_type, 'confidence': 1.0})
+    return serial_numbers
+
+
+def make_pick_list_page(rng, lines=60):
+    """Dense pick-list page text as pypdf returns it, with a few labelled units."""
+    rows = []
+    for _ in range(lines):
+        kind = rng.random()
+        if kind < 0.08:
+            rows.append(f"[)>\x1e06\x1d1P{rng.randint(10**6, 10**7)}\x1dSK{rng.randint(10**9, 10**10 - 1)}0{rng.randint(1, 9)}Z\x1e\x04")
+        elif kind < 0.16:
+            rows.append(f"S/N: {rng.choice('KLMN')}{rng.randint(10**9, 10**10 - 1)}   Qty 1   Bin A-{rng.randint(1, 99):02d}")
+        elif kind < 0.22:
+            rows.append(f"Serial  SN; {rng.randint(10**8, 10**9 - 1)}{rng.choice('ABCD')}  Lot 4 4 1 2")
+        else:
+            rows.append(
+                f"{rng.randint(1, 500):>4}  PN-{rng.randint(1000, 9999)}-{rng.choice(['A', 'B', 'C'])}  "
+                f"Widget assembly {rng.choice(['left', 'right', 'upper'])} bracket  "
+                f"{rng.randint(1, 40):>3} EA  {rng.uniform(1, 900):8.2f}  Dock {rng.randint(1, 12)}"
+            )
+    return '\n'.join(rows)
+
+
+def bench_text(args):
+    rng = random.Random(args.seed)
+    pages = [make_pick_list_page(rng) for _ in range(args.pages)]
+    service = TextExtractionService()
+
+    for page in pages:
+        if service.extract_serial_numbers(page) != legacy_extract_serial_numbers(page):
+            raise SystemExit("Output differs from the reference scanner")
+
+    print(f"{args.pages} pages, {sum(len(p) for p in pages) / len(pages):.0f} chars/page, output identical")
+    for name, func in (('legacy scanner', legacy_extract_serial_numbers),
+                       ('TextExtractionService', service.extract_serial_numbers)):
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for page in pages:
+                func(page)
+        _report(name, time.perf_counter() - start, args.pages * args.repeat, 'page')
+
+
+# ---------------------------------------------------------------------------
+# qr: QRLabelService, one label per PDF versus one multi-page PDF
+# ---------------------------------------------------------------------------
+
+def make_asset_rows(rng, count):
+    return [
+        {'data': f"https://assets.example.com/item/{rng.randint(10**7, 10**8 - 1)}", 'label': f"Asset tag {i + 1:05d}"}
+        for i in range(count)
+    ]
+
+
+def bench_qr(args):
+    rng = random.Random(args.seed)
+    rows = make_asset_rows(rng, args.labels)
+    service = QRLabelService(cache_size=args.cache_size)
+    label_settings = {'width': 2.0, 'height': 2.0}
+
+    start = time.perf_counter()
+    separate_bytes = sum(len(service.generate_label_pdf(row['data'], row['label'], label_settings)) for row in rows)
+    separate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    bulk_bytes = len(service.generate_labels_pdf(rows, label_settings))
+    bulk_seconds = time.perf_counter() - start
+
+    # The preview endpoint asks for the same label again on every keystroke
+    row = rows[0]
+    start = time.perf_counter()
+    preview_bytes = sum(len(service.generate_label_pdf(row['data'], row['label'], label_settings)) for _ in rows)
+    preview_seconds = time.perf_counter() - start
+
+    print(f"{args.labels} labels")
+    for name, seconds, size in (('one PDF per label', separate_seconds, separate_bytes),
+                                ('one multi-page PDF', bulk_seconds, bulk_bytes),
+                                ('repeated preview', preview_seconds, preview_bytes)):
+        _report(name, seconds, args.labels, 'label')
+        print(f"{'':<28} {args.labels / seconds:9.0f} labels/s  {size / 1024:9.0f} KiB total")
+    print(f"QR cache: {service.stats()}")
+
+
+# ---------------------------------------------------------------------------
+# ipp: Print-Job submission, new connection per job versus kept-alive
+# ---------------------------------------------------------------------------
+
+class FakeIppHandler(http.server.BaseHTTPRequestHandler):
+    """Accepts any Print-Job and answers with a job-id, keeping the connection open.
+
+    Knobs on the server (see start_fake_ipp_server) let tests answer an error
+    status, drop the connection after reading a request, or close it after
+    answering without telling the client.
+    """
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately; without this, delayed ACKs stall kept-alive connections
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        operation, request_id = struct.unpack('>HI', body[2:8])
+        server = self.server
+        with server.lock:
+            server.jobs.append((self.path, operation, body))
+            job_id = len(server.jobs)
+            drop = server.drop_requests > 0
+            if drop:
+                server.drop_requests -= 1
+        if drop:
+            # The request was read (the job may be printing) but the answer never arrives
+            self.close_connection = True
+            return
+        status = server.status if operation == IppClient.OPERATION_PRINT_JOB else 0x0501  # operation-not-supported
+        parts = [b'\x01\x01', struct.pack('>HI', status, request_id),
+                 b'\x01', struct.pack('>BH', 0x47, 18), b'attributes-charset', struct.pack('>H', 5), b'utf-8']
+        if server.status_message:
+            message = server.status_message.encode('utf-8')
+            parts += [struct.pack('>BH', 0x41, 14), b'status-message', struct.pack('>H', len(message)), message]
+        if status <= 0x00FF:
+            parts += [b'\x02', struct.pack('>BH', 0x21, 6), b'job-id', struct.pack('>Hi', 4, job_id)]
+        parts.append(b'\x03')
+        response = b''.join(parts)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/ipp')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+        if server.close_after_response:
+            # Like an idle timeout in CUPS: the client still thinks the connection is kept alive
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_ipp_server():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), FakeIppHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.jobs = []  # (path, operation, request body) per request received
+    server.status = 0x0000  # successful-ok
+    server.status_message = None
+    server.drop_requests = 0
+    server.close_after_response = False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def bench_ipp(args):
+    document = QRLabelService().generate_label_pdf('https://assets.example.com/item/12345678', 'Asset tag 00001')
+    server = None
+    if args.server:
+        address = args.server
+    else:
+        server = start_fake_ipp_server()
+        address = f"127.0.0.1:{server.server_address[1]}"
+
+    print(f"{args.jobs} jobs of {len(document)} bytes to {args.printer} on {address}"
+          f"{' (fake IPP server)' if server else ''}")
+    for name, max_connections in (('new connection per job', 0), ('kept-alive connection', 1)):
+        client = IppClient(server=address, max_connections=max_connections)
+        start = time.perf_counter()
+        for _ in range(args.jobs):
+            client.print_job(args.printer, document)
+        seconds = time.perf_counter() - start
+        _report(name, seconds, args.jobs, 'job')
+        print(f"{'':<28} {args.jobs / seconds:9.0f} jobs/s  {client.stats()['connections_opened']:9d} connections")
+        client.close()
+
+    # What lpr costs before it even talks to CUPS: starting a process
+    if shutil.which('true'):
+        start = time.perf_counter()
+        for _ in range(args.jobs):
+            subprocess.run(['true'], input=document, capture_output=True)
+        _report('process launch only', time.perf_counter() - start, args.jobs, 'job')
+    if server:
+        server.shutdown()
+
+
+# ---------------------------------------------------------------------------
+# pipeline: upload, queue, crop and send through a null or file backend
+# ---------------------------------------------------------------------------
+
+def make_pick_list_pdf(rng, pages):
+    """Letter-size PDF with one labelled unit (serial number text) per page"""
+    packet = io.BytesIO()
+    c = canvas.Canvas(packet, pagesize=(8.5 * inch, 11 * inch))
+    for page in range(pages):
+        c.setFont('Helvetica', 11)
+        c.drawString(0.5 * inch, 10.3 * inch, f"Pick list page {page + 1}")
+        c.drawString(0.5 * inch, 10.0 * inch, f"S/N: K{rng.randint(10**9, 10**10 - 1)}   Qty 1")
+        for line in range(30):
+            c.drawString(0.5 * inch, (9.5 - line * 0.28) * inch,
+                         f"{line + 1:>3}  PN-{rng.randint(1000, 9999)}  Widget assembly  {rng.randint(1, 40)} EA")
+        c.showPage()
+    c.save()
+    return packet.getvalue()
+
+
+def bench_pipeline(args):
+    rng = random.Random(args.seed)
+    work_dir = tempfile.mkdtemp(prefix='print-bench-')
+    try:
+        pdf_path = os.path.join(work_dir, 'pick-list.pdf')
+        with open(pdf_path, 'wb') as f:
+            f.write(make_pick_list_pdf(rng, args.pages))
+        pdf_service = PDFProcessingService(upload_folder=work_dir)
+        file_id = pdf_service.process_pdf(pdf_path, 'pick-list.pdf')['id']
+
+        print_service = PrintService(pdf_service, print_backend=args.backend,
+                                     backend_options={'spool_dir': os.path.join(work_dir, 'spool')})
+        print_queue = PrintQueueService(print_service, max_pending=args.jobs)
+        printers = [f"Bench_Printer_{n + 1}" for n in range(args.printers)]
+
+        start = time.perf_counter()
+        job_ids = [
+            print_queue.submit(file_id, job % args.pages + 1, printers[job % len(printers)])['id']
+            for job in range(args.jobs)
+        ]
+        # The queue forgets finished jobs beyond its history limit, so a missing job is a finished one
+        while any((print_queue.get_job(job_id) or {'finished_at': True})['finished_at'] is None for job_id in job_ids):
+            time.sleep(0.005)
+        seconds = time.perf_counter() - start
+
+        stats = print_service.backend.stats()
+        print(f"{args.jobs} single-label jobs over {args.printers} printer queues, "
+              f"{args.backend} backend, {args.pages}-page upload")
+        _report('submit to last job done', seconds, args.jobs, 'job')
+        print(f"{'':<28} {args.jobs / seconds:9.0f} jobs/s  {stats['bytes'] / 1024:9.0f} KiB sent")
+        print(f"{'':<28} {stats['failed']} failed, {stats['avg_send_ms']} ms average in the backend")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+# ---------------------------------------------------------------------------
+# raw: PDF versus server-rendered ZPL/EPL for thermal printers
+# ---------------------------------------------------------------------------
+
+def bench_raw(args):
+    rng = random.Random(args.seed)
+    rows = make_asset_rows(rng, args.labels)
+    label_settings = {'width': args.width, 'height': args.height, 'printer_dpi': args.printer_dpi}
+    pdfs = [QRLabelService().generate_label_pdf(row['data'], row['label'], label_settings) for row in rows]
+
+    print_service = PrintService(None, print_backend='null')
+    if print_service._get_print_image(pdfs[0], print_service._raw_quality_settings(label_settings)) is None:
+        raise SystemExit("Rendering failed: the raw path needs pypdfium2 or pdftoppm (poppler) on PATH")
+
+    print(f"{args.labels} QR labels, {args.width}x{args.height} in, {args.printer_dpi} dpi printer, null backend")
+    for output_format in ('pdf', 'zpl', 'epl'):
+        print_service.backend = type(print_service.backend)(print_service)
+        settings = dict(label_settings, output_format=output_format)
+        start = time.perf_counter()
+        for pdf_bytes in pdfs:
+            success, message = print_service.send_label_pdf(pdf_bytes, 'Bench_Thermal', settings)
+            if not success:
+                raise SystemExit(message)
+        seconds = time.perf_counter() - start
+        sent = print_service.backend.stats()['bytes']
+        _report(f"{output_format.upper()} on the server", seconds, args.labels, 'label')
+        print(f"{'':<28} {sent / args.labels:9.0f} bytes/label")
+
+    # With PDF output this rasterization still happens, in the CUPS filter chain instead of here
+    quality_settings = print_service._raw_quality_settings(label_settings)
+    start = time.perf_counter()
+    for pdf_bytes in pdfs:
+        print_service._get_print_image(pdf_bytes, quality_settings)
+    _report('PDF rasterized by CUPS (est.)', time.perf_counter() - start, args.labels, 'label')
+
+
+# ---------------------------------------------------------------------------
+# raster: PrintService label rendering, pdftoppm process versus in-process pdfium
+# ---------------------------------------------------------------------------
+
+def bench_raster(args):
+    rng = random.Random(args.seed)
+    rows = make_asset_rows(rng, args.labels)
+    label_settings = {'width': args.width, 'height': args.height}
+    pdfs = [QRLabelService().generate_label_pdf(row['data'], row['label'], label_settings) for row in rows]
+    quality_settings = {'dpi': args.dpi, 'color_mode': 'monochrome', 'sharpening': True, 'threshold': 128}
+    print_service = PrintService(None, print_backend='null')
+
+    def render_all(threads):
+        if threads == 1:
+            return [print_service._get_print_image(pdf_bytes, quality_settings) for pdf_bytes in pdfs]
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            return list(executor.map(lambda pdf_bytes: print_service._get_print_image(pdf_bytes, quality_settings),
+                                     pdfs))
+
+    runs = []
+    if shutil.which('pdftoppm'):
+        runs.append(('pdftoppm process', PopplerRasterizer(), 1))
+    if PDFIUM_AVAILABLE:
+        runs.append(('pdfium in-process', PdfiumRasterizer(), 1))
+        runs.append((f'pdfium in-process, {args.workers} thr', PdfiumRasterizer(), args.workers))
+        runs.append((f'pdfium pool of {args.workers}', PdfiumRasterizer(workers=args.workers), args.workers))
+    if not runs:
+        raise SystemExit("Nothing to compare: install pypdfium2 or put pdftoppm (poppler) on PATH")
+
+    print(f"{args.labels} QR labels, {args.width}x{args.height} in, monochrome at {args.dpi} dpi")
+    reference = None
+    for name, rasterizer, threads in runs:
+        print_service.rasterizer = rasterizer
+        # Starts pool workers and loads pdfium before timing
+        render_all(threads)
+        start = time.perf_counter()
+        images = render_all(threads)
+        seconds = time.perf_counter() - start
+        rasterizer.close()
+        if any(image is None for image in images):
+            raise SystemExit(f"{name}: rendering failed")
+        _report(name, seconds, args.labels, 'label')
+        if reference is None:
+            reference = images
+            continue
+        # Renderers anti-alias edges differently; the threshold settles most of it
+        differing = total = 0
+        for image, expected in zip(images, reference):
+            if image.size != expected.size:
+                differing += image.width * image.height
+            else:
+                differing += sum(1 for a, b in zip(image.getdata(), expected.getdata()) if a != b)
+            total += image.width * image.height
+        print(f"{'':<28} {differing / total * 100:9.2f} % pixels differ from {runs[0][0]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    text = subparsers.add_parser('text', help='serial-number scanner on pick-list page text')
+    text.add_argument('--pages', type=int, default=300)
+    text.add_argument('--repeat', type=int, default=3)
+    text.add_argument('--seed', type=int, default=7)
+    text.set_defaults(func=bench_text)
+
+    qr = subparsers.add_parser('qr', help='QR label PDF generation, per label and in bulk')
+    qr.add_argument('--labels', type=int, default=2000)
+    qr.add_argument('--seed', type=int, default=7)
+    qr.add_argument('--cache-size', type=int, default=256)
+    qr.set_defaults(func=bench_qr)
+
+    ipp = subparsers.add_parser('ipp', help='IPP Print-Job submission against a fake or real CUPS server')
+    ipp.add_argument('--jobs', type=int, default=500)
+    ipp.add_argument('--server', help='host:port or Unix socket of a real CUPS server (default: in-process fake)')
+    ipp.add_argument('--printer', default='Fake_Label_Printer')
+    ipp.set_defaults(func=bench_ipp)
+
+    pipeline = subparsers.add_parser('pipeline', help='print queue, crop and backend throughput without a printer')
+    pipeline.add_argument('--pages', type=int, default=40)
+    pipeline.add_argument('--jobs', type=int, default=400)
+    pipeline.add_argument('--printers', type=int, default=2)
+    pipeline.add_argument('--backend', choices=['null', 'file'], default='null')
+    pipeline.add_argument('--seed', type=int, default=7)
+    pipeline.set_defaults(func=bench_pipeline)
+
+    raw = subparsers.add_parser('raw', help='payload size and latency of PDF versus ZPL/EPL output')
+    raw.add_argument('--labels', type=int, default=50)
+    raw.add_argument('--printer-dpi', type=int, default=203)
+    raw.add_argument('--width', type=float, default=2.0)
+    raw.add_argument('--height', type=float, default=1.0)
+    raw.add_argument('--seed', type=int, default=7)
+    raw.set_defaults(func=bench_raw)
+
+    raster = subparsers.add_parser('raster', help='label rasterization, pdftoppm process versus in-process pdfium')
+    raster.add_argument('--labels', type=int, default=100)
+    raster.add_argument('--dpi', type=int, default=203)
+    raster.add_argument('--workers', type=int, default=2)
+    raster.add_argument('--width', type=float, default=2.0)
+    raster.add_argument('--height', type=float, default=1.0)
+    raster.add_argument('--seed', type=int, default=7)
+    raster.set_defaults(func=bench_raster)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
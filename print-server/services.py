@@ -9,10 +9,28 @@ import platform
 import subprocess
 from reportlab.lib.units import inch
 from reportlab.pdfgen import canvas
+from reportlab.pdfgen.pathobject import PDFPathObject
+from reportlab.graphics.barcode import qrencoder
 from PIL import Image, ImageFilter, ImageEnhance
 import threading
 import datetime
 import hashlib
+import time
+import sqlite3
+import tempfile
+import collections
+import bisect
+import csv
+import queue
+import contextlib
+import itertools
+import http.client
+import select
+import socket
+import struct
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 # Windows-specific imports for native printing
 WINDOWS_PRINT_AVAILABLE = False
@@ -26,56 +44,855 @@ if platform.system() == 'Windows':
     except ImportError:
         logging.warning("win32print not available. Install pywin32 for native Windows printing.")
 
+# Optional in-process PDF rendering; without pypdfium2 labels are rasterized by Poppler's pdftoppm
+try:
+    import pypdfium2
+    PDFIUM_AVAILABLE = True
+except ImportError:
+    PDFIUM_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+
+def _clamp(value, minimum, maximum):
+    return max(minimum, min(maximum, value))
+
+
+def normalize_barcode(value):
+    """Normalize barcode strings for reliable matching.
+
+    - Uppercase
+    - Strip leading/trailing whitespace
+    - Remove ASCII control characters (common in DataMatrix/GS1 scanner output)
+    """
+    if value is None:
+        return ''
+    s = str(value).strip().upper()
+    # Remove control characters (0x00-0x1F and 0x7F)
+    return ''.join(ch for ch in s if (ord(ch) >= 32 and ord(ch) != 127))
+
+
+class JournalStore:
+    """Snapshot + append-only journal persistence for PDFProcessingService.
+
+    ``db.json`` holds the last compacted snapshot and ``db.journal`` holds one
+    JSON record per change made since then, so logging a print job appends a
+    single line instead of rewriting the whole history. Once the journal
+    reaches ``compact_every`` records it is folded into a fresh snapshot.
+
+    Journal records carry an increasing ``seq`` and the snapshot stores the
+    last one it includes (``journal_seq``). A crash between writing the
+    snapshot and truncating the journal then leaves records that ``load``
+    skips instead of applying twice.
+    """
+
+    def __init__(self, snapshot_path, compact_every=1000):
+        self.snapshot_path = snapshot_path
+        self.journal_path = os.path.splitext(snapshot_path)[0] + '.journal'
+        self.compact_every = compact_every
+        self.pending_records = 0
+        # seq of the last record written to (or replayed from) the journal
+        self.seq = 0
+        self.print_jobs = []
+        self._lock = threading.Lock()
+
+    @property
+    def needs_compaction(self):
+        return self.pending_records >= self.compact_every
+
+    def load(self):
+        state = {'documents': {}, 'mappings': {}, 'print_jobs': [], 'users': [], 'settings': {}}
+        snapshot_seq = 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r') as f:
+                data = json.load(f)
+            for key in state:
+                state[key] = data.get(key, state[key])
+            snapshot_seq = data.get('journal_seq', 0)
+        self.seq = snapshot_seq
+
+        replayed = 0
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'r') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A crash mid-append can leave a torn last line; everything
+                        # before it is intact, so stop replaying there.
+                        logger.warning("Ignoring truncated record at end of DB journal")
+                        break
+                    seq = record.get('seq')
+                    if seq is not None:
+                        if seq <= snapshot_seq:
+                            # Already folded into the snapshot by an interrupted compaction
+                            continue
+                        self.seq = max(self.seq, seq)
+                    self._apply_record(state, record)
+                    replayed += 1
+        self.pending_records = replayed
+        self.print_jobs = state['print_jobs']
+        return state
+
+    def append(self, op, **payload):
+        with self._lock:
+            self.seq += 1
+            line = json.dumps(dict(payload, op=op, seq=self.seq)) + '\n'
+            with open(self.journal_path, 'a') as f:
+                f.write(line)
+            self.pending_records += 1
+            if op == 'print_job':
+                self.print_jobs.append(payload['job'])
+            elif op == 'print_job_updated':
+                self._replace_print_job(self.print_jobs, payload['job'])
+
+    def compact(self, state):
+        """Write ``state`` plus the print history as the new snapshot and truncate the journal."""
+        with self._lock:
+            state = dict(state, print_jobs=self.print_jobs, journal_seq=self.seq)
+            tmp_path = self.snapshot_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+            # The snapshot now covers every journaled change
+            open(self.journal_path, 'w').close()
+            self.pending_records = 0
+
+    def _apply_record(self, state, record):
+        op = record.get('op')
+        if op == 'print_job':
+            state['print_jobs'].append(record['job'])
+        elif op == 'print_job_updated':
+            self._replace_print_job(state['print_jobs'], record['job'])
+        elif op == 'document_added':
+            document = record['document']
+            state['documents'][document['id']] = document
+            state['mappings'].update(record.get('mappings', {}))
+        elif op == 'document_deleted':
+            file_id = record['file_id']
+            state['documents'].pop(file_id, None)
+            state['mappings'] = {k: v for k, v in state['mappings'].items() if v['file_id'] != file_id}
+        elif op == 'users':
+            state['users'] = record['users']
+        elif op == 'settings':
+            state['settings'] = record['settings']
+        else:
+            logger.warning(f"Skipping unknown DB journal record: {op}")
+
+    def _replace_print_job(self, print_jobs, job):
+        # Updates are for recent (queued) jobs, so search from the end
+        for i in range(len(print_jobs) - 1, -1, -1):
+            if print_jobs[i].get('id') == job['id']:
+                print_jobs[i] = job
+                return
+
+    def get_print_job(self, job_id):
+        with self._lock:
+            for job in reversed(self.print_jobs):
+                if job.get('id') == job_id:
+                    return job
+        return None
+
+    def get_print_history(self):
+        # Return sorted by timestamp desc
+        return sorted(self.print_jobs, key=lambda x: x['timestamp'], reverse=True)
+
+    def iter_print_jobs(self):
+        """Yield print jobs in the order they were logged."""
+        return iter(list(self.print_jobs))
+
+
+class SQLiteStore:
+    """SQLite persistence for PDFProcessingService.
+
+    Documents, mappings and users are mirrored in memory by the service, but
+    print history stays on disk and is answered through indexed queries, so
+    memory no longer grows with the number of jobs printed. On first start an
+    existing ``db.json`` (plus journal) is imported and renamed to
+    ``*.migrated``. A ``meta`` row written in the same transaction as the
+    imported data records that the import is done, so an import that failed
+    is retried on the next start instead of leaving an empty database.
+    """
+
+    needs_compaction = False
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS documents (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS mappings (
+            barcode TEXT PRIMARY KEY,
+            normalized TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            page_num INTEGER,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_mappings_normalized ON mappings (normalized);
+        CREATE INDEX IF NOT EXISTS idx_mappings_file_page ON mappings (file_id, page_num);
+        CREATE TABLE IF NOT EXISTS print_jobs (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT,
+            file_id TEXT,
+            page_num INTEGER,
+            status TEXT,
+            timestamp TEXT,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_print_jobs_file_page ON print_jobs (file_id, page_num);
+        CREATE INDEX IF NOT EXISTS idx_print_jobs_status ON print_jobs (status);
+        CREATE INDEX IF NOT EXISTS idx_print_jobs_timestamp ON print_jobs (timestamp);
+        CREATE INDEX IF NOT EXISTS idx_print_jobs_id ON print_jobs (id);
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS settings (
+            name TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            name TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+    '''
+
+    def __init__(self, db_path, legacy_snapshot_path=None):
+        self.db_path = db_path
+        self.legacy_snapshot_path = legacy_snapshot_path
+        self._lock = threading.Lock()
+        # Flask serves requests from several threads; access is serialized by _lock
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(self.SCHEMA)
+        if legacy_snapshot_path and self._needs_json_migration():
+            self._migrate_json(legacy_snapshot_path)
+
+    def _needs_json_migration(self):
+        if self.conn.execute("SELECT 1 FROM meta WHERE name = 'json_migrated'").fetchone():
+            return False
+        # Databases created before the meta table: only import into one that holds no documents or history yet
+        return not (self.conn.execute('SELECT 1 FROM documents LIMIT 1').fetchone()
+                    or self.conn.execute('SELECT 1 FROM print_jobs LIMIT 1').fetchone())
+
+    def _migrate_json(self, snapshot_path):
+        legacy = JournalStore(snapshot_path)
+        if not (os.path.exists(legacy.snapshot_path) or os.path.exists(legacy.journal_path)):
+            with self._lock, self.conn:
+                self._mark_json_migrated()
+            return
+
+        state = legacy.load()
+        with self._lock, self.conn:
+            self._mark_json_migrated()
+            for document in state['documents'].values():
+                self._put_document(document)
+            self._put_mappings(state['mappings'])
+            for job in state['print_jobs']:
+                self._insert_print_job(job)
+            self._put_users(state['users'])
+            self._put_settings(state['settings'])
+
+        for path in (legacy.snapshot_path, legacy.journal_path):
+            if os.path.exists(path):
+                os.replace(path, path + '.migrated')
+        logger.info(
+            f"Migrated {len(state['documents'])} documents and {len(state['print_jobs'])} print jobs "
+            f"from {snapshot_path} to {self.db_path}"
+        )
+
+    def _mark_json_migrated(self):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO meta (name, value) VALUES ('json_migrated', ?)",
+            (datetime.datetime.now().isoformat(),)
+        )
+
+    def load(self):
+        with self._lock:
+            documents = {
+                doc_id: json.loads(data)
+                for doc_id, data in self.conn.execute('SELECT id, data FROM documents ORDER BY rowid')
+            }
+            mappings = {
+                barcode: json.loads(data)
+                for barcode, data in self.conn.execute('SELECT barcode, data FROM mappings ORDER BY rowid')
+            }
+            users = [json.loads(data) for (data,) in self.conn.execute('SELECT data FROM users ORDER BY rowid')]
+            settings = {name: json.loads(data) for name, data in self.conn.execute('SELECT name, data FROM settings')}
+        return {'documents': documents, 'mappings': mappings, 'users': users, 'settings': settings}
+
+    def append(self, op, **payload):
+        with self._lock, self.conn:
+            if op == 'print_job':
+                self._insert_print_job(payload['job'])
+            elif op == 'print_job_updated':
+                job = payload['job']
+                self.conn.execute(
+                    'UPDATE print_jobs SET status = ?, timestamp = ?, data = ? WHERE id = ?',
+                    (job['status'], job['timestamp'], json.dumps(job), job['id'])
+                )
+            elif op == 'document_added':
+                self._put_document(payload['document'])
+                self._put_mappings(payload.get('mappings', {}))
+            elif op == 'document_deleted':
+                self.conn.execute('DELETE FROM mappings WHERE file_id = ?', (payload['file_id'],))
+                self.conn.execute('DELETE FROM documents WHERE id = ?', (payload['file_id'],))
+            elif op == 'users':
+                self._put_users(payload['users'])
+            elif op == 'settings':
+                self._put_settings(payload['settings'])
+            else:
+                raise ValueError(f"Unknown DB change: {op}")
+
+    def compact(self, state):
+        # Every change is committed as it happens; there is no snapshot to write.
+        pass
+
+    def _put_document(self, document):
+        self.conn.execute(
+            'INSERT INTO documents (id, data) VALUES (?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET data = excluded.data',
+            (document['id'], json.dumps(document))
+        )
+
+    def _put_mappings(self, mappings):
+        # Upsert (not REPLACE) keeps the original rowid, so load order matches dict order
+        self.conn.executemany(
+            'INSERT INTO mappings (barcode, normalized, file_id, page_num, data) VALUES (?, ?, ?, ?, ?) '
+            'ON CONFLICT(barcode) DO UPDATE SET normalized = excluded.normalized, '
+            'file_id = excluded.file_id, page_num = excluded.page_num, data = excluded.data',
+            [
+                (barcode, normalize_barcode(barcode), mapping['file_id'], mapping['page_num'], json.dumps(mapping))
+                for barcode, mapping in mappings.items()
+            ]
+        )
+
+    def _put_users(self, users):
+        self.conn.execute('DELETE FROM users')
+        self.conn.executemany(
+            'INSERT INTO users (username, data) VALUES (?, ?)',
+            [(user.get('username'), json.dumps(user)) for user in users]
+        )
+
+    def _put_settings(self, settings):
+        self.conn.execute('DELETE FROM settings')
+        self.conn.executemany(
+            'INSERT INTO settings (name, data) VALUES (?, ?)',
+            [(name, json.dumps(value)) for name, value in settings.items()]
+        )
+
+    def _insert_print_job(self, job):
+        self.conn.execute(
+            'INSERT INTO print_jobs (id, file_id, page_num, status, timestamp, data) VALUES (?, ?, ?, ?, ?, ?)',
+            (job.get('id'), job['file_id'], job['page_num'], job['status'], job['timestamp'], json.dumps(job))
+        )
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def get_print_job(self, job_id):
+        rows = self._query('SELECT data FROM print_jobs WHERE id = ? ORDER BY seq DESC LIMIT 1', (job_id,))
+        return json.loads(rows[0][0]) if rows else None
+
+    def get_print_history(self):
+        rows = self._query('SELECT data FROM print_jobs ORDER BY timestamp DESC, seq')
+        return [json.loads(data) for (data,) in rows]
+
+    def iter_print_jobs(self, batch_size=1000):
+        """Yield print jobs in the order they were logged, a batch at a time."""
+        last_seq = 0
+        while True:
+            rows = self._query(
+                'SELECT seq, data FROM print_jobs WHERE seq > ? ORDER BY seq LIMIT ?',
+                (last_seq, batch_size)
+            )
+            if not rows:
+                return
+            for seq, data in rows:
+                yield json.loads(data)
+            last_seq = rows[-1][0]
+
+
+class SubstringAutomaton:
+    """Aho-Corasick automaton reporting which patterns occur inside a text.
+
+    ``find_all`` only reads the automaton; ``add`` and ``remove`` leave it
+    ready to search, so callers just serialize mutations and searches (the
+    service does this with ``db_lock``). Rebuilding the failure links costs
+    time proportional to the whole trie, so newly added patterns wait in a
+    small pending set that is checked directly, and are merged into the trie
+    in batches. Removal only clears the terminal marker (output links skip
+    removed patterns), and the trie is rebuilt once dead nodes outnumber
+    live patterns.
+    """
+
+    # Pending patterns are merged once there are more than this, or more than live/16
+    PENDING_LIMIT = 256
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._goto = [{}]      # node -> {char: child node}
+        self._fail = [0]       # node -> longest proper suffix node
+        self._output = [0]     # node -> nearest terminal node on the fail chain
+        self._terminal = [None]  # node -> pattern ending here
+        self._pending = set()  # live patterns not yet in the trie
+        self._live = 0
+        self._dead = 0
+
+    def __len__(self):
+        return self._live
+
+    def add(self, patterns):
+        for pattern in patterns:
+            if pattern in self._pending or self._find_node(pattern) is not None:
+                continue
+            self._pending.add(pattern)
+            self._live += 1
+        if len(self._pending) > max(self.PENDING_LIMIT, self._live // 16):
+            self._merge_pending()
+
+    def remove(self, patterns):
+        for pattern in patterns:
+            if pattern in self._pending:
+                self._pending.discard(pattern)
+                self._live -= 1
+                continue
+            node = self._find_node(pattern)
+            if node is not None:
+                self._terminal[node] = None
+                self._live -= 1
+                self._dead += 1
+        if self._dead > max(self._live, 1024):
+            self._rebuild()
+
+    def _find_node(self, pattern):
+        """Node of ``pattern`` if it is a live pattern in the trie."""
+        node = 0
+        for ch in pattern:
+            node = self._goto[node].get(ch)
+            if node is None:
+                return None
+        return node if self._terminal[node] is not None else None
+
+    def _insert(self, pattern):
+        node = 0
+        for ch in pattern:
+            child = self._goto[node].get(ch)
+            if child is None:
+                child = len(self._goto)
+                self._goto[node][ch] = child
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(0)
+                self._terminal.append(None)
+            node = child
+        self._terminal[node] = pattern
+
+    def _merge_pending(self):
+        for pattern in self._pending:
+            self._insert(pattern)
+        self._pending = set()
+        # New nodes and terminals change links all over the trie
+        self._build_links()
+
+    def _rebuild(self):
+        patterns = [p for p in self._terminal if p is not None]
+        pending = self._pending
+        self._reset()
+        for pattern in patterns:
+            self._insert(pattern)
+        self._pending = pending
+        self._live = len(patterns) + len(pending)
+        self._merge_pending()
+
+    def _build_links(self):
+        queue = collections.deque()
+        for child in self._goto[0].values():
+            self._fail[child] = 0
+            self._output[child] = 0
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                suffix = self._fail[child]
+                self._output[child] = suffix if self._terminal[suffix] is not None else self._output[suffix]
+                queue.append(child)
+
+    def find_all(self, text):
+        """Return the set of live patterns occurring anywhere in ``text``."""
+        if not self._live:
+            return set()
+        found = {pattern for pattern in self._pending if pattern in text}
+        goto, fail, output, terminal = self._goto, self._fail, self._output, self._terminal
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            match = node if terminal[node] is not None else output[node]
+            while match:
+                # Output links may pass through removed patterns; skip those
+                if terminal[match] is not None:
+                    found.add(terminal[match])
+                match = output[match]
+        return found
+
+
+class BarcodeIndex:
+    """Lookup structures over the barcode keys of ``PDFProcessingService.mappings``.
+
+    - exact: normalized barcode -> original keys (in mappings order)
+    - "key contained in scan": Aho-Corasick automaton over normalized keys
+    - "scan contained in key": trigram postings over normalized keys
+
+    Each key also gets a rank that follows mappings (dict) order, so partial
+    matches keep the original deterministic tie-breaking. Like the mappings it
+    indexes, it is only changed and searched under ``db_lock``.
+    """
+
+    MIN_PARTIAL_LENGTH = 6
+    NGRAM = 3
+
+    def __init__(self, barcodes=()):
+        self.keys_by_norm = {}
+        self.rank = {}
+        self._next_rank = 0
+        self.automaton = SubstringAutomaton()
+        self.ngrams = {}  # trigram -> set of normalized keys containing it
+        self.add(barcodes)
+
+    def _ngrams(self, value):
+        return {value[i:i + self.NGRAM] for i in range(len(value) - self.NGRAM + 1)}
+
+    def add(self, barcodes):
+        added = []
+        for barcode in barcodes:
+            if barcode in self.rank:
+                continue
+            self.rank[barcode] = self._next_rank
+            self._next_rank += 1
+            norm = normalize_barcode(barcode)
+            keys = self.keys_by_norm.setdefault(norm, [])
+            keys.append(barcode)
+            if len(keys) == 1 and len(norm) >= self.MIN_PARTIAL_LENGTH:
+                added.append(norm)
+                for gram in self._ngrams(norm):
+                    self.ngrams.setdefault(gram, set()).add(norm)
+        self.automaton.add(added)
+
+    def remove(self, barcodes):
+        removed = []
+        for barcode in barcodes:
+            if self.rank.pop(barcode, None) is None:
+                continue
+            norm = normalize_barcode(barcode)
+            keys = self.keys_by_norm[norm]
+            keys.remove(barcode)
+            if keys:
+                continue
+            del self.keys_by_norm[norm]
+            if len(norm) >= self.MIN_PARTIAL_LENGTH:
+                removed.append(norm)
+                for gram in self._ngrams(norm):
+                    postings = self.ngrams.get(gram)
+                    if postings is not None:
+                        postings.discard(norm)
+                        if not postings:
+                            del self.ngrams[gram]
+        self.automaton.remove(removed)
+
+    def find_exact(self, raw):
+        keys = self.keys_by_norm.get(raw)
+        return keys[0] if keys else None
+
+    def _norms_containing(self, raw):
+        if len(raw) < self.NGRAM:
+            return {norm for norm in self.keys_by_norm if len(norm) >= self.MIN_PARTIAL_LENGTH and raw in norm}
+        postings = []
+        for gram in self._ngrams(raw):
+            matches = self.ngrams.get(gram)
+            if not matches:
+                return set()
+            postings.append(matches)
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for matches in postings[1:]:
+            candidates &= matches
+            if not candidates:
+                break
+        return {norm for norm in candidates if raw in norm}
+
+    def find_best_partial(self, raw):
+        """Most specific key whose normalized form contains, or is contained in, ``raw``.
+
+        Same ordering as the original linear scan: longest normalized key
+        first, then keys found inside the scan, then earliest in mappings order.
+        """
+        norms = self.automaton.find_all(raw) | self._norms_containing(raw)
+        if not norms:
+            return None
+
+        def sort_key(norm):
+            contained_in_scan = 1 if norm in raw else 0
+            return (len(norm), contained_in_scan, -self.rank[self.keys_by_norm[norm][0]])
+
+        best_norm = max(norms, key=sort_key)
+        return self.keys_by_norm[best_norm][0]
+
+
+class PdfReaderCache:
+    """LRU of parsed ``pypdf.PdfReader`` objects keyed by file_id.
+
+    Each entry remembers the file's (mtime, size) and is reparsed when the file
+    changes. A reader is not safe to share between threads, so ``open`` holds
+    the entry's own lock while the caller uses it; different documents can
+    still be read in parallel.
+    """
+
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()  # file_id -> entry dict
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @contextlib.contextmanager
+    def open(self, file_id, pdf_path):
+        stat = os.stat(pdf_path)
+        signature = (pdf_path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(file_id)
+            if entry is not None and entry['signature'] == signature:
+                self._entries.move_to_end(file_id)
+                self.hits += 1
+            else:
+                entry = {'signature': signature, 'reader': None, 'lock': threading.Lock()}
+                self._entries[file_id] = entry
+                self.misses += 1
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+
+        with entry['lock']:
+            if entry['reader'] is None:
+                # Parse from memory so the cached reader never holds the file open
+                with open(pdf_path, 'rb') as file:
+                    entry['reader'] = pypdf.PdfReader(io.BytesIO(file.read()))
+            yield entry['reader']
+
+    def invalidate(self, file_id):
+        with self._lock:
+            self._entries.pop(file_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'max_entries': self.max_entries,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+class PageCropCache:
+    """Byte-budgeted LRU of cropped single-page PDFs.
+
+    Keys are ``(file_hash, page_num, crop)`` where ``crop`` is the normalized
+    crop settings, so the same label is served from memory no matter which
+    document entry or request shape asked for it. Each value carries a content
+    hash used as the preview's strong ETag.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()  # key -> (pdf_bytes, etag)
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, pdf_bytes):
+        entry = (pdf_bytes, hashlib.sha256(pdf_bytes).hexdigest()[:32])
+        if len(pdf_bytes) > self.max_bytes:
+            return entry
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[0])
+            self._entries[key] = entry
+            self._size += len(pdf_bytes)
+            while self._size > self.max_bytes:
+                _key, (evicted, _etag) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+        return entry
+
+    def invalidate(self, file_hash):
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == file_hash]:
+                self._size -= len(self._entries.pop(key)[0])
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._size, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+
 class PDFProcessingService:
-    def __init__(self, upload_folder):
+    # Pages read with both passes before an adaptive document picks its profile
+    ADAPTIVE_PROBE_PAGES = 3
+    # Print job statuses logged by the print queue before the outcome is known
+    UNFINISHED_PRINT_STATUSES = ('queued', 'printing')
+    # label_settings that affect the cropped page, with the defaults _extract_page_bytes uses
+    CROP_SETTING_DEFAULTS = (('width', 3.94), ('height', 1.5), ('offsetX', 0), ('offsetY', 0), ('scale', 100))
+
+    def __init__(self, upload_folder, storage_backend='json', journal_compact_every=1000, extraction_workers=0,
+                 extraction_strategy='full', reader_cache_size=16, crop_cache_bytes=32 * 1024 * 1024):
         self.upload_folder = upload_folder
+        # Parsed readers for preview/print, so a page request does not reparse the whole PDF
+        self.reader_cache = PdfReaderCache(max_entries=reader_cache_size)
+        # Cropped pages, so repeat previews and prints skip pypdf entirely
+        self.crop_cache = PageCropCache(max_bytes=crop_cache_bytes)
+        # Worker processes for page text extraction; 0/1 extracts on the request thread
+        self.extraction_workers = extraction_workers
+        # 'full' runs the default and layout passes on every page; 'adaptive'
+        # skips the layout pass where the document profile says it adds nothing
+        if extraction_strategy not in ('full', 'adaptive'):
+            raise ValueError(f"Unknown extraction strategy: {extraction_strategy}")
+        self.extraction_strategy = extraction_strategy
+        self._extraction_pool = None
+        self._extraction_pool_lock = threading.Lock()
+        self._ingesting = set()  # file_ids whose pages are still being extracted
         self.documents = {}  # In-memory store for now, or load from JSON
         self.mappings = {}   # Map barcode -> {file_id, page_num, etc}
         self.hashes = {}     # Map hash -> file_id
-        self.print_jobs = [] # List of print jobs
+        self.barcode_index = BarcodeIndex()  # Exact/partial lookup over mapping keys
+        self.document_barcodes = {}  # Map file_id -> [(page_num, rank, barcode)], sorted
+        # Print aggregates, maintained by log_print_job so stats never scan history:
+        # file_id -> page_num -> {'success': n, 'failed': n, 'last_success': job}
+        self.page_print_stats = {}
+        self.print_status_counts = {}  # status -> number of jobs
         self.users = []      # List of user accounts
+        self.settings = {}   # Station-wide settings, e.g. the default 'label_settings'
+        # Print history is owned by the store (in memory for JSON, on disk for SQLite)
         self.db_path = os.path.join(upload_folder, 'db.json')
+        if storage_backend == 'sqlite':
+            self.store = SQLiteStore(os.path.join(upload_folder, 'db.sqlite3'), legacy_snapshot_path=self.db_path)
+        elif storage_backend == 'json':
+            self.store = JournalStore(self.db_path, compact_every=journal_compact_every)
+        else:
+            raise ValueError(f"Unknown storage backend: {storage_backend}")
+        # Serializes state changes with their journal records so a compaction
+        # never snapshots a change whose record is still about to be appended.
+        self.db_lock = threading.RLock()
         self.load_db()
         self.ensure_default_admin()
 
     def load_db(self):
-        if os.path.exists(self.db_path):
-            try:
-                with open(self.db_path, 'r') as f:
-                    data = json.load(f)
-                    self.documents = data.get('documents', {})
-                    self.mappings = data.get('mappings', {})
-                    self.print_jobs = data.get('print_jobs', [])
-                    self.users = data.get('users', [])
-                    # Rebuild hash map
-                    self.hashes = {doc['hash']: doc_id for doc_id, doc in self.documents.items() if 'hash' in doc}
-            except Exception as e:
-                logger.error(f"Failed to load DB: {e}")
+        try:
+            data = self.store.load()
+            self.documents = data['documents']
+            self.mappings = data['mappings']
+            self.users = data['users']
+            self.settings = data.get('settings', {})
+            # Rebuild hash map
+            self.hashes = {doc['hash']: doc_id for doc_id, doc in self.documents.items() if 'hash' in doc}
+            self.barcode_index = BarcodeIndex(self.mappings)
+            self.document_barcodes = {}
+            for barcode, mapping in self.mappings.items():
+                self._index_document_barcode(mapping['file_id'], barcode, mapping['page_num'])
+            self.page_print_stats = {}
+            self.print_status_counts = {}
+            unfinished = []
+            for job in self.store.iter_print_jobs():
+                self._count_print_job(job)
+                if job['status'] in self.UNFINISHED_PRINT_STATUSES:
+                    unfinished.append(job['id'])
+        except Exception as e:
+            logger.error(f"Failed to load DB: {e}")
+            return
+
+        # The print queue lives in memory; jobs it held when the server stopped never printed
+        for job_id in unfinished:
+            self.update_print_job(job_id, status='failed', error='Server stopped before the job was printed')
+
+        if self.store.needs_compaction:
+            self.save_db()
 
     def save_db(self):
-        try:
-            with open(self.db_path, 'w') as f:
-                json.dump({
+        """Compact all state into a fresh db.json snapshot."""
+        with self.db_lock:
+            try:
+                self.store.compact({
                     'documents': self.documents,
                     'mappings': self.mappings,
-                    'print_jobs': self.print_jobs,
-                    'users': self.users
-                }, f, indent=2)
+                    'users': self.users,
+                    'settings': self.settings
+                })
+            except Exception as e:
+                logger.error(f"Failed to save DB: {e}")
+
+    def _index_document_barcode(self, file_id, barcode, page_num):
+        # Rank follows mappings order, so equal pages keep their original order
+        entry = (page_num, self.barcode_index.rank[barcode], barcode)
+        bisect.insort(self.document_barcodes.setdefault(file_id, []), entry)
+
+    def _unindex_document_barcode(self, file_id, barcode, page_num):
+        entries = self.document_barcodes.get(file_id)
+        if not entries:
+            return
+        entry = (page_num, self.barcode_index.rank[barcode], barcode)
+        i = bisect.bisect_left(entries, entry)
+        if i < len(entries) and entries[i] == entry:
+            del entries[i]
+
+    def _get_document_mappings(self, file_id):
+        """Mappings of one document, sorted by page number."""
+        return [
+            {'barcode': barcode, **self.mappings[barcode]}
+            for _page_num, _rank, barcode in self.document_barcodes.get(file_id, [])
+        ]
+
+    def _record(self, op, **payload):
+        """Journal a single change; callers hold ``db_lock``."""
+        try:
+            self.store.append(op, **payload)
         except Exception as e:
-            logger.error(f"Failed to save DB: {e}")
+            logger.error(f"Failed to write DB journal: {e}")
+            return
+        # A snapshot taken mid-ingestion would hold a half-extracted document
+        # with no journal record to complete it, so wait until ingestion ends
+        if self.store.needs_compaction and not self._ingesting:
+            self.save_db()
 
     def ensure_default_admin(self):
         if not self.users:
-            self.users = [
-                {
-                    'username': 'admin',
-                    'password': 'admin',
-                    'role': 'admin'
-                }
-            ]
-            self.save_db()
+            with self.db_lock:
+                self.users = [
+                    {
+                        'username': 'admin',
+                        'password': 'admin',
+                        'role': 'admin'
+                    }
+                ]
+                self._record('users', users=self.users)
 
     def get_public_users(self):
         return [
@@ -96,12 +913,13 @@ class PDFProcessingService:
         if self.find_user(username):
             return False, 'Username already exists'
 
-        self.users.append({
-            'username': username,
-            'password': password,
-            'role': role or 'user'
-        })
-        self.save_db()
+        with self.db_lock:
+            self.users.append({
+                'username': username,
+                'password': password,
+                'role': role or 'user'
+            })
+            self._record('users', users=self.users)
         return True, None
 
     def delete_user(self, username):
@@ -114,8 +932,9 @@ class PDFProcessingService:
             if admin_count <= 1:
                 return False, 'Cannot delete the last admin'
 
-        self.users = [u for u in self.users if u.get('username') != username]
-        self.save_db()
+        with self.db_lock:
+            self.users = [u for u in self.users if u.get('username') != username]
+            self._record('users', users=self.users)
         return True, None
 
     def reset_user_password(self, username, new_password):
@@ -123,8 +942,9 @@ class PDFProcessingService:
         if not user:
             return False, 'User not found'
 
-        user['password'] = new_password
-        self.save_db()
+        with self.db_lock:
+            user['password'] = new_password
+            self._record('users', users=self.users)
         return True, None
 
     def change_user_password(self, username, current_password, new_password):
@@ -135,8 +955,9 @@ class PDFProcessingService:
         if user.get('password') != current_password:
             return False, 'Current password is incorrect'
 
-        user['password'] = new_password
-        self.save_db()
+        with self.db_lock:
+            user['password'] = new_password
+            self._record('users', users=self.users)
         return True, None
 
     def authenticate_user(self, username, password):
@@ -152,17 +973,79 @@ class PDFProcessingService:
             'role': user.get('role', 'user')
         }
 
+    def get_label_settings(self):
+        """The station's saved default label settings ({} until the settings page saves them)."""
+        return dict(self.settings.get('label_settings', {}))
+
+    def set_label_settings(self, label_settings):
+        if not isinstance(label_settings, dict):
+            raise ValueError("label_settings must be an object")
+        with self.db_lock:
+            self.settings = dict(self.settings, label_settings=label_settings)
+            self._record('settings', settings=self.settings)
+
     def log_print_job(self, job_data):
-        self.print_jobs.append(job_data)
-        self.save_db()
+        with self.db_lock:
+            self._record('print_job', job=job_data)
+            self._count_print_job(job_data)
+
+    def get_print_job(self, job_id):
+        return self.store.get_print_job(job_id)
+
+    def update_print_job(self, job_id, **fields):
+        """Apply ``fields`` (status, error, ...) to a logged job that has not finished yet.
+
+        Used by the print queue, which logs a job as 'queued' when it is
+        accepted and fills in the outcome once the printer is done.
+        """
+        with self.db_lock:
+            job = self.store.get_print_job(job_id)
+            if job is None:
+                return None
+            updated = dict(job, **fields)
+            self._record('print_job_updated', job=updated)
+            self._uncount_print_job(job)
+            self._count_print_job(updated)
+            return updated
+
+    def _count_print_job(self, job):
+        status = job['status']
+        self.print_status_counts[status] = self.print_status_counts.get(status, 0) + 1
+
+        page_stats = self.page_print_stats.setdefault(job['file_id'], {}).setdefault(
+            job['page_num'], {'success': 0, 'failed': 0, 'unfinished': 0, 'last_success': None}
+        )
+        if status in ('success', 'failed'):
+            page_stats[status] += 1
+        elif status in self.UNFINISHED_PRINT_STATUSES:
+            page_stats['unfinished'] += 1
+        if status == 'success':
+            last = page_stats['last_success']
+            # Strictly newer only: among equal timestamps the first logged job wins
+            if last is None or job['timestamp'] > last['timestamp']:
+                page_stats['last_success'] = job
+
+    def _uncount_print_job(self, job):
+        # Only unfinished jobs are ever updated, so last_success never needs rolling back
+        status = job['status']
+        self.print_status_counts[status] -= 1
+        if not self.print_status_counts[status]:
+            del self.print_status_counts[status]
+        page_stats = self.page_print_stats[job['file_id']][job['page_num']]
+        if status in ('success', 'failed'):
+            page_stats[status] -= 1
+        elif status in self.UNFINISHED_PRINT_STATUSES:
+            page_stats['unfinished'] -= 1
+
+    def _get_page_print_stats(self, file_id, page_num):
+        return self.page_print_stats.get(file_id, {}).get(page_num)
 
     def get_print_history(self):
         # Return sorted by timestamp desc
-        return sorted(self.print_jobs, key=lambda x: x['timestamp'], reverse=True)
+        return self.store.get_print_history()
 
     def get_barcode_print_count(self, barcode):
         """Count how many times a barcode was printed"""
-        count = 0
         # Find the mapping for this barcode to get file_id and page_num
         _matched, mapping = self.resolve_barcode(barcode)
         if not mapping:
@@ -171,10 +1054,8 @@ class PDFProcessingService:
         file_id = mapping['file_id']
         page_num = mapping['page_num']
         
-        for job in self.print_jobs:
-            if job['file_id'] == file_id and job['page_num'] == page_num and job['status'] == 'success':
-                count += 1
-        return count
+        page_stats = self._get_page_print_stats(file_id, page_num)
+        return page_stats['success'] if page_stats else 0
 
     def get_last_print_for_barcode(self, barcode):
         """Get the last successful print job for a barcode"""
@@ -185,37 +1066,33 @@ class PDFProcessingService:
         file_id = mapping['file_id']
         page_num = mapping['page_num']
         
-        # Sort jobs by timestamp desc and find first matching
-        sorted_jobs = sorted(self.print_jobs, key=lambda x: x['timestamp'], reverse=True)
-        for job in sorted_jobs:
-            if job['file_id'] == file_id and job['page_num'] == page_num and job['status'] == 'success':
-                return {
-                    'timestamp': job['timestamp'],
-                    'printer': job.get('printer', 'Default')
-                }
+        page_stats = self._get_page_print_stats(file_id, page_num)
+        job = page_stats['last_success'] if page_stats else None
+        if job:
+            return {
+                'timestamp': job['timestamp'],
+                'printer': job.get('printer', 'Default')
+            }
         return None
 
     def get_dashboard_stats(self):
         """Get overall dashboard statistics"""
-        total_documents = len(self.documents)
-        total_barcodes = len(self.mappings)
-        total_pages = sum(doc.get('pages', 0) for doc in self.documents.values())
-        
-        # Print statistics
-        total_prints = len([j for j in self.print_jobs if j['status'] == 'success'])
-        failed_prints = len([j for j in self.print_jobs if j['status'] == 'failed'])
-        
-        # Pending prints (barcodes that have never been printed)
-        printed_pages = set()
-        for job in self.print_jobs:
-            if job['status'] == 'success':
-                printed_pages.add((job['file_id'], job['page_num']))
-        
-        pending_prints = 0
-        for barcode, mapping in self.mappings.items():
-            key = (mapping['file_id'], mapping['page_num'])
-            if key not in printed_pages:
-                pending_prints += 1
+        # Uploads may be adding mappings from the ingestion worker
+        with self.db_lock:
+            total_documents = len(self.documents)
+            total_barcodes = len(self.mappings)
+            total_pages = sum(doc.get('pages', 0) for doc in self.documents.values())
+            
+            # Print statistics
+            total_prints = self.print_status_counts.get('success', 0)
+            failed_prints = self.print_status_counts.get('failed', 0)
+            
+            # Pending prints (barcodes that have never been printed)
+            pending_prints = 0
+            for barcode, mapping in self.mappings.items():
+                page_stats = self._get_page_print_stats(mapping['file_id'], mapping['page_num'])
+                if not page_stats or not page_stats['success']:
+                    pending_prints += 1
         
         return {
             'total_documents': total_documents,
@@ -234,29 +1111,32 @@ class PDFProcessingService:
         doc = self.documents[file_id]
         
         # Get mappings for this document
-        doc_mappings = [
-            {'barcode': k, **v}
-            for k, v in self.mappings.items()
-            if v['file_id'] == file_id
-        ]
+        doc_mappings = self._get_document_mappings(file_id)
         
         # Count prints per page
-        page_print_counts = {}
-        for job in self.print_jobs:
-            if job['file_id'] == file_id and job['status'] == 'success':
-                page_num = job['page_num']
-                page_print_counts[page_num] = page_print_counts.get(page_num, 0) + 1
+        page_print_counts = {
+            page_num: page_stats['success']
+            for page_num, page_stats in self.page_print_stats.get(file_id, {}).items()
+            if page_stats['success']
+        }
+        # Pages with a print still queued or printing are not pending, so they are not queued twice
+        printing_pages = {
+            page_num
+            for page_num, page_stats in self.page_print_stats.get(file_id, {}).items()
+            if page_stats['unfinished']
+        }
         
         # Calculate printed and pending
         printed_pages = set(page_print_counts.keys())
         all_barcode_pages = set(m['page_num'] for m in doc_mappings)
         
-        pending_pages = all_barcode_pages - printed_pages
+        pending_pages = all_barcode_pages - printed_pages - printing_pages
         
         return {
             'document': doc,
             'total_barcodes': len(doc_mappings),
             'printed_count': len(printed_pages),
+            'printing_count': len(printing_pages - printed_pages),
             'pending_count': len(pending_pages),
             'pending_pages': list(pending_pages),
             'page_print_counts': page_print_counts,
@@ -270,77 +1150,128 @@ class PDFProcessingService:
                 sha256_hash.update(byte_block)
         return sha256_hash.hexdigest()
 
-    def process_pdf(self, file_path, original_filename):
-        # Calculate Hash
-        file_hash = self.calculate_file_hash(file_path)
-        
-        # Check for duplicates
-        if file_hash in self.hashes:
-            existing_id = self.hashes[file_hash]
-            logger.info(f"Duplicate file uploaded. Returning existing ID: {existing_id}")
-            return {
-                'id': existing_id,
-                'stats': {
-                    'pages': self.documents[existing_id]['pages'],
-                    'barcodes': self.documents[existing_id]['barcodes_found']
-                },
-                'is_duplicate': True
-            }
+    def save_upload(self, stream, filename, chunk_size=64 * 1024):
+        """Write an uploaded file into ``upload_folder``, hashing it on the way.
 
-        file_id = str(uuid.uuid4())
-        
-        doc_info = {
-            'id': file_id,
-            'name': original_filename,
-            'path': file_path,
-            'uploaded_at': datetime.datetime.now().isoformat(),
-            'pages': 0,
-            'barcodes_found': 0,
-            'hash': file_hash
-        }
+        Returns ``(file_path, file_hash, existing_id)``. A duplicate is
+        discarded without touching the stored copy (``file_path`` is then the
+        existing document's path); a new file is moved into place atomically
+        under a name of its own, so an upload that reuses another document's
+        filename never replaces that document's PDF. ``filename`` is kept in
+        the stored name for readability; documents keep it as their ``name``.
+        """
+        sha256_hash = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(dir=self.upload_folder, prefix='.upload-', suffix='.pdf')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: stream.read(chunk_size), b''):
+                    sha256_hash.update(chunk)
+                    f.write(chunk)
+            file_hash = sha256_hash.hexdigest()
 
-        # Process PDF
-        reader = pypdf.PdfReader(file_path)
-        doc_info['pages'] = len(reader.pages)
-        
-        # Text Extraction Service Logic Integrated here
-        text_service = TextExtractionService()
-        
-        for i, page in enumerate(reader.pages):
-            page_num = i + 1
-            extracted_texts = []
+            existing_id = self.hashes.get(file_hash)
+            if existing_id:
+                os.remove(tmp_path)
+                return self.documents[existing_id]['path'], file_hash, existing_id
 
-            text = page.extract_text()
-            if text:
-                extracted_texts.append(text)
+            file_path = os.path.join(self.upload_folder, f"{uuid.uuid4().hex}_{filename}")
+            os.replace(tmp_path, file_path)
+            return file_path, file_hash, None
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
 
-            # Fallback for PDFs where the default extractor drops/reshapes text
-            # differently on some platforms/fonts.
-            try:
-                layout_text = page.extract_text(extraction_mode='layout')
-                if layout_text and layout_text not in extracted_texts:
-                    extracted_texts.append(layout_text)
-            except Exception:
-                pass
+    def process_pdf(self, file_path, original_filename, progress=None, file_hash=None):
+        """Extract barcodes from a PDF and register it as a document.
+
+        Mappings are committed page by page, so barcodes are scannable while
+        later pages are still being extracted. ``progress`` is called as
+        ``progress(file_id, pages_processed, pages_total, barcodes_found)``.
+        ``file_hash`` skips re-reading the file when the caller already hashed it.
+        """
+        # Calculate Hash
+        if file_hash is None:
+            file_hash = self.calculate_file_hash(file_path)
+        
+        with self.db_lock:
+            # Check for duplicates
+            if file_hash in self.hashes:
+                existing_id = self.hashes[file_hash]
+                logger.info(f"Duplicate file uploaded. Returning existing ID: {existing_id}")
+                return {
+                    'id': existing_id,
+                    'stats': {
+                        'pages': self.documents[existing_id]['pages'],
+                        'barcodes': self.documents[existing_id]['barcodes_found']
+                    },
+                    'is_duplicate': True
+                }
 
-            serials = text_service.extract_serial_numbers('\n'.join(extracted_texts))
+            file_id = str(uuid.uuid4())
             
-            for serial in serials:
-                barcode = serial['text']
-                # Store mapping (normalize barcode logic if needed)
-                self.mappings[barcode] = {
-                    'file_id': file_id,
-                    'page_num': page_num,
-                    'type': serial['type'],
-                    'confidence': serial['confidence'],
-                    'doc_name': original_filename
+            doc_info = {
+                'id': file_id,
+                'name': original_filename,
+                'path': file_path,
+                'uploaded_at': datetime.datetime.now().isoformat(),
+                'pages': 0,
+                'barcodes_found': 0,
+                'hash': file_hash,
+                'extraction': {
+                    'strategy': self.extraction_strategy,
+                    'profile': 'layout' if self.extraction_strategy == 'full' else None,
+                    'pages': 0,
+                    'layout_pages': 0,
+                    'layout_hits': 0,
+                    'default_seconds': 0.0,
+                    'layout_seconds': 0.0
                 }
-                doc_info['barcodes_found'] += 1
-                logger.info(f"Found {barcode} on page {page_num}")
+            }
+            # Register up front so re-uploads during ingestion are duplicates
+            # and previews work for pages already processed
+            self.documents[file_id] = doc_info
+            self.hashes[file_hash] = file_id  # Store hash
+            self._ingesting.add(file_id)
+
+        doc_mappings = {}
+        displaced = {}  # barcode -> mapping it replaced in another document
+        try:
+            # Process PDF
+            reader = pypdf.PdfReader(file_path)
+            doc_info['pages'] = len(reader.pages)
+            if progress:
+                progress(file_id, 0, doc_info['pages'], 0)
+
+            # Pages always come back in page order, so later pages win exactly as
+            # they do when extracting serially
+            for page_num, serials in self._extract_document_serials(file_path, reader, doc_info['extraction']):
+                page_mappings = {}
+                for serial in serials:
+                    barcode = serial['text']
+                    # Store mapping (normalize barcode logic if needed)
+                    page_mappings[barcode] = {
+                        'file_id': file_id,
+                        'page_num': page_num,
+                        'type': serial['type'],
+                        'confidence': serial['confidence'],
+                        'doc_name': original_filename
+                    }
+                    doc_info['barcodes_found'] += 1
+                    logger.info(f"Found {barcode} on page {page_num}")
 
-        self.documents[file_id] = doc_info
-        self.hashes[file_hash] = file_id  # Store hash
-        self.save_db()
+                self._add_page_mappings(file_id, page_mappings, displaced)
+                doc_mappings.update(page_mappings)
+                if progress:
+                    progress(file_id, page_num, doc_info['pages'], doc_info['barcodes_found'])
+        except Exception:
+            self._discard_ingestion(file_id, displaced)
+            raise
+
+        self._finish_extraction_stats(doc_info['extraction'])
+        with self.db_lock:
+            self._ingesting.discard(file_id)
+            self._record('document_added', document=doc_info, mappings=doc_mappings)
         
         return {
             'id': file_id, 
@@ -351,26 +1282,173 @@ class PDFProcessingService:
             'is_duplicate': False
         }
 
+    def _add_page_mappings(self, file_id, page_mappings, displaced):
+        with self.db_lock:
+            self.barcode_index.add(page_mappings)
+            for barcode, mapping in page_mappings.items():
+                previous = self.mappings.get(barcode)
+                if previous:
+                    # Barcode moves to the new document (or to a later page of it)
+                    self._unindex_document_barcode(previous['file_id'], barcode, previous['page_num'])
+                    if previous['file_id'] != file_id:
+                        displaced.setdefault(barcode, previous)
+                self._index_document_barcode(file_id, barcode, mapping['page_num'])
+            self.mappings.update(page_mappings)
+
+    def _discard_ingestion(self, file_id, displaced):
+        """Undo a partially ingested document after extraction failed."""
+        with self.db_lock:
+            removed = []
+            for page_num, _rank, barcode in self.document_barcodes.pop(file_id, []):
+                previous = displaced.get(barcode)
+                if previous and previous['file_id'] in self.documents:
+                    # Assigning in place keeps the key's original mappings position
+                    self.mappings[barcode] = previous
+                    self._index_document_barcode(previous['file_id'], barcode, previous['page_num'])
+                else:
+                    del self.mappings[barcode]
+                    removed.append(barcode)
+            self.barcode_index.remove(removed)
+            doc = self.documents.pop(file_id)
+            self.hashes.pop(doc['hash'], None)
+            self._ingesting.discard(file_id)
+
+    def _get_extraction_pool(self):
+        with self._extraction_pool_lock:
+            if self._extraction_pool is None:
+                self._extraction_pool = ProcessPoolExecutor(max_workers=self.extraction_workers)
+            return self._extraction_pool
+
+    def _extract_document_serials(self, file_path, reader, extraction):
+        """Yield (page_num, serials) for every page, in page order.
+
+        Per-page pass timings and layout hits are accumulated into ``extraction``.
+        """
+        page_count = len(reader.pages)
+        text_service = TextExtractionService()
+        use_layout = True
+        next_page = 0
+
+        if self.extraction_strategy == 'adaptive':
+            # Learn the document profile from its first pages, read with both
+            # passes. The decision for every later page depends only on the
+            # profile and the page itself, so pooled and serial runs agree.
+            for i in range(min(page_count, self.ADAPTIVE_PROBE_PAGES)):
+                serials, page_stats = extract_page_serials(reader.pages[i], text_service, use_layout=True,
+                                                           compare_passes=True)
+                self._account_page(extraction, page_stats)
+                if page_stats['layout_hit'] and page_stats['default_serials']:
+                    extraction['profile'] = 'layout'
+                yield i + 1, serials
+                next_page = i + 1
+            if extraction['profile'] is None:
+                extraction['profile'] = 'default'
+            # Profile 'default': layout only for pages where the default pass finds nothing
+            use_layout = True if extraction['profile'] == 'layout' else None
+
+        remaining = page_count - next_page
+        if self.extraction_workers > 1 and remaining > 1:
+            # Two ranges per worker keeps workers busy when pages differ in cost,
+            # while each range only parses the PDF once
+            range_count = min(remaining, self.extraction_workers * 2)
+            bounds = [next_page + remaining * i // range_count for i in range(range_count + 1)]
+            try:
+                pool = self._get_extraction_pool()
+                futures = [
+                    pool.submit(extract_serials_from_page_range, file_path, bounds[i], bounds[i + 1], use_layout)
+                    for i in range(range_count)
+                ]
+                for future in futures:
+                    for page_num, serials, page_stats in future.result():
+                        self._account_page(extraction, page_stats)
+                        yield page_num, serials
+                        next_page = page_num
+                return
+            except BrokenProcessPool as e:
+                logger.error(f"Extraction pool failed, extracting remaining pages serially: {e}")
+                with self._extraction_pool_lock:
+                    self._extraction_pool = None
+
+        for i in range(next_page, page_count):
+            serials, page_stats = extract_page_serials(reader.pages[i], text_service, use_layout)
+            self._account_page(extraction, page_stats)
+            yield i + 1, serials
+
+    def _account_page(self, extraction, page_stats):
+        extraction['pages'] += 1
+        extraction['default_seconds'] += page_stats['default_seconds']
+        if page_stats['layout_seconds'] is not None:
+            extraction['layout_pages'] += 1
+            extraction['layout_seconds'] += page_stats['layout_seconds']
+        if page_stats['layout_hit']:
+            extraction['layout_hits'] += 1
+
+    def _finish_extraction_stats(self, extraction):
+        extraction['layout_skipped'] = extraction['pages'] - extraction['layout_pages']
+        # Skipped pages are assumed to cost what the layout pass averaged elsewhere
+        average_layout = extraction['layout_seconds'] / extraction['layout_pages'] if extraction['layout_pages'] else 0.0
+        extraction['estimated_seconds_saved'] = round(average_layout * extraction['layout_skipped'], 4)
+        extraction['default_seconds'] = round(extraction['default_seconds'], 4)
+        extraction['layout_seconds'] = round(extraction['layout_seconds'], 4)
+
+    def get_extraction_stats(self):
+        """Text-extraction cost per strategy, summed over stored documents."""
+        totals = {}
+        for doc in list(self.documents.values()):
+            extraction = doc.get('extraction')
+            if not extraction or 'layout_skipped' not in extraction:
+                continue
+            strategy_totals = totals.setdefault(extraction['strategy'], {
+                'documents': 0,
+                'pages': 0,
+                'layout_pages': 0,
+                'layout_skipped': 0,
+                'layout_hits': 0,
+                'default_seconds': 0.0,
+                'layout_seconds': 0.0,
+                'estimated_seconds_saved': 0.0
+            })
+            strategy_totals['documents'] += 1
+            for key in ('pages', 'layout_pages', 'layout_skipped', 'layout_hits',
+                        'default_seconds', 'layout_seconds', 'estimated_seconds_saved'):
+                strategy_totals[key] += extraction[key]
+        return {
+            'current_strategy': self.extraction_strategy,
+            'strategies': totals
+        }
+
     def delete_document(self, file_id):
-        if file_id in self.documents:
-            doc = self.documents[file_id]
+        with self.db_lock:
+            # Checked under the lock the ingestion worker commits pages with, so a
+            # delete cannot slip in before its last pages bring the document back
+            if file_id in self._ingesting:
+                logger.warning(f"Refusing to delete {file_id} while it is still being processed")
+                return False
+            doc = self.documents.get(file_id)
+            if doc is None:
+                return False
             # Remove from mappings
-            self.mappings = {k: v for k, v in self.mappings.items() if v['file_id'] != file_id}
+            removed = [barcode for _page_num, _rank, barcode in self.document_barcodes.pop(file_id, [])]
+            for barcode in removed:
+                del self.mappings[barcode]
+            self.barcode_index.remove(removed)
             # Remove from hashes
             if 'hash' in doc and doc['hash'] in self.hashes:
                 del self.hashes[doc['hash']]
-            
-            # Try to remove file
-            try:
-                if os.path.exists(doc['path']):
-                    os.remove(doc['path'])
-            except Exception as e:
-                logger.error(f"Error removing file: {e}")
-                
             del self.documents[file_id]
-            self.save_db()
-            return True
-        return False
+            self._record('document_deleted', file_id=file_id)
+        self.reader_cache.invalidate(file_id)
+        if 'hash' in doc:
+            self.crop_cache.invalidate(doc['hash'])
+
+        # Try to remove file
+        try:
+            if os.path.exists(doc['path']):
+                os.remove(doc['path'])
+        except Exception as e:
+            logger.error(f"Error removing file: {e}")
+
+        return True
 
     def get_all_documents(self):
         # Convert dict to sorted list
@@ -382,15 +1460,8 @@ class PDFProcessingService:
             return None
         
         doc = self.documents[file_id]
-        # Get all mappings for this doc
-        doc_mappings = [
-            {'barcode': k, **v} 
-            for k, v in self.mappings.items() 
-            if v['file_id'] == file_id
-        ]
-        
-        # Sort mappings by page number
-        doc_mappings.sort(key=lambda x: x['page_num'])
+        # Get all mappings for this doc (already sorted by page number)
+        doc_mappings = self._get_document_mappings(file_id)
         
         return {
             'document': doc,
@@ -398,17 +1469,7 @@ class PDFProcessingService:
         }
 
     def _normalize_barcode(self, value):
-        """Normalize barcode strings for reliable matching.
-
-        - Uppercase
-        - Strip leading/trailing whitespace
-        - Remove ASCII control characters (common in DataMatrix/GS1 scanner output)
-        """
-        if value is None:
-            return ''
-        s = str(value).strip().upper()
-        # Remove control characters (0x00-0x1F and 0x7F)
-        return ''.join(ch for ch in s if (ord(ch) >= 32 and ord(ch) != 127))
+        return normalize_barcode(value)
 
     def resolve_barcode(self, barcode):
         """Resolve a scanned barcode to a stored mapping.
@@ -429,297 +1490,1943 @@ class PDFProcessingService:
         if not raw:
             return None, None
 
-        # Fast path: exact match by normalized key
-        for known_key in self.mappings.keys():
-            if self._normalize_barcode(known_key) == raw:
+        # Ingestion and deletes change the index and mappings from other threads
+        with self.db_lock:
+            # Fast path: exact match by normalized key
+            known_key = self.barcode_index.find_exact(raw)
+            if known_key is not None:
                 return known_key, self.mappings[known_key]
 
-        # Collect partial-match candidates
-        candidates = []
-        for known_key in self.mappings.keys():
-            known_norm = self._normalize_barcode(known_key)
-            if len(known_norm) < 6:
-                continue
-            if known_norm in raw or raw in known_norm:
-                candidates.append((known_key, known_norm))
-
-        if not candidates:
-            return None, None
-
-        # Prefer candidates contained within the scanned raw string (common case)
-        def sort_key(item):
-            known_key, known_norm = item
-            contained_in_scan = 1 if known_norm in raw else 0
-            return (len(known_norm), contained_in_scan)
-
-        best_key, _best_norm = max(candidates, key=sort_key)
-        return best_key, self.mappings[best_key]
+            # Partial match: keys (>= 6 chars) inside the scan or containing it,
+            # preferring the most specific (longest) candidate
+            best_key = self.barcode_index.find_best_partial(raw)
+            if best_key is None:
+                return None, None
+            return best_key, self.mappings[best_key]
 
     def find_barcode(self, barcode):
         _, mapping = self.resolve_barcode(barcode)
         return mapping
 
     def get_page_image(self, file_id, page_num, label_settings=None):
-        # In a real implementation, we render PDF page to image for preview
-        # simplified here to return specific page bytes as PDF for browser
-        # But user wants IMAGE preview in React usually
-        
-        # NOTE: For true image preview, we need pdf2image (poppler)
-        # For now, we will extract the page as a single-page PDF and return that bytes
-        # Frontend can use an iframe or pdf.js to show it, or we try to convert 
-        
-        # Fallback: Extraction logic from original service
+        # Previews are served as the cropped single-page PDF, which the frontend
+        # shows in an iframe; bitmaps (render_pdf_page) are only made for printing
+        return self.get_cropped_page(file_id, page_num, label_settings)[0]
+
+    def get_cropped_page(self, file_id, page_num, label_settings=None):
+        """Return ``(pdf_bytes, etag)`` for the cropped page, served from the crop cache when possible."""
         doc = self.documents.get(file_id)
         if not doc:
             raise Exception("Document not found")
-            
-        return self._extract_page_bytes(doc['path'], page_num, label_settings)
 
-    def _extract_page_bytes(self, pdf_path, page_num, label_settings=None):
+        if 'hash' not in doc:
+            pdf_bytes = self._extract_page_bytes(doc['path'], page_num, label_settings, file_id=file_id)
+            return pdf_bytes, hashlib.sha256(pdf_bytes).hexdigest()[:32]
+
+        key = (doc['hash'], page_num, self._crop_key(label_settings))
+        entry = self.crop_cache.get(key)
+        if entry is None:
+            pdf_bytes = self._extract_page_bytes(doc['path'], page_num, label_settings, file_id=file_id)
+            entry = self.crop_cache.put(key, pdf_bytes)
+        return entry
+
+    def _crop_key(self, label_settings):
+        # 100 and 100.0 crop identically; keys that do not affect the crop are ignored
+        label_settings = label_settings or {}
+        return tuple(float(label_settings.get(name, default)) for name, default in self.CROP_SETTING_DEFAULTS)
+
+    def get_cropped_pages(self, file_id, page_nums, label_settings=None):
+        """Return one PDF with the cropped label of every page in ``page_nums``, in that order.
+
+        The source is read once and shared resources (fonts, images) are
+        written once, so a batch spools much smaller than separate labels.
+        """
+        doc = self.documents.get(file_id)
+        if not doc:
+            raise Exception("Document not found")
+        return self._extract_pages_bytes(doc['path'], page_nums, label_settings, file_id=file_id)
+
+    def _extract_page_bytes(self, pdf_path, page_num, label_settings=None, file_id=None):
+        return self._extract_pages_bytes(pdf_path, [page_num], label_settings, file_id=file_id)
+
+    def _extract_pages_bytes(self, pdf_path, page_nums, label_settings=None, file_id=None):
         # Cropping Logic from original app (now configurable via label_settings)
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = pypdf.PdfReader(file)
-            if page_num < 1 or page_num > len(pdf_reader.pages):
-                raise Exception("Invalid page number")
-            
-            original_page = pdf_reader.pages[page_num - 1]
-            
-            # Get dimensions from settings with defaults
-            if label_settings is None:
-                label_settings = {}
-            
-            # Scale: 100 = 100% (no change), 50 = shrink to 50%, 200 = expand to 200%
-            scale = label_settings.get('scale', 100) / 100.0
-            
-            # Apply scale transformation to page
-            if scale != 1.0:
-                original_page.scale_by(scale)
-            
-            # Get page dimensions after scaling
-            orig_height = float(original_page.mediabox.height)
-            orig_width = float(original_page.mediabox.width)
-            
-            label_width = label_settings.get('width', 3.94) * inch
-            label_height = label_settings.get('height', 1.5) * inch
-            offset_x = label_settings.get('offsetX', 0) * inch
-            offset_y = label_settings.get('offsetY', 0) * inch
-            
-            # Crop from top-left (0,0 in PDF is bottom-left)
-            lower_left_x = offset_x
-            lower_left_y = orig_height - offset_y - label_height
-            upper_right_x = offset_x + label_width
-            upper_right_y = orig_height - offset_y
-            
-            # Clamp to page bounds
-            lower_left_x = max(0, lower_left_x)
-            lower_left_y = max(0, lower_left_y)
-            upper_right_x = min(orig_width, upper_right_x)
-            upper_right_y = min(orig_height, upper_right_y)
-            
-            original_page.mediabox.lower_left = (lower_left_x, lower_left_y)
-            original_page.mediabox.upper_right = (upper_right_x, upper_right_y)
-            
+        if file_id is None:
+            reader_context = contextlib.nullcontext(pypdf.PdfReader(pdf_path))
+        else:
+            reader_context = self.reader_cache.open(file_id, pdf_path)
+        with reader_context as pdf_reader:
+            if len(set(page_nums)) != len(page_nums):
+                # add_page returns the page already in the writer, which would be cropped and scaled twice
+                raise Exception("Duplicate page number")
             pdf_writer = pypdf.PdfWriter()
-            pdf_writer.add_page(original_page)
+            for page_num in page_nums:
+                if page_num < 1 or page_num > len(pdf_reader.pages):
+                    raise Exception("Invalid page number")
+
+                # add_page clones the page into the writer, so scaling and cropping
+                # never touch the (possibly cached) reader's copy
+                self._crop_page(pdf_writer.add_page(pdf_reader.pages[page_num - 1]), label_settings)
             
             output_buffer = io.BytesIO()
             pdf_writer.write(output_buffer)
             output_buffer.seek(0)
             return output_buffer.getvalue()
 
-class TextExtractionService:
-    def _clean_text(self, value):
-        # Normalize control chars that frequently appear in extracted PDF text
-        # (platform/parser dependent), while preserving newlines for regex context.
-        if not value:
-            return ''
-        return ''.join(ch if (ch == '\n' or ord(ch) >= 32) else ' ' for ch in str(value))
-
-    def extract_serial_numbers(self, text):
-        if not text:
-            return []
-        
+    def _crop_page(self, original_page, label_settings=None):
+        # Get dimensions from settings with defaults
+        if label_settings is None:
+            label_settings = {}
+        
+        # Scale: 100 = 100% (no change), 50 = shrink to 50%, 200 = expand to 200%
+        scale = label_settings.get('scale', 100) / 100.0
+        
+        # Apply scale transformation to page
+        if scale != 1.0:
+            original_page.scale_by(scale)
+        
+        # Get page dimensions after scaling
+        orig_height = float(original_page.mediabox.height)
+        orig_width = float(original_page.mediabox.width)
+        
+        label_width = label_settings.get('width', 3.94) * inch
+        label_height = label_settings.get('height', 1.5) * inch
+        offset_x = label_settings.get('offsetX', 0) * inch
+        offset_y = label_settings.get('offsetY', 0) * inch
+        
+        # Crop from top-left (0,0 in PDF is bottom-left)
+        lower_left_x = offset_x
+        lower_left_y = orig_height - offset_y - label_height
+        upper_right_x = offset_x + label_width
+        upper_right_y = orig_height - offset_y
+        
+        # Clamp to page bounds
+        lower_left_x = max(0, lower_left_x)
+        lower_left_y = max(0, lower_left_y)
+        upper_right_x = min(orig_width, upper_right_x)
+        upper_right_y = min(orig_height, upper_right_y)
+        
+        original_page.mediabox.lower_left = (lower_left_x, lower_left_y)
+        original_page.mediabox.upper_right = (upper_right_x, upper_right_y)
+
+class IngestionService:
+    """Background worker that runs ``process_pdf`` for uploads accepted asynchronously.
+
+    Each upload gets a job ID; ``get_job`` reports pages processed, barcodes
+    found so far and the final status.
+    """
+
+    MAX_FINISHED_JOBS = 200
+
+    def __init__(self, pdf_service, on_complete=None):
+        self.pdf_service = pdf_service
+        # Called with the process_pdf result after each successful ingestion
+        self.on_complete = on_complete
+        self.jobs = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name='pdf-ingestion', daemon=True)
+        self._worker.start()
+
+    def submit(self, file_path, filename, file_hash=None):
+        job = {
+            'id': str(uuid.uuid4()),
+            'filename': filename,
+            'status': 'queued',
+            'file_id': None,
+            'pages_total': None,
+            'pages_processed': 0,
+            'barcodes_found': 0,
+            'is_duplicate': False,
+            'error': None,
+            'created_at': datetime.datetime.now().isoformat(),
+            'finished_at': None
+        }
+        with self._lock:
+            self.jobs[job['id']] = job
+            self._trim_finished_jobs()
+        self._queue.put((job['id'], file_path, filename, file_hash))
+        return dict(job)
+
+    def get_job(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            self.jobs[job_id].update(fields)
+
+    def _trim_finished_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job['finished_at']]
+        for job_id in finished[:max(0, len(finished) - self.MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def _run(self):
+        while True:
+            job_id, file_path, filename, file_hash = self._queue.get()
+            self._update(job_id, status='processing')
+
+            def progress(file_id, pages_processed, pages_total, barcodes_found):
+                self._update(
+                    job_id,
+                    file_id=file_id,
+                    pages_processed=pages_processed,
+                    pages_total=pages_total,
+                    barcodes_found=barcodes_found
+                )
+
+            try:
+                result = self.pdf_service.process_pdf(file_path, filename, progress=progress, file_hash=file_hash)
+                self._update(
+                    job_id,
+                    status='completed',
+                    file_id=result['id'],
+                    is_duplicate=result.get('is_duplicate', False),
+                    pages_total=result['stats']['pages'],
+                    pages_processed=result['stats']['pages'],
+                    barcodes_found=result['stats']['barcodes'],
+                    finished_at=datetime.datetime.now().isoformat()
+                )
+            except Exception as e:
+                logger.error(f"Ingestion of {filename} failed: {e}")
+                self._update(job_id, status='failed', error=str(e), finished_at=datetime.datetime.now().isoformat())
+                continue
+            if self.on_complete:
+                self.on_complete(result)
+
+
+class PrerenderService:
+    """Low-priority worker that warms the label caches after an upload.
+
+    Every barcode page of a new document is cropped with the station's saved
+    default label settings, and rasterized too when a print service is given,
+    so the first scan of a label costs the same as a reprint. The worker pauses
+    between pages so it does not compete with scans for the interpreter.
+    """
+
+    PAUSE_SECONDS = 0.02
+
+    def __init__(self, pdf_service, print_service=None):
+        self.pdf_service = pdf_service
+        self.print_service = print_service
+        self.pages_rendered = 0
+        self.documents_rendered = 0
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name='label-prerender', daemon=True)
+        self._worker.start()
+
+    def submit(self, file_id):
+        self._queue.put(file_id)
+
+    def on_document_added(self, result):
+        """process_pdf result hook; duplicates are already warm or were warmed before."""
+        if not result.get('is_duplicate'):
+            self.submit(result['id'])
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize(),
+            'documents_rendered': self.documents_rendered,
+            'pages_rendered': self.pages_rendered
+        }
+
+    def _run(self):
+        while True:
+            file_id = self._queue.get()
+            try:
+                self._prerender(file_id)
+            except Exception as e:
+                logger.error(f"Pre-rendering labels for {file_id} failed: {e}")
+
+    def _prerender(self, file_id):
+        label_settings = self.pdf_service.get_label_settings()
+        with self.pdf_service.db_lock:
+            pages = sorted({page_num for page_num, _rank, _barcode in self.pdf_service.document_barcodes.get(file_id, [])})
+
+        for page_num in pages:
+            if file_id not in self.pdf_service.documents:
+                return  # Deleted while queued
+            pdf_bytes, pdf_hash = self.pdf_service.get_cropped_page(file_id, page_num, label_settings)
+            if self.print_service:
+                self.print_service.prerender_raster(pdf_bytes, pdf_hash, label_settings)
+            self.pages_rendered += 1
+            time.sleep(self.PAUSE_SECONDS)
+        self.documents_rendered += 1
+        logger.info(f"Pre-rendered {len(pages)} labels for {file_id}")
+
+
+class TextExtractionService:
+    # PORTED REGEX PATTERNS, compiled once. Order matters: results are emitted
+    # pattern by pattern, and process_pdf keeps the last type seen per value.
+    SERIAL_PATTERNS = [
+        (re.compile(r'\[\)>.*?S([A-Z][0-9]{10})[0-9]*[A-Z]', re.IGNORECASE), 'BARCODE_K'),
+        (re.compile(r'\[\)>.*?S([0-9][A-Z][0-9]{9,12})[0-9]*[A-Z]', re.IGNORECASE), 'BARCODE_NUM'),
+        (re.compile(r'S/?N[:\s;\.\-]+([A-Z0-9]{8,15})', re.IGNORECASE), 'GENERIC_SN'),
+        (re.compile(r'SN[:\s;\.\-]+([A-Z0-9]{8,15})', re.IGNORECASE), 'GENERIC_SN'),
+        (re.compile(r'\b([A-Z]{1,2}[0-9]{8,12})\b', re.IGNORECASE), 'ALPHANUMERIC_ID')
+    ]
+    CONTROL_CHARS = re.compile(r'[\x00-\x09\x0b-\x1f]')
+    WORD_GAPS = re.compile(r'(?<=\w)\s+(?=\w)')
+
+    def _clean_text(self, value):
+        # Normalize control chars that frequently appear in extracted PDF text
+        # (platform/parser dependent), while preserving newlines for regex context.
+        if not value:
+            return ''
+        return self.CONTROL_CHARS.sub(' ', str(value))
+
+    def _applicable_patterns(self, candidate):
+        """Skip patterns whose literal anchor cannot occur in ``candidate``.
+
+        casefold() maps every character IGNORECASE treats as S (including the
+        long s) to 's', so these checks never drop a real match.
+        """
+        folded = candidate.casefold()
+        has_header = '[)>' in candidate
+        has_sn = 'sn' in folded
+        has_slash_sn = has_sn or 's/n' in folded
+        enabled = (has_header, has_header, has_slash_sn, has_sn, True)
+        return [pattern for pattern, on in zip(self.SERIAL_PATTERNS, enabled) if on]
+
+    def extract_serial_numbers(self, text):
+        if not text:
+            return []
+        
         serial_numbers = []
         seen_values = set()
 
         base_text = self._clean_text(text)
-        condensed_text = re.sub(r'(?<=\w)\s+(?=\w)', '', base_text)
+        condensed_text = self.WORD_GAPS.sub('', base_text)
         candidate_texts = [base_text]
         if condensed_text != base_text:
             candidate_texts.append(condensed_text)
 
-        # PORTED REGEX PATTERNS
-        patterns = [
-            (r'\[\)>.*?S([A-Z][0-9]{10})[0-9]*[A-Z]', 'BARCODE_K'),
-            (r'\[\)>.*?S([0-9][A-Z][0-9]{9,12})[0-9]*[A-Z]', 'BARCODE_NUM'),
-            (r'S/?N[:\s;\.\-]+([A-Z0-9]{8,15})', 'GENERIC_SN'),
-            (r'SN[:\s;\.\-]+([A-Z0-9]{8,15})', 'GENERIC_SN'),
-            (r'\b([A-Z]{1,2}[0-9]{8,12})\b', 'ALPHANUMERIC_ID')
-        ]
-        
         for candidate in candidate_texts:
-            for pattern, label_type in patterns:
-                matches = re.finditer(pattern, candidate, re.IGNORECASE)
-                for match in matches:
-                    try:
-                        val = re.sub(r'\s+', '', match.group(1).upper())
-                        if len(val) < 6:
-                            continue
-                        dedupe_key = (val, label_type)
-                        if dedupe_key in seen_values:
-                            continue
-                        seen_values.add(dedupe_key)
-                        serial_numbers.append({'text': val, 'type': label_type, 'confidence': 1.0})
-                    except Exception:
-                        pass
+            for pattern, label_type in self._applicable_patterns(candidate):
+                for match in pattern.finditer(candidate):
+                    # Captured groups are letters/digits only, so no whitespace to strip
+                    val = match.group(1).upper()
+                    if len(val) < 6:
+                        continue
+                    dedupe_key = (val, label_type)
+                    if dedupe_key in seen_values:
+                        continue
+                    seen_values.add(dedupe_key)
+                    serial_numbers.append({'text': val, 'type': label_type, 'confidence': 1.0})
                 
         return serial_numbers
 
-class PrintService:
-    def __init__(self, pdf_service):
-        self.pdf_service = pdf_service
-        
-    def print_page(self, file_id, page_num, printer_name=None, label_settings=None, username='Unknown'):
-        job_id = str(uuid.uuid4())
-        timestamp = datetime.datetime.now().isoformat()
-        status = "failed"
-        message = ""
-        
-        # Default label settings
+def extract_page_serials(page, text_service, use_layout=True, compare_passes=False):
+    """Return ``(serials, page_stats)`` for one page.
+
+    ``use_layout`` True always adds the layout pass, False never does, and
+    None adds it only when the default pass finds no serials.
+
+    With ``use_layout`` True the serials are scanned once, in the combined
+    text, so ``default_serials`` and ``layout_hit`` stay unmeasured (None)
+    unless ``compare_passes`` also scans the default text on its own.
+    """
+    extracted_texts = []
+
+    started = time.perf_counter()
+    text = page.extract_text()
+    page_stats = {
+        'default_seconds': time.perf_counter() - started,
+        'layout_seconds': None,
+        'default_serials': None,
+        'layout_hit': None
+    }
+    if text:
+        extracted_texts.append(text)
+
+    default_serials = None
+    if use_layout is not True or compare_passes:
+        default_serials = text_service.extract_serial_numbers(text)
+        page_stats['default_serials'] = len(default_serials)
+        page_stats['layout_hit'] = False
+        if use_layout is None:
+            use_layout = not default_serials
+        if not use_layout:
+            return default_serials, page_stats
+
+    # Fallback for PDFs where the default extractor drops/reshapes text
+    # differently on some platforms/fonts.
+    started = time.perf_counter()
+    try:
+        layout_text = page.extract_text(extraction_mode='layout')
+        if layout_text and layout_text not in extracted_texts:
+            extracted_texts.append(layout_text)
+    except Exception:
+        pass
+    page_stats['layout_seconds'] = time.perf_counter() - started
+
+    if len(extracted_texts) < 2 and text and default_serials is not None:
+        # Layout text added nothing; the combined text is the default text
+        return default_serials, page_stats
+
+    serials = text_service.extract_serial_numbers('\n'.join(extracted_texts))
+    if default_serials is not None:
+        found = {(serial['text'], serial['type']) for serial in serials}
+        page_stats['layout_hit'] = found != {(serial['text'], serial['type']) for serial in default_serials}
+    return serials, page_stats
+
+
+def extract_serials_from_page_range(file_path, start, end, use_layout=True):
+    """Process-pool worker: [(page_num, serials, page_stats)] for pages ``start``..``end - 1`` (0-based)."""
+    reader = pypdf.PdfReader(file_path)
+    text_service = TextExtractionService()
+    results = []
+    for i in range(start, end):
+        serials, page_stats = extract_page_serials(reader.pages[i], text_service, use_layout)
+        results.append((i + 1, serials, page_stats))
+    return results
+
+
+class QRLabelService:
+    """QR code labels as PDF, one label per page.
+
+    ``generate_labels_pdf`` draws any number of labels onto one canvas, so a
+    bulk run produces a single document that shares its font and resources.
+
+    Encoded QR codes are kept as ready-to-draw paths in an LRU keyed by
+    (data, size), and the label geometry for each (width, height, has_label)
+    is computed once, so a repeated preview only assembles the page.
+    """
+
+    MAX_LABEL_CHARS = 80
+    MARGIN = 0.12 * inch
+    LABEL_TEXT_HEIGHT = 0.26 * inch
+    # Quiet zone around the code, in modules
+    QR_BORDER = 4
+    MAX_LAYOUTS = 64
+
+    def __init__(self, cache_size=256):
+        self.cache_size = cache_size
+        self._codes = collections.OrderedDict()  # (data, qr_size) -> PDFPathObject
+        self._layouts = collections.OrderedDict()  # (width, height, has_label) -> layout dict
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def label_size(self, label_settings=None):
+        """Label (width, height) in inches, clamped to what the printers accept"""
         if label_settings is None:
             label_settings = {}
-        
+        width = _clamp(float(label_settings.get('width', 3.94)), 1.0, 8.5)
+        height = _clamp(float(label_settings.get('height', 2.0)), 1.0, 11.0)
+        return width, height
+
+    def generate_label_pdf(self, data, label, label_settings=None):
+        data = (data or '').strip()
+        if not data:
+            raise ValueError('QR data is required')
+        return self.generate_labels_pdf([{'data': data, 'label': label}], label_settings)
+
+    def normalize_rows(self, rows):
+        """Validated ``{'data', 'label'}`` rows with surrounding whitespace stripped"""
+        normalized = []
+        for row_num, row in enumerate(rows, start=1):
+            if not isinstance(row, dict):
+                raise ValueError(f'Row {row_num}: expected an object with data and label')
+            data = str(row.get('data') or '').strip()
+            if not data:
+                raise ValueError(f'Row {row_num}: QR data is required')
+            normalized.append({'data': data, 'label': str(row.get('label') or '').strip()})
+        return normalized
+
+    def generate_labels_pdf(self, rows, label_settings=None):
+        """One PDF page per ``{'data', 'label'}`` row, in order"""
+        width, height = self.label_size(label_settings)
+        rows = self.normalize_rows(rows)
+
+        packet = io.BytesIO()
+        c = canvas.Canvas(packet, pagesize=(width * inch, height * inch))
+        for row in rows:
+            self._draw_label(c, row['data'], row['label'], width, height)
+            c.showPage()
+        c.save()
+        return packet.getvalue()
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._codes), 'max_entries': self.cache_size,
+                    'layouts': len(self._layouts), 'hits': self.hits, 'misses': self.misses}
+
+    def _draw_label(self, c, data, label, width, height):
+        layout = self._layout(width, height, bool(label))
+
+        c.saveState()
+        c.translate(layout['qr_x'], layout['qr_y'])
+        c.drawPath(self._qr_path(data, layout['qr_size']), stroke=0, fill=1)
+        c.restoreState()
+
+        if label:
+            c.setFont('Helvetica', 9)
+            c.drawCentredString(layout['text_x'], layout['text_y'], label[:self.MAX_LABEL_CHARS])
+
+    def _layout(self, width, height, has_label):
+        """Where the code and caption go on a label of this size"""
+        key = (width, height, has_label)
+        with self._lock:
+            layout = self._layouts.get(key)
+            if layout is not None:
+                self._layouts.move_to_end(key)
+                return layout
+
+        label_height = self.LABEL_TEXT_HEIGHT if has_label else 0
+        available_width = (width * inch) - (2 * self.MARGIN)
+        available_height = (height * inch) - (2 * self.MARGIN) - label_height
+        qr_size = min(available_width, available_height)
+        layout = {
+            'qr_size': qr_size,
+            'qr_x': ((width * inch) - qr_size) / 2,
+            'qr_y': self.MARGIN + (available_height - qr_size) / 2,
+            'text_x': (width * inch) / 2,
+            'text_y': self.MARGIN * 0.6
+        }
+        with self._lock:
+            self._layouts[key] = layout
+            while len(self._layouts) > self.MAX_LAYOUTS:
+                self._layouts.popitem(last=False)
+        return layout
+
+    def _qr_path(self, data, qr_size):
+        """Filled path of the code's dark modules, ``qr_size`` points square with its
+        origin at the bottom left. Paths are shared between canvases and never modified."""
+        key = (data, qr_size)
+        with self._lock:
+            path = self._codes.get(key)
+            if path is not None:
+                self._codes.move_to_end(key)
+                self.hits += 1
+                return path
+            self.misses += 1
+
+        # Same encoding and module layout as reportlab's QrCodeWidget, with each
+        # horizontal run of dark modules as one rectangle
+        qr = qrencoder.QRCode(None, qrencoder.QRErrorCorrectLevel.L)
+        qr.addData(data)
+        qr.make()
+        border = self.QR_BORDER
+        box = qr_size / (qr.getModuleCount() + border * 2.0)
+        path = PDFPathObject()
+        for r, row in enumerate(qr.modules):
+            top = qr_size - (r + border + 1) * box
+            col = 0
+            for dark, run in itertools.groupby(row, key=bool):
+                count = len(list(run))
+                if dark:
+                    path.rect((col + border) * box, top, count * box, box)
+                col += count
+
+        with self._lock:
+            self._codes[key] = path
+            while len(self._codes) > self.cache_size:
+                self._codes.popitem(last=False)
+        return path
+
+    def parse_csv(self, text):
+        """Rows from CSV text: a header naming 'data' (and optionally 'label') columns,
+        or no header with data in the first column and the label in the second"""
+        records = [record for record in csv.reader(io.StringIO(text)) if any(cell.strip() for cell in record)]
+        if not records:
+            return []
+        header = [cell.strip().lower() for cell in records[0]]
+        if 'data' in header:
+            data_col = header.index('data')
+            label_col = header.index('label') if 'label' in header else None
+            records = records[1:]
+        else:
+            data_col, label_col = 0, 1
+        return [
+            {
+                'data': record[data_col] if data_col < len(record) else '',
+                'label': record[label_col] if label_col is not None and label_col < len(record) else ''
+            }
+            for record in records
+        ]
+
+
+class RasterCache:
+    """Print-ready label bitmaps keyed by cropped-PDF hash and quality settings.
+
+    Recently used images stay in memory up to ``memory_bytes``. Images evicted
+    from memory are written as PNG to ``spill_dir`` (when given), which is
+    itself trimmed to ``disk_bytes``, least recently used first. Cached images
+    are shared, so callers must not modify them in place.
+    """
+
+    BITS_PER_PIXEL = {'1': 1, 'L': 8, 'P': 8, 'RGB': 24}
+
+    def __init__(self, memory_bytes=64 * 1024 * 1024, spill_dir=None, disk_bytes=256 * 1024 * 1024):
+        self.memory_bytes = memory_bytes
+        self.spill_dir = spill_dir
+        self.disk_bytes = disk_bytes
+        self._memory = collections.OrderedDict()  # key -> (image, size)
+        self._memory_size = 0
+        self._disk = collections.OrderedDict()  # file name -> size on disk
+        self._disk_size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+            # Keep spilled rasters across restarts, oldest first
+            names = [name for name in os.listdir(spill_dir) if name.endswith('.png')]
+            for name in sorted(names, key=lambda name: os.path.getmtime(os.path.join(spill_dir, name))):
+                size = os.path.getsize(os.path.join(spill_dir, name))
+                self._disk[name] = size
+                self._disk_size += size
+
+    @staticmethod
+    def make_key(pdf_hash, quality_settings):
+        return pdf_hash + ':' + json.dumps(quality_settings or {}, sort_keys=True)
+
+    def _file_name(self, key):
+        return hashlib.sha256(key.encode('utf-8')).hexdigest() + '.png'
+
+    def _image_size(self, image):
+        return image.size[0] * image.size[1] * self.BITS_PER_PIXEL.get(image.mode, 32) // 8
+
+    def get(self, key):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            name = self._file_name(key)
+            if name not in self._disk:
+                self.misses += 1
+                return None
+            self._disk.move_to_end(name)
+
         try:
-            # Get document name for logs
-            doc = self.pdf_service.documents.get(file_id, {})
-            doc_name = doc.get('name', 'Unknown Document')
-            
-            # 1. Get cropped PDF bytes (pass label settings for custom crop)
-            pdf_bytes = self.pdf_service.get_page_image(file_id, page_num, label_settings)
-            
-            # 2. Save to temp file
-            temp_filename = f"print_job_{job_id}.pdf"
-            with open(temp_filename, 'wb') as f:
-                f.write(pdf_bytes)
-                
-            # 3. Extract quality settings from label_settings
-            quality_settings = {
-                'dpi': label_settings.get('dpi', 600),
-                'color_mode': label_settings.get('color_mode', 'grayscale'),
-                'sharpening': label_settings.get('sharpening', True),
-                'resampling': label_settings.get('resampling', 'lanczos'),
-                'contrast': label_settings.get('contrast', 1.0),
-                'threshold': label_settings.get('threshold', 128)
+            with Image.open(os.path.join(self.spill_dir, name)) as spilled:
+                image = spilled.copy()
+        except Exception as e:
+            logger.warning(f"Dropping unreadable spilled raster {name}: {e}")
+            self._drop_spilled(name)
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.disk_hits += 1
+        self.put(key, image)
+        return image
+
+    def put(self, key, image):
+        size = self._image_size(image)
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_size -= previous[1]
+            self._memory[key] = (image, size)
+            self._memory_size += size
+            evicted = []
+            while self._memory_size > self.memory_bytes and self._memory:
+                evicted_key, (evicted_image, evicted_size) = self._memory.popitem(last=False)
+                self._memory_size -= evicted_size
+                evicted.append((evicted_key, evicted_image))
+        # Encoding is slow, so spill outside the lock
+        for evicted_key, evicted_image in evicted:
+            self._spill(evicted_key, evicted_image)
+
+    def _spill(self, key, image):
+        if not self.spill_dir:
+            return
+        name = self._file_name(key)
+        path = os.path.join(self.spill_dir, name)
+        with self._lock:
+            if name in self._disk:
+                self._disk.move_to_end(name)
+                return
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.spill_dir, prefix='.spill-', suffix='.png')
+            with os.fdopen(fd, 'wb') as f:
+                image.save(f, format='PNG')
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Could not spill raster to disk: {e}")
+            return
+        removed = []
+        with self._lock:
+            size = os.path.getsize(path)
+            self._disk_size -= self._disk.pop(name, 0)
+            self._disk[name] = size
+            self._disk_size += size
+            while self._disk_size > self.disk_bytes and self._disk:
+                old_name, old_size = self._disk.popitem(last=False)
+                self._disk_size -= old_size
+                removed.append(old_name)
+        for old_name in removed:
+            try:
+                os.remove(os.path.join(self.spill_dir, old_name))
+            except OSError:
+                pass
+
+    def _drop_spilled(self, name):
+        with self._lock:
+            self._disk_size -= self._disk.pop(name, 0)
+        try:
+            os.remove(os.path.join(self.spill_dir, name))
+        except OSError:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {'memory_entries': len(self._memory), 'memory_bytes': self._memory_size,
+                    'disk_entries': len(self._disk), 'disk_bytes': self._disk_size,
+                    'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses}
+
+
+# pdfium keeps global state and is not thread-safe, so each process renders one page at a time
+_pdfium_lock = threading.Lock()
+
+
+def render_pdf_page(pdf_bytes, page_num=1, dpi=600, grayscale=True):
+    """Render page page_num (1-based) of an in-memory PDF with pdfium: 'L' when grayscale, else 'RGB'.
+
+    Also the process-pool worker for PdfiumRasterizer.
+    """
+    with _pdfium_lock:
+        pdf = pypdfium2.PdfDocument(pdf_bytes)
+        try:
+            # rev_byteorder: color pages come out as RGB rather than pdfium's native BGR
+            bitmap = pdf[page_num - 1].render(scale=dpi / 72, grayscale=grayscale, rev_byteorder=True)
+            return bitmap.to_pil()
+        finally:
+            pdf.close()
+
+
+class PdfRasterizer:
+    """Turns one page of a label PDF into a PIL image for the bitmap print paths.
+
+    Subclasses implement ``_render``; ``render`` counts renders, failures and
+    time spent for ``stats``.
+    """
+
+    name = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.renders = 0
+        self.failed = 0
+        self.render_seconds = 0.0
+
+    def render(self, pdf_bytes, page_num=1, dpi=600, grayscale=True):
+        """Page page_num (1-based) at dpi, as 'L' when grayscale, else 'RGB'"""
+        started = time.perf_counter()
+        try:
+            image = self._render(pdf_bytes, page_num, dpi, grayscale)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        with self._lock:
+            self.renders += 1
+            self.render_seconds += time.perf_counter() - started
+        return image
+
+    def _render(self, pdf_bytes, page_num, dpi, grayscale):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rasterizer': self.name,
+                'renders': self.renders,
+                'failed': self.failed,
+                'render_seconds': round(self.render_seconds, 3),
+                'avg_render_ms': round(self.render_seconds / self.renders * 1000, 3) if self.renders else None
             }
-            logger.info(f"Print quality settings: {quality_settings}")
-            
-            # 4. Send to printer (platform specific)
-            system = platform.system()
-            
-            if system == 'Windows':
-                if WINDOWS_PRINT_AVAILABLE:
-                    # Use native win32print for reliable Windows printing
-                    success, message = self._print_windows_native(temp_filename, printer_name, quality_settings)
+
+
+class PopplerRasterizer(PdfRasterizer):
+    """Runs Poppler's ``pdftoppm`` per page, from ``PATH`` or the EXE's bundled ``poppler`` folder."""
+
+    name = 'poppler'
+
+    def __init__(self):
+        super().__init__()
+        import sys
+
+        # Determine Poppler path (bundled with EXE or system PATH)
+        poppler_path = None
+        if getattr(sys, 'frozen', False):
+            # Running as PyInstaller EXE - Poppler is bundled in 'poppler' subfolder
+            bundle_dir = sys._MEIPASS
+            poppler_path = os.path.join(bundle_dir, 'poppler')
+            if not os.path.exists(poppler_path):
+                # Try alternative path structure
+                poppler_path = os.path.join(os.path.dirname(sys.executable), 'poppler')
+            logger.info(f"Using bundled Poppler at: {poppler_path}")
+        self.pdftoppm = os.path.join(poppler_path, 'pdftoppm') if poppler_path else 'pdftoppm'
+
+    def _render(self, pdf_bytes, page_num, dpi, grayscale):
+        # pdftoppm reads the PDF from stdin ('-') and, without an output
+        # root, writes the PNG to stdout. pdf2image's convert_from_bytes
+        # would spill the bytes to a temp file first.
+        cmd = [self.pdftoppm, '-r', str(dpi), '-f', str(page_num), '-l', str(page_num), '-png']
+        if grayscale:
+            cmd.append('-gray')
+        cmd.append('-')
+        result = subprocess.run(
+            cmd,
+            input=pdf_bytes,
+            capture_output=True,
+            timeout=60,
+            creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0)  # no console flash in the EXE
+        )
+        if result.returncode != 0:
+            raise Exception(result.stderr.decode(errors='replace').strip() or f"pdftoppm exited with {result.returncode}")
+        image = Image.open(io.BytesIO(result.stdout))
+        mode = 'L' if grayscale else 'RGB'
+        return image if image.mode == mode else image.convert(mode)
+
+
+class PdfiumRasterizer(PdfRasterizer):
+    """Renders pages in-process with pdfium (pypdfium2), straight from the PDF bytes.
+
+    No process is started per label and no PNG is encoded or decoded: the
+    page is drawn at the target DPI into a bitmap that already has the output
+    mode, 8-bit grayscale unless color was asked for, so the monochrome
+    threshold never sees an RGB image. With ``workers`` 0 pages render on the
+    calling thread, one at a time per process. With ``workers`` > 0 they go
+    to a pool of that many processes, each keeping pdfium loaded between
+    labels, so several print queues can render at once.
+    """
+
+    name = 'pdfium'
+
+    def __init__(self, workers=0):
+        if not PDFIUM_AVAILABLE:
+            raise ValueError("The pdfium rasterizer needs pypdfium2 (pip install pypdfium2)")
+        super().__init__()
+        self.workers = workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def _render(self, pdf_bytes, page_num, dpi, grayscale):
+        if self.workers > 0:
+            try:
+                return self._get_pool().submit(render_pdf_page, pdf_bytes, page_num, dpi, grayscale).result()
+            except BrokenProcessPool as e:
+                logger.error(f"Raster pool failed, rendering in-process: {e}")
+                with self._pool_lock:
+                    self._pool = None
+        return render_pdf_page(pdf_bytes, page_num, dpi, grayscale)
+
+    def close(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
+
+    def stats(self):
+        return dict(super().stats(), workers=self.workers)
+
+
+PDF_RASTERIZERS = ('auto', 'pdfium', 'poppler')
+
+
+def create_pdf_rasterizer(name='auto', workers=0):
+    """Rasterizer by name; 'auto' renders with pdfium when pypdfium2 is installed, else with pdftoppm"""
+    if name not in PDF_RASTERIZERS:
+        raise ValueError(f"Unknown PDF rasterizer: {name}")
+    if name == 'pdfium' or (name == 'auto' and PDFIUM_AVAILABLE):
+        return PdfiumRasterizer(workers=workers)
+    return PopplerRasterizer()
+
+
+class PrinterRegistry:
+    """System printers, the default printer and each printer's state, held in memory.
+
+    A daemon thread rediscovers printers every ``ttl`` seconds (``lpstat`` on
+    macOS/Linux, win32print or PowerShell on Windows), so ``snapshot`` only
+    waits for a subprocess before the first discovery has finished. States are
+    'idle', 'busy' and 'offline' as the system reports them; a printer one of
+    our print queues is sending to counts as busy in between refreshes. When a
+    refresh fails the last good list is kept and the error is reported.
+    """
+
+    DISCOVERY_TIMEOUT = 15
+    # win32print PRINTER_STATUS_* bits: paused, error, paper jam, paper out,
+    # offline, not available, door open / busy, printing, processing
+    WINDOWS_OFFLINE_STATUS = 0x1 | 0x2 | 0x8 | 0x10 | 0x80 | 0x1000 | 0x400000
+    WINDOWS_BUSY_STATUS = 0x200 | 0x400 | 0x4000
+    WINDOWS_ATTRIBUTE_WORK_OFFLINE = 0x400
+    # Get-Printer PrinterStatus names
+    POWERSHELL_OFFLINE_STATUS = ('Paused', 'Error', 'PaperJam', 'PaperOut', 'PaperProblem', 'Offline',
+                                 'NotAvailable', 'NoToner', 'UserIntervention', 'DoorOpen', 'ServerUnknown')
+    POWERSHELL_BUSY_STATUS = ('IOActive', 'Busy', 'Printing', 'Processing', 'WarmingUp', 'Initializing')
+    POWERSHELL_SCRIPT = (
+        "$default = (Get-CimInstance -ClassName Win32_Printer -Filter 'Default=TRUE').Name; "
+        "Get-Printer | ForEach-Object { $_.Name + \"`t\" + $_.PrinterStatus + \"`t\" + ($_.Name -eq $default) }"
+    )
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._printers = {}  # name -> state reported by the system, in discovery order
+        self._default = None
+        self._updated_at = None
+        self._error = None
+        self._active = collections.Counter()  # printer name -> jobs being sent right now
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._wake = threading.Event()
+        self.refreshes = 0
+        self.last_refresh_ms = None
+        self._worker = threading.Thread(target=self._run, name='printer-registry', daemon=True)
+        self._worker.start()
+
+    def snapshot(self):
+        """Printers, default printer and states from memory"""
+        self._loaded.wait(self.DISCOVERY_TIMEOUT)
+        with self._lock:
+            return {
+                'printers': list(self._printers),
+                'default_printer': self._default,
+                'states': {name: self._state(name) for name in self._printers},
+                'updated_at': self._updated_at,
+                'error': self._error
+            }
+
+    def default_printer(self):
+        self._loaded.wait(self.DISCOVERY_TIMEOUT)
+        with self._lock:
+            return self._default
+
+    def state(self, printer_name=None):
+        """'idle', 'busy', 'offline', or None for a printer the system did not list"""
+        self._loaded.wait(self.DISCOVERY_TIMEOUT)
+        with self._lock:
+            name = printer_name or self._default
+            return self._state(name) if name in self._printers else None
+
+    def refresh(self):
+        """Rediscover printers now and return the new snapshot"""
+        with self._refresh_lock:
+            start = time.perf_counter()
+            try:
+                printers, default = self._discover()
+                error = None
+            except Exception as e:
+                logger.error(f"Printer discovery failed: {e}")
+                printers, default, error = None, None, str(e)
+            with self._lock:
+                if printers is not None:
+                    self._printers = printers
+                    self._default = default
+                    self._updated_at = datetime.datetime.now().isoformat()
+                self._error = error
+                self.refreshes += 1
+                self.last_refresh_ms = round((time.perf_counter() - start) * 1000, 1)
+            self._loaded.set()
+        return self.snapshot()
+
+    def request_refresh(self):
+        """Ask the background thread to refresh ahead of its schedule"""
+        self._wake.set()
+
+    @contextlib.contextmanager
+    def printing(self, printer_name=None):
+        """Count the printer as busy while the caller sends it a job"""
+        with self._lock:
+            name = printer_name or self._default or ''
+            self._active[name] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active[name] -= 1
+                if not self._active[name]:
+                    del self._active[name]
+
+    def stats(self):
+        with self._lock:
+            return {'printers': len(self._printers), 'refreshes': self.refreshes, 'ttl': self.ttl,
+                    'last_refresh_ms': self.last_refresh_ms, 'updated_at': self._updated_at,
+                    'error': self._error}
+
+    def _state(self, name):
+        state = self._printers.get(name, 'idle')
+        if state == 'idle' and self._active.get(name):
+            return 'busy'
+        return state
+
+    def _run(self):
+        while True:
+            self.refresh()
+            self._wake.wait(self.ttl)
+            self._wake.clear()
+
+    def _discover(self):
+        """({name: state}, default printer name or None) from the operating system"""
+        if platform.system() == 'Windows':
+            return self._discover_windows()
+        return self._discover_cups()
+
+    def _discover_cups(self):
+        # One lpstat call lists every queue's state and the default destination
+        result = subprocess.run(['lpstat', '-p', '-d'], capture_output=True, text=True,
+                                timeout=self.DISCOVERY_TIMEOUT)
+        printers = {}
+        default_printer = None
+        for line in result.stdout.splitlines():
+            parts = line.split()
+            if line.startswith('printer') and len(parts) >= 3:
+                if parts[2] == 'disabled':
+                    printers[parts[1]] = 'offline'
+                elif parts[2:4] == ['now', 'printing']:
+                    printers[parts[1]] = 'busy'
                 else:
-                    # Fallback to Powershell
-                    success, message = self._print_windows_powershell(temp_filename, printer_name)
-                
-                if success:
-                    status = "success"
+                    printers[parts[1]] = 'idle'
+            elif 'system default destination:' in line:
+                default_printer = line.split(':', 1)[1].strip()
+        if result.returncode != 0 and not printers:
+            # "No destinations added" is not an error, anything else is
+            message = result.stderr.strip()
+            if message and 'No destinations' not in message:
+                raise RuntimeError(message)
+        return printers, default_printer
+
+    def _discover_windows(self):
+        if WINDOWS_PRINT_AVAILABLE:
+            printers = {}
+            flags = win32print.PRINTER_ENUM_LOCAL | win32print.PRINTER_ENUM_CONNECTIONS
+            for info in win32print.EnumPrinters(flags, None, 2):
+                work_offline = info['Attributes'] & self.WINDOWS_ATTRIBUTE_WORK_OFFLINE
+                if work_offline or info['Status'] & self.WINDOWS_OFFLINE_STATUS:
+                    state = 'offline'
+                elif info['Status'] & self.WINDOWS_BUSY_STATUS:
+                    state = 'busy'
                 else:
-                    raise Exception(message)
+                    state = 'idle'
+                printers[info['pPrinterName']] = state
+            try:
+                default_printer = win32print.GetDefaultPrinter()
+            except Exception:
+                # No default printer configured
+                default_printer = None
+            return printers, default_printer
+
+        result = subprocess.run(['powershell', '-Command', self.POWERSHELL_SCRIPT], capture_output=True, text=True,
+                                timeout=self.DISCOVERY_TIMEOUT,
+                                creationflags=getattr(subprocess, 'CREATE_NO_WINDOW', 0))
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip() or 'Get-Printer failed')
+        printers = {}
+        default_printer = None
+        for line in result.stdout.splitlines():
+            fields = line.strip().split('\t')
+            if not fields[0]:
+                continue
+            status = fields[1] if len(fields) > 1 else ''
+            if status in self.POWERSHELL_OFFLINE_STATUS:
+                printers[fields[0]] = 'offline'
+            elif status in self.POWERSHELL_BUSY_STATUS:
+                printers[fields[0]] = 'busy'
             else:
-                # Mac/Linux LPR
-                cmd = ['lpr']
-                if printer_name:
-                    cmd.extend(['-P', printer_name])
-                cmd.append(temp_filename)
-                
-                logger.info(f"Executing Unix Print: {' '.join(cmd)}")
-                result = subprocess.run(cmd, capture_output=True, text=True)
-                
-                if result.returncode != 0:
-                     raise Exception(f"LPR failed: {result.stderr}")
-                
-                status = "success"
-                message = "Printed successfully"
-            
-            # Cleanup temp file
+                printers[fields[0]] = 'idle'
+            if len(fields) > 2 and fields[2] == 'True':
+                default_printer = fields[0]
+        return printers, default_printer
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP over a Unix domain socket, such as the local CUPS socket"""
+
+    def __init__(self, socket_path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class IppClient:
+    """Minimal IPP/1.1 client for submitting Print-Job requests to CUPS.
+
+    ``server`` is ``host:port`` or the path of a Unix socket (e.g.
+    ``/run/cups/cups.sock``). Connections are kept alive and reused from a
+    small pool, so back-to-back jobs skip both the ``lpr`` process launch and
+    the TCP/socket setup. ``http.client`` sends one request at a time per
+    connection, so concurrent jobs (one per print queue worker) each take
+    their own pooled connection instead of pipelining on one.
+    """
+
+    VERSION = b'\x01\x01'
+    OPERATION_PRINT_JOB = 0x0002
+    # Delimiter and value tags (RFC 8010)
+    TAG_OPERATION_ATTRIBUTES = 0x01
+    TAG_END_OF_ATTRIBUTES = 0x03
+    TAG_INTEGER = 0x21
+    TAG_ENUM = 0x23
+    TAG_TEXT = 0x41
+    TAG_NAME = 0x42
+    TAG_URI = 0x45
+    TAG_CHARSET = 0x47
+    TAG_LANGUAGE = 0x48
+    TAG_MIME_TYPE = 0x49
+    # Raised by request() on a reused connection the server closed before reading the request. Errors
+    # once the response is awaited are never retried: CUPS may already have accepted the job.
+    STALE_CONNECTION_ERRORS = (ConnectionResetError, BrokenPipeError)
+
+    def __init__(self, server='localhost:631', timeout=30, max_connections=4, requesting_user=None):
+        self.server = server
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.requesting_user = requesting_user or os.environ.get('USER') or os.environ.get('USERNAME') or 'print-server'
+        self._idle = []  # connections ready for reuse
+        self._lock = threading.Lock()
+        self._request_ids = itertools.count(1)
+        self.jobs = 0
+        self.connections_opened = 0
+
+    def print_job(self, printer_name, document, job_name='Barcode Label', document_format='application/pdf'):
+        """Submit ``document`` to ``printer_name``; returns the CUPS job id"""
+        path = '/printers/' + urllib.parse.quote(printer_name)
+        body = self._encode_print_job(f"ipp://localhost{path}", job_name, document_format) + document
+        status, attributes = self._decode_response(self._post(path, body))
+        if status > 0x00FF:
+            message = attributes.get('status-message') or f"IPP status 0x{status:04x}"
+            raise RuntimeError(message)
+        with self._lock:
+            self.jobs += 1
+        return attributes.get('job-id')
+
+    def stats(self):
+        with self._lock:
+            return {'server': self.server, 'jobs': self.jobs, 'connections_opened': self.connections_opened,
+                    'idle_connections': len(self._idle)}
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def _post(self, path, body):
+        connection, reused = self._acquire()
+        try:
             try:
-                os.remove(temp_filename)
-            except: pass
+                self._request(connection, path, body)
+            except self.STALE_CONNECTION_ERRORS:
+                if not reused:
+                    raise
+                # The server dropped the idle connection before reading the request; resend on a fresh one
+                connection.close()
+                connection = self._connect()
+                self._request(connection, path, body)
+            data = self._read_response(connection)
+        except Exception:
+            connection.close()
+            raise
+        self._release(connection)
+        return data
 
-            self._log_job(job_id, file_id, doc_name, page_num, printer_name, status, timestamp, username=username)
-            return True, message
-                
+    def _request(self, connection, path, body):
+        connection.request('POST', path, body=body, headers={'Content-Type': 'application/ipp'})
+
+    def _read_response(self, connection):
+        response = connection.getresponse()
+        # Read the whole body so the connection can carry the next request
+        data = response.read()
+        if response.status != 200:
+            raise RuntimeError(f"IPP server answered HTTP {response.status} {response.reason}")
+        if response.will_close:
+            connection.close()
+        return data
+
+    def _acquire(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                connection = self._idle.pop()
+            if self._is_open(connection):
+                return connection, True
+            connection.close()
+        return self._connect(), False
+
+    def _is_open(self, connection):
+        """An idle keep-alive connection has nothing to read; if it is readable the server has closed it"""
+        if connection.sock is None:
+            return False
+        try:
+            readable, _, _ = select.select([connection.sock], [], [], 0)
+        except (OSError, ValueError):
+            return False
+        return not readable
+
+    def _release(self, connection):
+        if connection.sock is None:
+            return
+        with self._lock:
+            if len(self._idle) < self.max_connections:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def _connect(self):
+        if self.server.startswith('/'):
+            connection = _UnixHTTPConnection(self.server, timeout=self.timeout)
+        else:
+            connection = http.client.HTTPConnection(self.server, timeout=self.timeout)
+        with self._lock:
+            self.connections_opened += 1
+        return connection
+
+    def _encode_print_job(self, printer_uri, job_name, document_format):
+        request_id = next(self._request_ids)
+        parts = [self.VERSION, struct.pack('>HI', self.OPERATION_PRINT_JOB, request_id & 0x7FFFFFFF),
+                 bytes([self.TAG_OPERATION_ATTRIBUTES])]
+        for tag, name, value in (
+            (self.TAG_CHARSET, 'attributes-charset', 'utf-8'),
+            (self.TAG_LANGUAGE, 'attributes-natural-language', 'en'),
+            (self.TAG_URI, 'printer-uri', printer_uri),
+            (self.TAG_NAME, 'requesting-user-name', self.requesting_user),
+            (self.TAG_NAME, 'job-name', job_name),
+            (self.TAG_MIME_TYPE, 'document-format', document_format),
+        ):
+            name = name.encode('ascii')
+            value = value.encode('utf-8')
+            parts.append(struct.pack('>BH', tag, len(name)) + name + struct.pack('>H', len(value)) + value)
+        parts.append(bytes([self.TAG_END_OF_ATTRIBUTES]))
+        return b''.join(parts)
+
+    def _decode_response(self, data):
+        """(status code, {attribute name: first value}) from an IPP response"""
+        if len(data) < 9:
+            raise RuntimeError('Truncated IPP response')
+        status = struct.unpack('>H', data[2:4])[0]
+        attributes = {}
+        offset = 8
+        name = None
+        while offset < len(data):
+            tag = data[offset]
+            offset += 1
+            if tag == self.TAG_END_OF_ATTRIBUTES:
+                break
+            if tag < 0x10:
+                # Start of the next attribute group
+                continue
+            name_length = struct.unpack('>H', data[offset:offset + 2])[0]
+            offset += 2
+            if name_length:
+                name = data[offset:offset + name_length].decode('ascii', errors='replace')
+            offset += name_length
+            value_length = struct.unpack('>H', data[offset:offset + 2])[0]
+            offset += 2
+            value = data[offset:offset + value_length]
+            offset += value_length
+            if not name_length or name in attributes:
+                # Additional values of a multi-valued attribute
+                continue
+            if tag in (self.TAG_INTEGER, self.TAG_ENUM) and value_length == 4:
+                attributes[name] = struct.unpack('>i', value)[0]
+            else:
+                attributes[name] = value.decode('utf-8', errors='replace')
+        return status, attributes
+
+
+class ThermalLabelEncoder:
+    """1-bit label bitmaps as raw printer language, for thermal printers that
+    would otherwise have CUPS rasterize a PDF.
+
+    ZPL labels carry a ``^GFA`` graphic field in Zebra's compressed ASCII
+    form: repeated hex digits become a count letter plus the digit, ``,`` and
+    ``!`` fill the rest of a row with white or black, and ``:`` repeats the
+    previous row. EPL labels carry the bitmap as binary ``GW`` data. Each
+    image becomes one label; the label size is the image size in dots.
+    """
+
+    FORMATS = ('zpl', 'epl')
+    # Gap between labels for EPL's Q command, in dots (3 mm at 203 dpi)
+    EPL_GAP_DOTS = 24
+    _INVERT = bytes(255 - value for value in range(256))
+
+    def encode(self, images, output_format):
+        if output_format == 'zpl':
+            return b''.join(self.encode_zpl(image) for image in images)
+        if output_format == 'epl':
+            return b''.join(self.encode_epl(image) for image in images)
+        raise ValueError(f"Unknown raw output format: {output_format}")
+
+    def encode_zpl(self, image):
+        width, height = image.size
+        bytes_per_row, rows = self._rows(image, black_bit=1)
+        total = bytes_per_row * height
+        data = self._compress_zpl(row.hex().upper() for row in rows)
+        return (f"^XA^PW{width}^LL{height}^FO0,0^GFA,{total},{total},{bytes_per_row},{data}^FS^XZ\n"
+                .encode('ascii'))
+
+    def encode_epl(self, image):
+        width, height = image.size
+        bytes_per_row, rows = self._rows(image, black_bit=0)
+        header = f"\nN\nq{width}\nQ{height},{self.EPL_GAP_DOTS}\nGW0,0,{bytes_per_row},{height},"
+        return header.encode('ascii') + b''.join(rows) + b"\nP1\n"
+
+    def _rows(self, image, black_bit):
+        """(bytes per row, packed rows) with black dots as ``black_bit`` and row padding left white"""
+        if image.mode != '1':
+            image = image.convert('1')
+        width, height = image.size
+        bytes_per_row = (width + 7) // 8
+        # PIL packs '1' images with 1 = white and zero padding bits
+        packed = image.tobytes()
+        if black_bit:
+            packed = packed.translate(self._INVERT)
+        rows = [packed[row * bytes_per_row:(row + 1) * bytes_per_row] for row in range(height)]
+        padding = bytes_per_row * 8 - width
+        if padding:
+            pad_mask = (1 << padding) - 1
+            for index, row in enumerate(rows):
+                last = row[-1] & ~pad_mask if black_bit else row[-1] | pad_mask
+                rows[index] = row[:-1] + bytes([last])
+        return bytes_per_row, rows
+
+    def _compress_zpl(self, hex_rows):
+        encoded = []
+        previous = None
+        for row in hex_rows:
+            if row == previous:
+                encoded.append(':')
+                continue
+            previous = row
+            body = row.rstrip('0')
+            suffix = ','
+            if len(body) == len(row):
+                body = row.rstrip('F')
+                suffix = '!' if len(body) < len(row) else ''
+            parts = []
+            for digit, run in itertools.groupby(body):
+                parts.append(self._zpl_count(len(list(run))) + digit)
+            encoded.append(''.join(parts) + suffix)
+        return ''.join(encoded)
+
+    @staticmethod
+    def _zpl_count(count):
+        """Repeat prefix for ``count`` copies of a digit: g-z are 20-400, G-Y are 1-19"""
+        if count == 1:
+            return ''
+        prefix = 'z' * (count // 400)
+        count %= 400
+        if count >= 20:
+            prefix += chr(ord('g') + count // 20 - 1)
+            count %= 20
+        if count:
+            prefix += chr(ord('G') + count - 1)
+        return prefix
+
+
+def _join_label_pdfs(labels):
+    """Single PDF holding every label in ``labels`` (list of (pdf_bytes, page_num, pdf_hash))"""
+    document = labels[0][0]
+    if (all(pdf_bytes is document for pdf_bytes, _page_num, _pdf_hash in labels)
+            and [page_num for _pdf_bytes, page_num, _pdf_hash in labels] == list(range(1, len(labels) + 1))):
+        # Every page of one document (or a single label): print that document as is
+        return document
+    pdf_writer = pypdf.PdfWriter()
+    readers = {}
+    for pdf_bytes, page_num, _pdf_hash in labels:
+        if id(pdf_bytes) not in readers:
+            readers[id(pdf_bytes)] = pypdf.PdfReader(io.BytesIO(pdf_bytes))
+        pdf_writer.add_page(readers[id(pdf_bytes)].pages[page_num - 1])
+    output_buffer = io.BytesIO()
+    pdf_writer.write(output_buffer)
+    return output_buffer.getvalue()
+
+
+PRINTER_BACKENDS = {}
+
+
+def register_printer_backend(cls):
+    """Class decorator that makes a PrinterBackend selectable by its ``name``"""
+    PRINTER_BACKENDS[cls.name] = cls
+    return cls
+
+
+def create_printer_backend(name, print_service, **options):
+    """Backend registered as ``name``; 'auto' picks the platform's usual one.
+
+    ``options`` (ipp_server, spool_dir, ...) are passed to every backend, which
+    takes the ones it uses.
+    """
+    if name == 'auto':
+        if platform.system() == 'Windows':
+            name = 'windows' if WINDOWS_PRINT_AVAILABLE else 'powershell'
+        else:
+            name = 'lpr'
+    if name not in PRINTER_BACKENDS:
+        raise ValueError(f"Unknown print backend: {name}")
+    return PRINTER_BACKENDS[name](print_service, **options)
+
+
+class PrinterBackend:
+    """How a print job leaves the server.
+
+    Subclasses set ``name``, register with ``@register_printer_backend`` and
+    implement ``_send_pdf``. A backend that prints label by label from
+    bitmaps (native Windows) sets ``separate_labels`` and implements
+    ``_send_labels`` instead. Every backend counts jobs, pages, bytes and the
+    time spent sending, which ``stats`` reports.
+    """
+
+    name = None
+    # Wants each label as its own cropped PDF (with its raster cache key) rather than one combined PDF
+    separate_labels = False
+    # Prints bitmaps rendered through PrintService, so prerendering rasters pays off
+    renders_rasters = False
+
+    def __init__(self, print_service, **options):
+        self.print_service = print_service
+        self._lock = threading.Lock()
+        self.jobs = 0
+        self.failed = 0
+        self.pages = 0
+        self.bytes = 0
+        self.send_seconds = 0.0
+        self._first_started = None
+        self._last_finished = None
+
+    def send_pdf(self, pdf_bytes, printer_name=None, quality_settings=None, page_count=1, pdf_hash=None):
+        """Send a PDF held in memory as one job; returns (success, message).
+
+        page_count tells label-by-label backends how many pages to print;
+        pdf_hash (raster cache key) only applies to single-page PDFs.
+        """
+        if self.separate_labels:
+            if page_count == 1:
+                labels = [(pdf_bytes, 1, pdf_hash)]
+            else:
+                labels = [(pdf_bytes, page_num, None) for page_num in range(1, page_count + 1)]
+            return self.send_labels(labels, printer_name, quality_settings)
+        return self._timed(page_count, len(pdf_bytes), self._send_pdf, pdf_bytes, printer_name, quality_settings or {})
+
+    def send_labels(self, labels, printer_name=None, quality_settings=None):
+        """Send labels, a list of (pdf_bytes, page_num, pdf_hash), as the pages of one job"""
+        if not self.separate_labels:
+            return self.send_pdf(_join_label_pdfs(labels), printer_name, quality_settings, page_count=len(labels))
+        size = sum(len(pdf_bytes) for pdf_bytes in {id(label[0]): label[0] for label in labels}.values())
+        return self._timed(len(labels), size, self._send_labels, labels, printer_name, quality_settings or {})
+
+    def send_raw(self, data, printer_name=None, page_count=1, data_format='zpl'):
+        """Send printer-language data (ZPL, EPL) untouched by drivers or filters; returns (success, message)"""
+        return self._timed(page_count, len(data), self._send_raw, data, printer_name, data_format)
+
+    def stats(self):
+        with self._lock:
+            # Rates need a span of jobs; one job's wall time is just its own send time
+            wall_seconds = (self._last_finished - self._first_started) if self.jobs > 1 else 0.0
+            return {
+                'backend': self.name,
+                'jobs': self.jobs,
+                'failed': self.failed,
+                'pages': self.pages,
+                'bytes': self.bytes,
+                'send_seconds': round(self.send_seconds, 3),
+                'avg_send_ms': round(self.send_seconds / self.jobs * 1000, 3) if self.jobs else None,
+                # First job started to last job finished, including time spent in the pipeline between jobs
+                'wall_seconds': round(wall_seconds, 3),
+                'jobs_per_second': round(self.jobs / wall_seconds, 1) if wall_seconds else None,
+                'pages_per_second': round(self.pages / wall_seconds, 1) if wall_seconds else None
+            }
+
+    def _send_pdf(self, pdf_bytes, printer_name, quality_settings):
+        raise NotImplementedError
+
+    def _send_labels(self, labels, printer_name, quality_settings):
+        raise NotImplementedError
+
+    def _send_raw(self, data, printer_name, data_format):
+        return False, f"The {self.name} print backend cannot send raw {data_format.upper()} jobs"
+
+    def _timed(self, page_count, size, send, *args):
+        """Run ``send(*args)`` and count it as one job; an exception counts as a failure"""
+        start = time.perf_counter()
+        success = False
+        try:
+            result = send(*args)
+            success = result[0]
+            return result
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self.jobs += 1
+                if not success:
+                    self.failed += 1
+                self.pages += page_count
+                self.bytes += size
+                self.send_seconds += finished - start
+                if self._first_started is None:
+                    self._first_started = start
+                self._last_finished = finished
+
+
+@register_printer_backend
+class LprBackend(PrinterBackend):
+    name = 'lpr'
+
+    def _send_pdf(self, pdf_bytes, printer_name, quality_settings):
+        """Mac/Linux: pipe the PDF to lpr on stdin, so nothing is written to disk"""
+        cmd = ['lpr', '-T', 'Barcode Label']
+        if printer_name:
+            cmd.extend(['-P', printer_name])
+
+        logger.info(f"Executing Unix Print: {' '.join(cmd)} ({len(pdf_bytes)} bytes on stdin)")
+        result = subprocess.run(cmd, input=pdf_bytes, capture_output=True)
+        if result.returncode != 0:
+            return False, f"LPR failed: {result.stderr.decode(errors='replace')}"
+        return True, "Printed successfully"
+
+    def _send_raw(self, data, printer_name, data_format):
+        # -o raw skips the CUPS filters, so the printer gets the ZPL/EPL as is
+        cmd = ['lpr', '-o', 'raw', '-T', 'Barcode Label']
+        if printer_name:
+            cmd.extend(['-P', printer_name])
+
+        logger.info(f"Executing Unix Print: {' '.join(cmd)} ({len(data)} bytes of {data_format.upper()} on stdin)")
+        result = subprocess.run(cmd, input=data, capture_output=True)
+        if result.returncode != 0:
+            return False, f"LPR failed: {result.stderr.decode(errors='replace')}"
+        return True, "Printed successfully"
+
+
+@register_printer_backend
+class IppBackend(PrinterBackend):
+    name = 'ipp'
+
+    def __init__(self, print_service, ipp_client=None, ipp_server='localhost:631', **options):
+        super().__init__(print_service)
+        self.client = ipp_client or IppClient(server=ipp_server)
+
+    def _send_pdf(self, pdf_bytes, printer_name, quality_settings):
+        """Mac/Linux: submit a Print-Job to CUPS directly, without starting a process"""
+        return self._print_job(pdf_bytes, printer_name, 'application/pdf')
+
+    def _send_raw(self, data, printer_name, data_format):
+        # CUPS passes application/vnd.cups-raw to the printer without filtering
+        return self._print_job(data, printer_name, 'application/vnd.cups-raw')
+
+    def _print_job(self, document, printer_name, document_format):
+        printer_name = printer_name or self.print_service._default_printer()
+        if not printer_name:
+            return False, "IPP failed: no printer given and no default printer"
+
+        logger.info(f"IPP Print-Job to {printer_name} on {self.client.server} ({len(document)} bytes, {document_format})")
+        try:
+            job_id = self.client.print_job(printer_name, document, job_name='Barcode Label',
+                                           document_format=document_format)
         except Exception as e:
-            logger.error(f"Print error: {e}")
-            message = str(e)
-            self._log_job(job_id, file_id, doc_name if 'doc_name' in locals() else 'Unknown', page_num, printer_name, status, timestamp, message, username=username)
-            return False, message
+            return False, f"IPP failed: {e}"
+        return True, f"Printed successfully (job {job_id})"
+
+    def stats(self):
+        return dict(super().stats(), ipp=self.client.stats())
+
 
-    def _print_windows_native(self, pdf_path, printer_name=None, quality_settings=None):
+@register_printer_backend
+class PowerShellBackend(PrinterBackend):
+    name = 'powershell'
+
+    def _send_pdf(self, pdf_bytes, printer_name, quality_settings):
+        """Fallback Windows printing using Powershell Start-Process"""
+        # The shell print verb needs a file, so this fallback alone writes one
+        # (in the system temp folder, removed once Powershell returns)
+        fd, file_path = tempfile.mkstemp(prefix='print_job_', suffix='.pdf')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf_bytes)
+        try:
+            if printer_name:
+                cmd = ['powershell', '-Command', f'Start-Process -FilePath "{file_path}" -Verb PrintTo -ArgumentList "{printer_name}" -PassThru -Wait']
+            else:
+                cmd = ['powershell', '-Command', f'Start-Process -FilePath "{file_path}" -Verb Print -PassThru']
+            
+            logger.info(f"Executing Windows Print: {cmd}")
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+            
+            if result.returncode == 0:
+                return True, "Sent to Windows print queue"
+            else:
+                return False, f"Powershell print failed: {result.stderr}"
+        except subprocess.TimeoutExpired:
+            return False, "Print operation timed out"
+        except Exception as e:
+            return False, str(e)
+        finally:
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass
+
+
+@register_printer_backend
+class WindowsNativeBackend(PrinterBackend):
+    name = 'windows'
+    separate_labels = True
+    renders_rasters = True
+
+    def __init__(self, print_service, **options):
+        if not WINDOWS_PRINT_AVAILABLE:
+            raise ValueError("The windows print backend needs pywin32 on Windows")
+        super().__init__(print_service)
+        self.fallback = PowerShellBackend(print_service)
+
+    def _send_labels(self, labels, printer_name, quality_settings):
         """Print using win32print (native GDI) - Most Reliable Method
+
+        labels is a list of (pdf_bytes, page_num, pdf_hash), printed as the
+        pages of one document.
         
         quality_settings can include:
         - dpi: 150, 300, 600 (default: 600 for best quality)
         - color_mode: 'rgb', 'grayscale', 'monochrome' (default: 'grayscale')
         - sharpening: True/False (default: True)
         - resampling: 'lanczos', 'bicubic', 'bilinear' (default: 'lanczos')
+
+        The print-ready bitmap of each label is taken from / stored in the
+        raster cache under its pdf_hash, when it has one. Labels are rendered
+        and drawn one at a time, so a bulk run only holds one bitmap. Until
+        the document is started, failures fall back to Powershell; after
+        that the document is aborted instead, since reprinting the whole
+        batch would duplicate the labels already spooled.
         """
-        if quality_settings is None:
-            quality_settings = {}
-        
+        # Render the first label up front, so a missing rasterizer still falls back before anything prints
+        pdf_bytes, page_num, pdf_hash = labels[0]
+        image = self.print_service._get_print_image(pdf_bytes, quality_settings, pdf_hash, page_num=page_num)
+        if image is None:
+            # Fallback to Powershell if conversion fails
+            logger.warning("PDF to Image conversion failed, falling back to Powershell")
+            return self.fallback._send_pdf(_join_label_pdfs(labels), printer_name, quality_settings)
+
         try:
-            # Convert PDF to Image first with quality settings
-            image = self._pdf_to_image(pdf_path, quality_settings)
-            if image is None:
-                # Fallback to Powershell if conversion fails
-                logger.warning("PDF to Image conversion failed, falling back to Powershell")
-                return self._print_windows_powershell(pdf_path, printer_name)
-            
-            # Apply image quality enhancements
-            image = self._apply_quality_enhancements(image, quality_settings)
-            
             # Get printer
             if not printer_name:
-                printer_name = win32print.GetDefaultPrinter()
+                printer_name = self.print_service._default_printer() or win32print.GetDefaultPrinter()
             
             # GDI Printing (from working project)
             hDC = win32ui.CreateDC()
             hDC.CreatePrinterDC(printer_name)
             
             printable_area = (hDC.GetDeviceCaps(win32con.HORZRES), hDC.GetDeviceCaps(win32con.VERTRES))
-            ratio = min(printable_area[0] / image.size[0], printable_area[1] / image.size[1])
-            scaled_size = (int(image.size[0] * ratio), int(image.size[1] * ratio))
-            
             # Use high-quality resampling based on settings
-            resampling_mode = self._get_resampling_mode(quality_settings.get('resampling', 'lanczos'))
-            bmp = image.resize(scaled_size, resampling_mode)
-            
-            # Convert to RGB for DIB if in grayscale/monochrome mode
-            if bmp.mode == '1':
-                bmp = bmp.convert('L').convert('RGB')
-            elif bmp.mode == 'L':
-                bmp = bmp.convert('RGB')
-            
-            dib = ImageWin.Dib(bmp)
+            resampling_mode = self.print_service._get_resampling_mode(quality_settings.get('resampling', 'lanczos'))
             
             hDC.StartDoc("Barcode Label")
-            hDC.StartPage()
-            x = (printable_area[0] - scaled_size[0]) // 2
-            y = (printable_area[1] - scaled_size[1]) // 2
-            dib.draw(hDC.GetHandleOutput(), (x, y, x + scaled_size[0], y + scaled_size[1]))
-            hDC.EndPage()
+        except Exception as e:
+            logger.error(f"Native Windows print failed: {e}")
+            # Nothing was spooled yet; fallback to Powershell
+            return self.fallback._send_pdf(_join_label_pdfs(labels), printer_name, quality_settings)
+
+        try:
+            for index, (pdf_bytes, page_num, pdf_hash) in enumerate(labels):
+                if index:
+                    image = self.print_service._get_print_image(pdf_bytes, quality_settings, pdf_hash,
+                                                                page_num=page_num)
+                    if image is None:
+                        raise Exception(f"PDF to Image conversion failed for label {index + 1}")
+                ratio = min(printable_area[0] / image.size[0], printable_area[1] / image.size[1])
+                scaled_size = (int(image.size[0] * ratio), int(image.size[1] * ratio))
+                bmp = image.resize(scaled_size, resampling_mode)
+                
+                # Convert to RGB for DIB if in grayscale/monochrome mode
+                if bmp.mode == '1':
+                    bmp = bmp.convert('L').convert('RGB')
+                elif bmp.mode == 'L':
+                    bmp = bmp.convert('RGB')
+                
+                dib = ImageWin.Dib(bmp)
+                
+                hDC.StartPage()
+                x = (printable_area[0] - scaled_size[0]) // 2
+                y = (printable_area[1] - scaled_size[1]) // 2
+                dib.draw(hDC.GetHandleOutput(), (x, y, x + scaled_size[0], y + scaled_size[1]))
+                hDC.EndPage()
             hDC.EndDoc()
+        except Exception as e:
+            logger.error(f"Native Windows print failed, aborting the document: {e}")
+            try:
+                hDC.AbortDoc()
+            except Exception:
+                pass
+            return False, f"Native print failed: {e}"
+        finally:
             hDC.DeleteDC()
             
+        return True, f"Printed to {printer_name}"
+
+    def _send_raw(self, data, printer_name, data_format):
+        """Write ZPL/EPL to the spooler as a RAW document, bypassing the driver"""
+        try:
+            if not printer_name:
+                printer_name = self.print_service._default_printer() or win32print.GetDefaultPrinter()
+            handle = win32print.OpenPrinter(printer_name)
+            try:
+                win32print.StartDocPrinter(handle, 1, ("Barcode Label", None, "RAW"))
+                try:
+                    win32print.StartPagePrinter(handle)
+                    win32print.WritePrinter(handle, data)
+                    win32print.EndPagePrinter(handle)
+                finally:
+                    win32print.EndDocPrinter(handle)
+            finally:
+                win32print.ClosePrinter(handle)
             return True, f"Printed to {printer_name}"
+        except Exception as e:
+            logger.error(f"Raw Windows print failed: {e}")
+            return False, f"Raw print failed: {e}"
+
+
+@register_printer_backend
+class FileSpoolBackend(PrinterBackend):
+    """Writes every job to ``spool_dir`` as a PDF instead of printing it, for
+    load tests and for inspecting exactly what a printer would receive."""
+
+    name = 'file'
+
+    def __init__(self, print_service, spool_dir=None, **options):
+        super().__init__(print_service)
+        self.spool_dir = spool_dir or os.path.join(tempfile.gettempdir(), 'print-spool')
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._sequence = itertools.count(1)
+
+    def _send_pdf(self, pdf_bytes, printer_name, quality_settings):
+        return self._spool(pdf_bytes, printer_name, 'pdf')
+
+    def _send_raw(self, data, printer_name, data_format):
+        return self._spool(data, printer_name, data_format)
+
+    def _spool(self, data, printer_name, extension):
+        printer = re.sub(r'[^A-Za-z0-9_.-]', '_', printer_name or 'Default')
+        file_name = f"{datetime.datetime.now():%Y%m%d-%H%M%S-%f}_{printer}_{next(self._sequence):06d}.{extension}"
+        path = os.path.join(self.spool_dir, file_name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return True, f"Spooled to {path}"
+
+    def stats(self):
+        return dict(super().stats(), spool_dir=self.spool_dir)
+
+
+@register_printer_backend
+class NullBackend(PrinterBackend):
+    """Accepts and discards every job, so the rest of the pipeline can be
+    load-tested without a printer."""
+
+    name = 'null'
+
+    def _send_pdf(self, pdf_bytes, printer_name, quality_settings):
+        return True, f"Discarded {len(pdf_bytes)} bytes"
+
+    def _send_raw(self, data, printer_name, data_format):
+        return True, f"Discarded {len(data)} bytes of {data_format.upper()}"
+
+
+class PrintService:
+    def __init__(self, pdf_service, raster_cache_dir=None, raster_memory_bytes=64 * 1024 * 1024,
+                 raster_disk_bytes=256 * 1024 * 1024, printer_registry=None, print_backend='auto',
+                 backend_options=None, pdf_rasterizer='auto', raster_workers=0):
+        self.pdf_service = pdf_service
+        # Where jobs go: one of PRINTER_BACKENDS, or 'auto' for the platform's usual one
+        self.backend = create_printer_backend(print_backend, self, **(backend_options or {}))
+        # Cached printer discovery; the default printer is looked up there instead of per job
+        self.printer_registry = printer_registry
+        # Rasterized labels for the Windows native path and raw output, so reprints skip rendering
+        self.raster_cache = RasterCache(memory_bytes=raster_memory_bytes, spill_dir=raster_cache_dir,
+                                        disk_bytes=raster_disk_bytes)
+        # Renders labels for those bitmaps: pdfium in-process when available, else a pdftoppm process per label
+        self.rasterizer = create_pdf_rasterizer(pdf_rasterizer, workers=raster_workers)
+        self.label_encoder = ThermalLabelEncoder()
+        
+    def print_page(self, file_id, page_num, printer_name=None, label_settings=None, username='Unknown'):
+        job_id = str(uuid.uuid4())
+        timestamp = datetime.datetime.now().isoformat()
+        success, message = self.send_page(file_id, page_num, printer_name, label_settings)
+        status = "success" if success else "failed"
+        self._log_job(job_id, file_id, self._doc_name(file_id), page_num, printer_name, status, timestamp,
+                      None if success else message, username=username)
+        return success, message
+
+    def send_page(self, file_id, page_num, printer_name=None, label_settings=None):
+        """Crop one page and send it to the printer; returns (success, message) without logging."""
+        # Default label settings
+        if label_settings is None:
+            label_settings = {}
+        
+        try:
+            # 1. Get cropped PDF bytes (pass label settings for custom crop)
+            pdf_bytes, pdf_hash = self.pdf_service.get_cropped_page(file_id, page_num, label_settings)
             
+            # 2. Send to printer straight from memory, as PDF or as raw ZPL/EPL
+            success, message = self.send_label_pdf(pdf_bytes, printer_name, label_settings, pdf_hash=pdf_hash)
+            if not success:
+                raise Exception(message)
+            return True, message
+                
         except Exception as e:
-            logger.error(f"Native Windows print failed: {e}")
-            # Fallback to Powershell
-            return self._print_windows_powershell(pdf_path, printer_name)
+            logger.error(f"Print error: {e}")
+            return False, str(e)
+
+    def _doc_name(self, file_id):
+        # Get document name for logs
+        return self.pdf_service.documents.get(file_id, {}).get('name', 'Unknown Document')
+
+    def _quality_settings(self, label_settings):
+        return {
+            'dpi': label_settings.get('dpi', 600),
+            'color_mode': label_settings.get('color_mode', 'grayscale'),
+            'sharpening': label_settings.get('sharpening', True),
+            'resampling': label_settings.get('resampling', 'lanczos'),
+            'contrast': label_settings.get('contrast', 1.0),
+            'threshold': label_settings.get('threshold', 128)
+        }
+
+    def _output_format(self, label_settings):
+        """'pdf' (default), or 'zpl'/'epl' to render labels for thermal printers on the server"""
+        output_format = str((label_settings or {}).get('output_format') or 'pdf').lower()
+        if output_format != 'pdf' and output_format not in ThermalLabelEncoder.FORMATS:
+            raise ValueError(f"Unknown output format: {output_format}")
+        return output_format
+
+    def _printer_dpi(self, label_settings):
+        """The thermal printer's resolution for raw output (printer_dpi, default 203)"""
+        printer_dpi = (label_settings or {}).get('printer_dpi', 203)
+        try:
+            if isinstance(printer_dpi, bool) or int(printer_dpi) <= 0:
+                raise ValueError
+        except (TypeError, ValueError):
+            raise ValueError(f"printer_dpi must be a positive whole number: {printer_dpi!r}")
+        return int(printer_dpi)
+
+    def _raw_quality_settings(self, label_settings):
+        """Quality settings for raw output: 1-bit at the printer's own resolution"""
+        return dict(self._quality_settings(label_settings), dpi=self._printer_dpi(label_settings),
+                    color_mode='monochrome')
+
+    def validate_label_settings(self, label_settings):
+        """Raise ValueError for output settings that would otherwise only fail in the print worker"""
+        if not isinstance(label_settings, dict):
+            raise ValueError("label_settings must be an object")
+        self._output_format(label_settings)
+        self._printer_dpi(label_settings)
+
+    def prerender_raster(self, pdf_bytes, pdf_hash, label_settings):
+        """Put the print-ready bitmap for a cropped label into the raster cache ahead of printing."""
+        if self._output_format(label_settings) != 'pdf':
+            quality_settings = self._raw_quality_settings(label_settings)
+        elif self.backend.renders_rasters:
+            quality_settings = self._quality_settings(label_settings)
+        else:
+            # PDF output through a backend that never rasterizes
+            return
+        self._get_print_image(pdf_bytes, quality_settings, pdf_hash)
+
+    def send_label_pdf(self, pdf_bytes, printer_name=None, label_settings=None, page_count=1, pdf_hash=None):
+        """Print a PDF of labels in the output format label_settings asks for; returns (success, message).
+
+        pdf_hash (raster cache key) only applies to single-page PDFs.
+        """
+        if label_settings is None:
+            label_settings = {}
+        if self._output_format(label_settings) != 'pdf':
+            if page_count == 1:
+                labels = [(pdf_bytes, 1, pdf_hash)]
+            else:
+                labels = [(pdf_bytes, page_num, None) for page_num in range(1, page_count + 1)]
+            return self.send_raw_labels(labels, printer_name, label_settings)
+        quality_settings = self._quality_settings(label_settings)
+        logger.info(f"Print quality settings: {quality_settings}")
+        return self.send_pdf(pdf_bytes, printer_name, quality_settings, pdf_hash=pdf_hash, page_count=page_count)
+
+    def send_raw_labels(self, labels, printer_name=None, label_settings=None):
+        """Render labels (list of (pdf_bytes, page_num, pdf_hash)) to 1-bit bitmaps at the printer's
+        resolution and send them as one raw ZPL or EPL job; returns (success, message)."""
+        if label_settings is None:
+            label_settings = {}
+        output_format = self._output_format(label_settings)
+        quality_settings = self._raw_quality_settings(label_settings)
+        images = []
+        for pdf_bytes, page_num, pdf_hash in labels:
+            image = self._get_print_image(pdf_bytes, quality_settings, pdf_hash, page_num=page_num)
+            if image is None:
+                return False, f"Could not render the label for {output_format.upper()} output"
+            images.append(image)
+        data = self.label_encoder.encode(images, output_format)
+        return self.backend.send_raw(data, printer_name, page_count=len(images), data_format=output_format)
+
+    def send_pages(self, file_id, page_nums, printer_name=None, label_settings=None):
+        """Crop several pages and send them as one print job; returns (success, message) without logging."""
+        if label_settings is None:
+            label_settings = {}
+
+        try:
+            quality_settings = self._quality_settings(label_settings)
+            raw_output = self._output_format(label_settings) != 'pdf'
+            if raw_output or self.backend.separate_labels:
+                # Bitmaps are made per label, so take the labels one by one through the crop and raster caches
+                labels = []
+                for page_num in page_nums:
+                    pdf_bytes, pdf_hash = self.pdf_service.get_cropped_page(file_id, page_num, label_settings)
+                    labels.append((pdf_bytes, 1, pdf_hash))
+                if raw_output:
+                    success, message = self.send_raw_labels(labels, printer_name, label_settings)
+                else:
+                    success, message = self.backend.send_labels(labels, printer_name, quality_settings)
+            else:
+                pdf_bytes = self.pdf_service.get_cropped_pages(file_id, page_nums, label_settings)
+                success, message = self.send_pdf(pdf_bytes, printer_name, quality_settings, page_count=len(page_nums))
+            if not success:
+                raise Exception(message)
+            return True, message
+
+        except Exception as e:
+            logger.error(f"Batch print error: {e}")
+            return False, str(e)
+
+    def send_pdf(self, pdf_bytes, printer_name=None, quality_settings=None, pdf_hash=None, page_count=1):
+        """Send a PDF held in memory to the printer through the configured backend; returns (success, message).
+
+        page_count tells the native Windows path how many pages to rasterize;
+        pdf_hash (raster cache key) only applies to single-page PDFs.
+        """
+        return self.backend.send_pdf(pdf_bytes, printer_name, quality_settings, page_count=page_count, pdf_hash=pdf_hash)
+
+    def _default_printer(self):
+        return self.printer_registry.default_printer() if self.printer_registry else None
+
+    def _get_print_image(self, pdf_bytes, quality_settings, pdf_hash=None, page_num=1):
+        """Rasterize and enhance one page, reusing a cached bitmap for reprints"""
+        cache_key = RasterCache.make_key(pdf_hash, quality_settings) if pdf_hash else None
+        if cache_key:
+            image = self.raster_cache.get(cache_key)
+            if image is not None:
+                return image
+
+        image = self._pdf_to_image(pdf_bytes, quality_settings, page_num=page_num)
+        if image is None:
+            return None
+        # Apply image quality enhancements
+        image = self._apply_quality_enhancements(image, quality_settings)
+        if cache_key:
+            self.raster_cache.put(cache_key, image)
+        return image
 
     def _get_resampling_mode(self, mode_name):
         """Get PIL resampling filter from name"""
@@ -751,7 +3458,8 @@ class PrintService:
         color_mode = quality_settings.get('color_mode', 'grayscale')
         if color_mode == 'monochrome':
             # Convert to pure black and white - best for thermal printers
-            image = image.convert('L')  # First to grayscale
+            if image.mode != 'L':
+                image = image.convert('L')  # First to grayscale
             # Apply threshold for crisp black/white
             threshold = quality_settings.get('threshold', 128)
             image = image.point(lambda x: 0 if x < threshold else 255, '1')
@@ -762,71 +3470,28 @@ class PrintService:
         
         return image
     
-    def _pdf_to_image(self, pdf_path, quality_settings=None):
-        """Convert first page of PDF to PIL Image with quality settings"""
+    def _pdf_to_image(self, pdf_bytes, quality_settings=None, page_num=1):
+        """Convert one page (default the first) of an in-memory PDF to PIL Image with quality settings.
+
+        Grayscale and monochrome output is rendered as 'L'; only other color modes get RGB.
+        """
         if quality_settings is None:
             quality_settings = {}
         
         try:
-            from pdf2image import convert_from_path
-            import sys
-            
-            # Determine Poppler path (bundled with EXE or system PATH)
-            poppler_path = None
-            if getattr(sys, 'frozen', False):
-                # Running as PyInstaller EXE - Poppler is bundled in 'poppler' subfolder
-                bundle_dir = sys._MEIPASS
-                poppler_path = os.path.join(bundle_dir, 'poppler')
-                if not os.path.exists(poppler_path):
-                    # Try alternative path structure
-                    poppler_path = os.path.join(os.path.dirname(sys.executable), 'poppler')
-                logger.info(f"Using bundled Poppler at: {poppler_path}")
-            
             # Use DPI from quality settings, default to 600 for high quality
             dpi = quality_settings.get('dpi', 600)
-            logger.info(f"Converting PDF to image at {dpi} DPI")
-            
-            # Convert PDF to image with high DPI
-            images = convert_from_path(
-                pdf_path, 
-                dpi=dpi, 
-                first_page=1, 
-                last_page=1,
-                poppler_path=poppler_path
-            )
-            if images:
-                img = images[0]
-                # Keep in RGB for now, color conversion happens in quality enhancement step
-                if img.mode != 'RGB':
-                    img = img.convert('RGB')
-                return img
-        except ImportError:
-            logger.warning("pdf2image not installed. Install it for native Windows printing.")
+            grayscale = quality_settings.get('color_mode', 'grayscale') in ('grayscale', 'monochrome')
+            logger.info(f"Converting PDF to image at {dpi} DPI with {self.rasterizer.name}")
+            return self.rasterizer.render(pdf_bytes, page_num=page_num, dpi=dpi, grayscale=grayscale)
+        except FileNotFoundError:
+            logger.warning("Poppler (pdftoppm) not found. Install it (or pypdfium2) for native Windows printing.")
         except Exception as e:
             logger.error(f"PDF to image conversion error: {e}")
         return None
 
-    def _print_windows_powershell(self, file_path, printer_name=None):
-        """Fallback Windows printing using Powershell Start-Process"""
-        try:
-            if printer_name:
-                cmd = ['powershell', '-Command', f'Start-Process -FilePath "{file_path}" -Verb PrintTo -ArgumentList "{printer_name}" -PassThru -Wait']
-            else:
-                cmd = ['powershell', '-Command', f'Start-Process -FilePath "{file_path}" -Verb Print -PassThru']
-            
-            logger.info(f"Executing Windows Print: {cmd}")
-            result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-            
-            if result.returncode == 0:
-                return True, "Sent to Windows print queue"
-            else:
-                return False, f"Powershell print failed: {result.stderr}"
-        except subprocess.TimeoutExpired:
-            return False, "Print operation timed out"
-        except Exception as e:
-            return False, str(e)
-
-    def _log_job(self, job_id, file_id, doc_name, page_num, printer_name, status, timestamp, error=None, username='Unknown'):
+    def _log_job(self, job_id, file_id, doc_name, page_num, printer_name, status, timestamp, error=None, username='Unknown',
+                 batch_id=None, **extra):
         job_data = {
             'id': job_id,
             'file_id': file_id,
@@ -838,4 +3503,178 @@ class PrintService:
             'error': error,
             'username': username
         }
+        if batch_id:
+            # Pages printed together in one spool job share the batch's job ID
+            job_data['batch_id'] = batch_id
+        # Caller-specific fields, such as the encoded data of a QR label
+        job_data.update(extra)
         self.pdf_service.log_print_job(job_data)
+
+
+class PrintQueueService:
+    """Per-printer print queues, so a slow or offline printer never holds up a request.
+
+    Every printer gets its own worker thread and a queue of at most
+    ``max_pending`` jobs; ``submit`` raises ``queue.Full`` once a printer is
+    that far behind so callers can back off. A job is logged as 'queued' when
+    accepted, and its print_jobs record is updated with the outcome when the
+    worker finishes. ``get_job`` reports queued, printing, success or failed.
+    A batch (``submit_batch``) takes one queue slot and prints as one spool
+    job, with one print_jobs record per page. ``submit_pdf`` does the same for
+    a PDF generated in the request (QR bulk runs), with one record per label.
+    """
+
+    MAX_FINISHED_JOBS = 200
+
+    def __init__(self, print_service, max_pending=20):
+        self.print_service = print_service
+        self.pdf_service = print_service.pdf_service
+        self.max_pending = max_pending
+        self.jobs = collections.OrderedDict()
+        self._queues = {}  # printer name ('' for the default printer) -> queue.Queue
+        self._lock = threading.Lock()
+
+    def submit(self, file_id, page_num, printer_name=None, label_settings=None, username='Unknown'):
+        job = self._new_job(file_id, printer_name, page_num=page_num)
+        # The single page's print_jobs record shares the job ID
+        records = [(job['id'], page_num, self.print_service._doc_name(file_id), {})]
+        return self._enqueue(job, records, printer_name, label_settings, username)
+
+    def submit_batch(self, file_id, page_nums, printer_name=None, label_settings=None, username='Unknown'):
+        job = self._new_job(file_id, printer_name, pages=list(page_nums))
+        doc_name = self.print_service._doc_name(file_id)
+        records = [(str(uuid.uuid4()), page_num, doc_name, {}) for page_num in page_nums]
+        return self._enqueue(job, records, printer_name, label_settings, username)
+
+    def submit_pending(self, file_id, printer_name=None, label_settings=None, username='Unknown'):
+        """Queue every barcode page of ``file_id`` not printed, queued or printing yet, as one batch.
+
+        Returns ``(pages, job)``; ``job`` is None when nothing is pending. The
+        pending pages are worked out and logged as queued under ``db_lock``, so
+        two requests at once cannot both queue the same pages.
+        """
+        with self.pdf_service.db_lock:
+            pages = sorted(self.pdf_service.get_document_print_stats(file_id)['pending_pages'])
+            if not pages:
+                return pages, None
+            return pages, self.submit_batch(file_id, pages, printer_name, label_settings, username)
+
+    def submit_pdf(self, pdf_bytes, file_id, labels, printer_name=None, label_settings=None, username='Unknown'):
+        """Queue a generated PDF with one label per page as one job.
+
+        ``labels`` holds the print_jobs fields of each page in order: ``doc_name``
+        plus any extra fields to store with the record.
+        """
+        job = self._new_job(file_id, printer_name, pages=list(range(1, len(labels) + 1)))
+        records = []
+        for page_num, label in enumerate(labels, start=1):
+            extra = dict(label)
+            records.append((str(uuid.uuid4()), page_num, extra.pop('doc_name'), extra))
+        return self._enqueue(job, records, printer_name, label_settings, username, pdf_bytes=pdf_bytes)
+
+    def _new_job(self, file_id, printer_name, **pages):
+        return dict(
+            {
+                'id': str(uuid.uuid4()),
+                'file_id': file_id,
+                'printer': printer_name or 'Default',
+                'status': 'queued',
+                'message': None,
+                'error': None,
+                'created_at': datetime.datetime.now().isoformat(),
+                'started_at': None,
+                'finished_at': None
+            },
+            **pages
+        )
+
+    def _enqueue(self, job, records, printer_name, label_settings, username, pdf_bytes=None):
+        printer_queue = self._get_queue(printer_name)
+        batch_id = job['id'] if 'pages' in job else None
+        if printer_queue.full():
+            raise queue.Full(f"Print queue for {job['printer']} is full")
+        # Log before the worker can see the job, so its update always finds the records. Logging can
+        # compact the DB, so it happens outside the lock that get_job, stats and the workers share.
+        for record_id, page_num, doc_name, extra in records:
+            self.print_service._log_job(record_id, job['file_id'], doc_name, page_num, printer_name, 'queued',
+                                        job['created_at'], username=username, batch_id=batch_id, **extra)
+        record_ids = [record[0] for record in records]
+        with self._lock:
+            # Only _enqueue puts, and only under the lock, so this check cannot race
+            accepted = not printer_queue.full()
+            if accepted:
+                self.jobs[job['id']] = job
+                self._trim_finished_jobs()
+                printer_queue.put_nowait((job['id'], record_ids, printer_name, label_settings, pdf_bytes))
+        if not accepted:
+            # Filled up by another request while the records were being logged
+            for record_id in record_ids:
+                self.pdf_service.update_print_job(record_id, status='failed', error='Print queue was full')
+            raise queue.Full(f"Print queue for {job['printer']} is full")
+        return dict(job, queue_position=printer_queue.qsize())
+
+    def get_job(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self):
+        with self._lock:
+            return {printer or 'Default': printer_queue.qsize() for printer, printer_queue in self._queues.items()}
+
+    def _get_queue(self, printer_name):
+        key = printer_name or ''
+        with self._lock:
+            printer_queue = self._queues.get(key)
+            if printer_queue is None:
+                printer_queue = queue.Queue(maxsize=self.max_pending)
+                self._queues[key] = printer_queue
+                worker = threading.Thread(target=self._run, args=(printer_queue,),
+                                          name=f"print-queue-{printer_name or 'default'}", daemon=True)
+                worker.start()
+            return printer_queue
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is not None:
+                job.update(fields)
+                return dict(job)
+        return None
+
+    def _trim_finished_jobs(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job['finished_at']]
+        for job_id in finished[:max(0, len(finished) - self.MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def _printing(self, printer_name):
+        registry = self.print_service.printer_registry
+        return registry.printing(printer_name) if registry else contextlib.nullcontext()
+
+    def _run(self, printer_queue):
+        while True:
+            job_id, record_ids, printer_name, label_settings, pdf_bytes = printer_queue.get()
+            job = self._update(job_id, status='printing', started_at=datetime.datetime.now().isoformat())
+            with self._printing(printer_name):
+                if pdf_bytes is not None:
+                    try:
+                        success, message = self.print_service.send_label_pdf(pdf_bytes, printer_name, label_settings,
+                                                                             page_count=len(job['pages']))
+                    except Exception as e:
+                        logger.error(f"Label PDF print error: {e}")
+                        success, message = False, str(e)
+                elif 'pages' in job:
+                    success, message = self.print_service.send_pages(job['file_id'], job['pages'], printer_name,
+                                                                     label_settings)
+                else:
+                    success, message = self.print_service.send_page(job['file_id'], job['page_num'], printer_name,
+                                                                    label_settings)
+            status = 'success' if success else 'failed'
+            error = None if success else message
+            for record_id in record_ids:
+                try:
+                    self.pdf_service.update_print_job(record_id, status=status, error=error)
+                except Exception as e:
+                    logger.error(f"Could not record outcome of print job {record_id}: {e}")
+            self._update(job_id, status=status, message=message, error=error,
+                         finished_at=datetime.datetime.now().isoformat())
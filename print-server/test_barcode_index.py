@@ -0,0 +1,128 @@
+"""Checks that indexed barcode lookup matches the original linear scan.
+
+Run with ``python -m unittest test_barcode_index`` from print-server/.
+"""
+import logging
+import random
+import tempfile
+import unittest
+from unittest import mock
+
+from services import PDFProcessingService, SubstringAutomaton, normalize_barcode
+
+
+def linear_resolve(mappings, barcode):
+    """resolve_barcode as it was before the index: a scan over every mapping key"""
+    raw = normalize_barcode(barcode)
+    if not raw:
+        return None, None
+    for known_key in mappings:
+        if normalize_barcode(known_key) == raw:
+            return known_key, mappings[known_key]
+    candidates = []
+    for known_key in mappings:
+        known_norm = normalize_barcode(known_key)
+        if len(known_norm) >= 6 and (known_norm in raw or raw in known_norm):
+            candidates.append((known_key, known_norm))
+    if not candidates:
+        return None, None
+    best_key, _best_norm = max(candidates, key=lambda item: (len(item[1]), 1 if item[1] in raw else 0))
+    return best_key, mappings[best_key]
+
+
+class BarcodeIndexTest(unittest.TestCase):
+    # A small alphabet so keys overlap, plus case and control characters that normalization removes
+    ALPHABET = 'AB12ab'
+
+    def setUp(self):
+        logging.disable(logging.CRITICAL)
+        self.addCleanup(logging.disable, logging.NOTSET)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.service = PDFProcessingService(tmp.name)
+        self.rng = random.Random(4)
+        # Merge pending patterns into the trie often, so both paths are exercised
+        patcher = mock.patch.object(SubstringAutomaton, 'PENDING_LIMIT', 8)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def random_key(self):
+        key = ''.join(self.rng.choice(self.ALPHABET) for _ in range(self.rng.randint(3, 11)))
+        if self.rng.random() < 0.1:
+            key = f' {key}\x1d'
+        return key
+
+    def random_scan(self, keys):
+        choice = self.rng.random()
+        if keys and choice < 0.4:
+            return self.rng.choice(keys) + self.random_key() + self.rng.choice(keys)
+        if keys and choice < 0.7:
+            key = normalize_barcode(self.rng.choice(keys))
+            start = self.rng.randrange(len(key))
+            return key[start:start + self.rng.randint(1, len(key))]
+        return self.random_key() + self.random_key()
+
+    def add_document(self, file_id, keys):
+        """Commit pages the way process_pdf does; some keys move over from other documents"""
+        document = {'id': file_id, 'hash': file_id, 'path': '', 'uploaded_at': ''}
+        self.service.documents[file_id] = document
+        doc_mappings = {}
+        for page_num in range(1, 4):
+            page_mappings = {
+                key: {'file_id': file_id, 'page_num': page_num}
+                for key in (self.rng.choice(keys) if self.rng.random() < 0.3 else self.random_key()
+                            for _ in range(self.rng.randint(1, 5)))
+            }
+            self.service._add_page_mappings(file_id, page_mappings, {})
+            doc_mappings.update(page_mappings)
+        with self.service.db_lock:
+            self.service._record('document_added', document=document, mappings=doc_mappings)
+
+    def assert_matches_linear_scan(self, scans):
+        for scan in scans:
+            self.assertEqual(self.service.resolve_barcode(scan), linear_resolve(self.service.mappings, scan), scan)
+
+    def test_matches_linear_scan_through_adds_and_deletes(self):
+        file_ids = []
+        keys = ['seed01']
+        for step in range(150):
+            if file_ids and self.rng.random() < 0.3:
+                file_id = file_ids.pop(self.rng.randrange(len(file_ids)))
+                self.assertTrue(self.service.delete_document(file_id))
+            else:
+                file_id = f'doc-{step}'
+                self.add_document(file_id, keys)
+                file_ids.append(file_id)
+            keys = list(self.service.mappings)
+            self.assert_matches_linear_scan([self.random_scan(keys) for _ in range(20)])
+
+    def test_reload_matches_linear_scan(self):
+        keys = ['seed01']
+        for step in range(40):
+            self.add_document(f'doc-{step}', keys)
+            keys = list(self.service.mappings)
+        self.service.load_db()
+        self.assert_matches_linear_scan([self.random_scan(keys) for _ in range(500)])
+
+
+class SubstringAutomatonTest(unittest.TestCase):
+    def test_find_all_through_merges_and_rebuilds(self):
+        rng = random.Random(9)
+        automaton = SubstringAutomaton()
+        live = set()
+        for _ in range(30):
+            batch = {''.join(rng.choice('AB12') for _ in range(rng.randint(2, 9))) for _ in range(200)}
+            automaton.add(batch)
+            live |= batch
+            # Enough removals that dead trie nodes outnumber live patterns and force a rebuild
+            gone = set(rng.sample(sorted(live), len(live) * 2 // 3))
+            automaton.remove(gone)
+            live -= gone
+            self.assertEqual(len(automaton), len(live))
+            for _ in range(20):
+                text = ''.join(rng.choice('AB12') for _ in range(30))
+                self.assertEqual(automaton.find_all(text), {p for p in live if p in text}, text)
+
+
+if __name__ == '__main__':
+    unittest.main()
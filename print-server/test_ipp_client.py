@@ -0,0 +1,128 @@
+"""IppClient against the fake IPP server from benchmark.py.
+
+Run with ``python -m unittest test_ipp_client`` from print-server/.
+"""
+import struct
+import time
+import unittest
+from unittest import mock
+
+from benchmark import start_fake_ipp_server
+from services import IppClient
+
+
+def decode_request(body):
+    """(operation, request_id, [(tag, name, value)], document) from a Print-Job request"""
+    operation, request_id = struct.unpack('>HI', body[2:8])
+    attributes = []
+    offset = 9  # version, operation, request id and the operation-attributes tag
+    while body[offset] != IppClient.TAG_END_OF_ATTRIBUTES:
+        tag, name_length = struct.unpack('>BH', body[offset:offset + 3])
+        offset += 3
+        name = body[offset:offset + name_length].decode('ascii')
+        offset += name_length
+        value_length = struct.unpack('>H', body[offset:offset + 2])[0]
+        offset += 2
+        attributes.append((tag, name, body[offset:offset + value_length].decode('utf-8')))
+        offset += value_length
+    return operation, request_id, attributes, body[offset + 1:]
+
+
+class IppClientTest(unittest.TestCase):
+    def setUp(self):
+        self.server = start_fake_ipp_server()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.client = IppClient(f"127.0.0.1:{self.server.server_address[1]}", timeout=5, requesting_user='tester')
+        self.addCleanup(self.client.close)
+
+    def test_print_job_request_encoding(self):
+        self.assertEqual(self.client.print_job('Label Printer', b'%PDF-1 first'), 1)
+        self.assertEqual(self.client.print_job('Label Printer', b'^XA^XZ', job_name='Run 7',
+                                               document_format='application/vnd.zebra-zpl'), 2)
+
+        (path, _, first), (_, _, second) = self.server.jobs
+        self.assertEqual(path, '/printers/Label%20Printer')
+        operation, request_id, attributes, document = decode_request(first)
+        self.assertEqual(first[:2], IppClient.VERSION)
+        self.assertEqual((operation, request_id), (IppClient.OPERATION_PRINT_JOB, 1))
+        self.assertEqual(attributes, [
+            (IppClient.TAG_CHARSET, 'attributes-charset', 'utf-8'),
+            (IppClient.TAG_LANGUAGE, 'attributes-natural-language', 'en'),
+            (IppClient.TAG_URI, 'printer-uri', 'ipp://localhost/printers/Label%20Printer'),
+            (IppClient.TAG_NAME, 'requesting-user-name', 'tester'),
+            (IppClient.TAG_NAME, 'job-name', 'Barcode Label'),
+            (IppClient.TAG_MIME_TYPE, 'document-format', 'application/pdf'),
+        ])
+        self.assertEqual(document, b'%PDF-1 first')
+
+        _, request_id, attributes, document = decode_request(second)
+        self.assertEqual(request_id, 2)
+        self.assertIn((IppClient.TAG_NAME, 'job-name', 'Run 7'), attributes)
+        self.assertIn((IppClient.TAG_MIME_TYPE, 'document-format', 'application/vnd.zebra-zpl'), attributes)
+        self.assertEqual(document, b'^XA^XZ')
+        # Both jobs went over one kept-alive connection
+        self.assertEqual(self.client.stats()['connections_opened'], 1)
+
+    def test_error_status_raises_status_message(self):
+        self.server.status = 0x0400
+        self.server.status_message = 'Unsupported document-format'
+        with self.assertRaisesRegex(RuntimeError, '^Unsupported document-format$'):
+            self.client.print_job('P', b'%PDF')
+
+    def test_error_status_without_message(self):
+        self.server.status = 0x0501
+        with self.assertRaisesRegex(RuntimeError, r'^IPP status 0x0501$'):
+            self.client.print_job('P', b'%PDF')
+        self.assertEqual(self.client.stats()['jobs'], 0)
+
+    def test_successful_status_with_warnings_is_accepted(self):
+        self.server.status = 0x0001  # successful-ok-ignored-or-substituted-attributes
+        self.assertEqual(self.client.print_job('P', b'%PDF'), 1)
+
+    def test_send_error_on_reused_connection_is_retried(self):
+        self.client.print_job('P', b'%PDF-1')
+        send = IppClient._request
+        calls = []
+
+        def drop_first_send(client, connection, path, body):
+            calls.append(connection)
+            if len(calls) == 1:
+                raise ConnectionResetError('connection reset by peer')
+            return send(client, connection, path, body)
+
+        with mock.patch.object(IppClient, '_request', drop_first_send):
+            self.assertEqual(self.client.print_job('P', b'%PDF-2'), 2)
+        self.assertEqual(len(calls), 2)
+        self.assertIsNot(calls[0], calls[1])
+        self.assertEqual(len(self.server.jobs), 2)
+
+    def test_send_error_on_new_connection_is_not_retried(self):
+        with mock.patch.object(IppClient, '_request', side_effect=BrokenPipeError('broken pipe')) as request:
+            with self.assertRaises(BrokenPipeError):
+                self.client.print_job('P', b'%PDF')
+        self.assertEqual(request.call_count, 1)
+
+    def test_no_resend_once_the_request_was_sent(self):
+        self.client.print_job('P', b'%PDF-1')
+        # The server reads the next job, then the connection drops before the answer
+        self.server.drop_requests = 1
+        with self.assertRaises((ConnectionError, OSError)):
+            self.client.print_job('P', b'%PDF-2')
+        time.sleep(0.2)
+        self.assertEqual(len(self.server.jobs), 2)
+        # The connection is not reused, and the next job goes through on a new one
+        self.assertEqual(self.client.print_job('P', b'%PDF-3'), 3)
+        self.assertEqual(self.client.stats()['connections_opened'], 2)
+
+    def test_connection_closed_while_idle_is_replaced(self):
+        self.server.close_after_response = True
+        self.client.print_job('P', b'%PDF-1')
+        time.sleep(0.2)
+        self.assertEqual(self.client.print_job('P', b'%PDF-2'), 2)
+        self.assertEqual(len(self.server.jobs), 2)
+        self.assertEqual(self.client.stats()['connections_opened'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
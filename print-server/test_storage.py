@@ -0,0 +1,180 @@
+"""Persistence checks for JournalStore (db.json + db.journal) and SQLiteStore.
+
+Run with ``python -m unittest test_storage`` from print-server/.
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+from services import JournalStore, SQLiteStore
+
+
+def make_job(job_id, status='success', page_num=1):
+    return {'id': job_id, 'file_id': 'doc-1', 'page_num': page_num, 'status': status,
+            'timestamp': f'2024-01-01T00:00:{len(job_id):02d}'}
+
+
+def make_document(file_id):
+    return {'id': file_id, 'name': f'{file_id}.pdf', 'path': f'/tmp/{file_id}.pdf', 'hash': file_id}
+
+
+class JournalStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.snapshot_path = os.path.join(self.tmp.name, 'db.json')
+
+    def open_store(self, compact_every=1000):
+        store = JournalStore(self.snapshot_path, compact_every=compact_every)
+        return store, store.load()
+
+    def journal_lines(self, store):
+        with open(store.journal_path) as f:
+            return f.read().splitlines()
+
+    def test_replay_rebuilds_state(self):
+        store, _ = self.open_store()
+        store.append('document_added', document=make_document('doc-1'),
+                     mappings={'SN1': {'file_id': 'doc-1', 'page_num': 1}})
+        store.append('document_added', document=make_document('doc-2'),
+                     mappings={'SN2': {'file_id': 'doc-2', 'page_num': 1}})
+        store.append('print_job', job=make_job('job-1', status='queued'))
+        store.append('print_job_updated', job=make_job('job-1', status='success'))
+        store.append('document_deleted', file_id='doc-2')
+        store.append('users', users=[{'username': 'admin'}])
+        store.append('settings', settings={'label_settings': {'width': 4}})
+
+        reopened, state = self.open_store()
+        self.assertEqual(list(state['documents']), ['doc-1'])
+        self.assertEqual(list(state['mappings']), ['SN1'])
+        self.assertEqual([job['status'] for job in state['print_jobs']], ['success'])
+        self.assertEqual(state['users'], [{'username': 'admin'}])
+        self.assertEqual(state['settings'], {'label_settings': {'width': 4}})
+        self.assertEqual(reopened.pending_records, 7)
+        self.assertEqual(reopened.seq, 7)
+
+    def test_seq_continues_after_reload(self):
+        store, _ = self.open_store()
+        store.append('print_job', job=make_job('job-1'))
+        reopened, _ = self.open_store()
+        reopened.append('print_job', job=make_job('job-2'))
+        self.assertEqual([json.loads(line)['seq'] for line in self.journal_lines(reopened)], [1, 2])
+
+    def test_torn_last_line_is_ignored(self):
+        store, _ = self.open_store()
+        store.append('print_job', job=make_job('job-1'))
+        store.append('print_job', job=make_job('job-2'))
+        with open(store.journal_path, 'a') as f:
+            f.write('{"op": "print_job", "job": {"id": "job-3"')
+
+        with self.assertLogs('services', level='WARNING'):
+            _, state = self.open_store()
+        self.assertEqual([job['id'] for job in state['print_jobs']], ['job-1', 'job-2'])
+
+    def test_compaction_folds_journal_into_snapshot(self):
+        store, _ = self.open_store(compact_every=2)
+        store.append('document_added', document=make_document('doc-1'), mappings={})
+        store.append('print_job', job=make_job('job-1'))
+        self.assertTrue(store.needs_compaction)
+
+        store.compact({'documents': {'doc-1': make_document('doc-1')}, 'mappings': {}, 'users': [], 'settings': {}})
+        self.assertFalse(store.needs_compaction)
+        self.assertEqual(self.journal_lines(store), [])
+        with open(self.snapshot_path) as f:
+            snapshot = json.load(f)
+        self.assertEqual(snapshot['journal_seq'], 2)
+        self.assertEqual([job['id'] for job in snapshot['print_jobs']], ['job-1'])
+
+        store.append('print_job', job=make_job('job-2'))
+        reopened, state = self.open_store(compact_every=2)
+        self.assertEqual(list(state['documents']), ['doc-1'])
+        self.assertEqual([job['id'] for job in state['print_jobs']], ['job-1', 'job-2'])
+        self.assertEqual(reopened.pending_records, 1)
+        self.assertEqual(reopened.seq, 3)
+
+    def test_records_already_in_snapshot_are_skipped(self):
+        store, _ = self.open_store()
+        store.append('print_job', job=make_job('job-1'))
+        store.append('print_job', job=make_job('job-2'))
+        with open(store.journal_path) as f:
+            journal = f.read()
+        store.compact({'documents': {}, 'mappings': {}, 'users': [], 'settings': {}})
+        # A crash between writing the snapshot and truncating the journal
+        with open(store.journal_path, 'w') as f:
+            f.write(journal)
+        store.append('print_job', job=make_job('job-3'))
+
+        reopened, state = self.open_store()
+        self.assertEqual([job['id'] for job in state['print_jobs']], ['job-1', 'job-2', 'job-3'])
+        self.assertEqual(reopened.pending_records, 1)
+
+    def test_legacy_records_without_seq_are_applied(self):
+        with open(self.snapshot_path[:-len('.json')] + '.journal', 'w') as f:
+            f.write(json.dumps({'op': 'print_job', 'job': make_job('job-1')}) + '\n')
+        store, state = self.open_store()
+        self.assertEqual([job['id'] for job in state['print_jobs']], ['job-1'])
+        store.append('print_job', job=make_job('job-2'))
+        self.assertEqual(json.loads(self.journal_lines(store)[-1])['seq'], 1)
+
+
+class SQLiteMigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.snapshot_path = os.path.join(self.tmp.name, 'db.json')
+        self.db_path = os.path.join(self.tmp.name, 'db.sqlite3')
+
+    def write_legacy_db(self):
+        legacy = JournalStore(self.snapshot_path)
+        legacy.load()
+        legacy.append('document_added', document=make_document('doc-1'),
+                      mappings={'SN1': {'file_id': 'doc-1', 'page_num': 1}})
+        legacy.compact({'documents': {'doc-1': make_document('doc-1')},
+                        'mappings': {'SN1': {'file_id': 'doc-1', 'page_num': 1}},
+                        'users': [{'username': 'admin'}], 'settings': {}})
+        legacy.append('print_job', job=make_job('job-1'))
+
+    def open_store(self):
+        store = SQLiteStore(self.db_path, legacy_snapshot_path=self.snapshot_path)
+        self.addCleanup(store.conn.close)
+        return store
+
+    def test_json_is_imported_once(self):
+        self.write_legacy_db()
+        state = self.open_store().load()
+        self.assertEqual(list(state['documents']), ['doc-1'])
+        self.assertEqual(list(state['mappings']), ['SN1'])
+        self.assertEqual(state['users'], [{'username': 'admin'}])
+        self.assertTrue(os.path.exists(self.snapshot_path + '.migrated'))
+        self.assertFalse(os.path.exists(self.snapshot_path))
+
+        # A db.json that shows up later is not imported over the live database
+        self.write_legacy_db()
+        store = self.open_store()
+        self.assertEqual([job['id'] for job in store.iter_print_jobs()], ['job-1'])
+        self.assertTrue(os.path.exists(self.snapshot_path))
+
+    def test_failed_import_is_retried(self):
+        self.write_legacy_db()
+        with mock.patch.object(SQLiteStore, '_put_users', side_effect=sqlite3.OperationalError('disk I/O error')):
+            with self.assertRaises(sqlite3.OperationalError):
+                self.open_store()
+        # Nothing from the failed import was committed, and db.json was left in place
+        self.assertTrue(os.path.exists(self.snapshot_path))
+
+        store = self.open_store()
+        self.assertEqual(list(store.load()['documents']), ['doc-1'])
+        self.assertEqual([job['id'] for job in store.iter_print_jobs()], ['job-1'])
+
+    def test_new_install_is_marked_migrated(self):
+        store = self.open_store()
+        store.append('users', users=[{'username': 'admin'}])
+        self.write_legacy_db()
+        self.assertEqual(self.open_store().load()['documents'], {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,153 @@
+"""Round-trip checks for ThermalLabelEncoder and raw-output label settings.
+
+Run with ``python -m unittest test_thermal_encoder`` from print-server/.
+"""
+import random
+import re
+import unittest
+
+from PIL import Image
+
+from services import PrintService, ThermalLabelEncoder
+
+
+def decode_zpl_graphic(data, bytes_per_row, height):
+    """Expand a ^GFA field in Zebra's compressed ASCII form back into packed rows"""
+    def count_value(char):
+        if 'G' <= char <= 'Y':
+            return ord(char) - ord('G') + 1
+        if 'g' <= char <= 'z':
+            return (ord(char) - ord('g') + 1) * 20
+        return 0
+
+    hex_len = bytes_per_row * 2
+    rows = []
+    i = 0
+    while len(rows) < height:
+        if data[i] == ':':
+            rows.append(rows[-1])
+            i += 1
+            continue
+        row = ''
+        while len(row) < hex_len:
+            char = data[i]
+            if char == ',':
+                row += '0' * (hex_len - len(row))
+                i += 1
+                break
+            if char == '!':
+                row += 'F' * (hex_len - len(row))
+                i += 1
+                break
+            count = 0
+            while count_value(char):
+                count += count_value(char)
+                i += 1
+                char = data[i]
+            row += char * max(count, 1)
+            i += 1
+        if len(row) != hex_len:
+            raise AssertionError(f"row {len(rows)} decodes to {len(row)} hex digits, expected {hex_len}")
+        rows.append(bytes.fromhex(row))
+    if i != len(data):
+        raise AssertionError(f"{len(data) - i} characters left after {height} rows")
+    return rows
+
+
+def reference_rows(image, black_bit):
+    """Packed rows computed pixel by pixel, with row padding left white"""
+    width, height = image.size
+    bytes_per_row = (width + 7) // 8
+    pixels = image.load()
+    white_bit = 1 - black_bit
+    rows = []
+    for y in range(height):
+        bits = [black_bit if pixels[x, y] == 0 else white_bit for x in range(width)]
+        bits += [white_bit] * (bytes_per_row * 8 - width)
+        rows.append(bytes(int(''.join(map(str, bits[k:k + 8])), 2) for k in range(0, len(bits), 8)))
+    return rows
+
+
+def make_label(rng, width, height):
+    """Random dots plus solid and repeated rows, so every ZPL compression case appears"""
+    image = Image.new('1', (width, height), 1)
+    for _ in range(width * height // 3):
+        image.putpixel((rng.randrange(width), rng.randrange(height)), 0)
+    for y in range(0, height, 4):
+        for x in range(width):
+            image.putpixel((x, y), 0)
+    if height > 3:
+        for x in range(width):
+            image.putpixel((x, 1), image.getpixel((x, 0)))
+    return image
+
+
+class ThermalLabelEncoderTest(unittest.TestCase):
+    SIZES = [(1, 1), (7, 3), (8, 2), (13, 5), (203, 40), (801, 61)]
+
+    def setUp(self):
+        self.encoder = ThermalLabelEncoder()
+        self.rng = random.Random(3)
+
+    def test_zpl_round_trip(self):
+        for width, height in self.SIZES:
+            image = make_label(self.rng, width, height)
+            zpl = self.encoder.encode_zpl(image).decode('ascii')
+            match = re.fullmatch(r'\^XA\^PW(\d+)\^LL(\d+)\^FO0,0\^GFA,(\d+),(\d+),(\d+),(.*)\^FS\^XZ\n', zpl, re.S)
+            self.assertIsNotNone(match, (width, height))
+            bytes_per_row = int(match.group(5))
+            self.assertEqual((int(match.group(1)), int(match.group(2))), (width, height))
+            self.assertEqual(int(match.group(3)), bytes_per_row * height)
+            self.assertEqual(decode_zpl_graphic(match.group(6), bytes_per_row, height),
+                             reference_rows(image, black_bit=1), (width, height))
+
+    def test_epl_round_trip(self):
+        for width, height in self.SIZES:
+            image = make_label(self.rng, width, height)
+            bytes_per_row = (width + 7) // 8
+            epl = self.encoder.encode_epl(image)
+            header = f"\nN\nq{width}\nQ{height},{ThermalLabelEncoder.EPL_GAP_DOTS}\nGW0,0,{bytes_per_row},{height},"
+            self.assertTrue(epl.startswith(header.encode('ascii')), (width, height))
+            self.assertTrue(epl.endswith(b"\nP1\n"), (width, height))
+            body = epl[len(header):-len(b"\nP1\n")]
+            rows = [body[i * bytes_per_row:(i + 1) * bytes_per_row] for i in range(height)]
+            self.assertEqual(len(body), bytes_per_row * height)
+            self.assertEqual(rows, reference_rows(image, black_bit=0), (width, height))
+
+    def test_grayscale_input_is_thresholded(self):
+        image = Image.new('L', (16, 2), 255)
+        image.putpixel((3, 1), 0)
+        expected = reference_rows(image.convert('1'), black_bit=1)
+        match = re.search(r'\^GFA,\d+,\d+,(\d+),(.*)\^FS', self.encoder.encode_zpl(image).decode('ascii'), re.S)
+        self.assertEqual(decode_zpl_graphic(match.group(2), int(match.group(1)), 2), expected)
+
+    def test_one_label_per_image(self):
+        images = [make_label(self.rng, 24, 8) for _ in range(3)]
+        self.assertEqual(self.encoder.encode(images, 'zpl').count(b'^XA'), 3)
+        self.assertEqual(self.encoder.encode(images, 'epl').count(b'\nP1\n'), 3)
+        with self.assertRaises(ValueError):
+            self.encoder.encode(images, 'pcl')
+
+    def test_zpl_count_prefixes(self):
+        self.assertEqual([self.encoder._zpl_count(n) for n in (1, 2, 19, 20, 21, 399, 400, 401, 845)],
+                         ['', 'H', 'Y', 'g', 'gG', 'yY', 'z', 'zG', 'zzhK'])
+
+
+class LabelSettingsValidationTest(unittest.TestCase):
+    def setUp(self):
+        self.print_service = PrintService(None, print_backend='null')
+
+    def test_valid_settings(self):
+        for label_settings in ({}, {'output_format': 'pdf'}, {'output_format': 'ZPL', 'printer_dpi': 300},
+                               {'output_format': 'epl', 'printer_dpi': '203'}):
+            self.print_service.validate_label_settings(label_settings)
+
+    def test_invalid_settings(self):
+        for label_settings in (None, [], {'output_format': 'pcl'}, {'printer_dpi': 'fine'},
+                               {'printer_dpi': 0}, {'printer_dpi': True}, {'printer_dpi': None}):
+            with self.assertRaises(ValueError, msg=label_settings):
+                self.print_service.validate_label_settings(label_settings)
+
+
+if __name__ == '__main__':
+    unittest.main()